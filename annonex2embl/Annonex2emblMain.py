@@ -7,11 +7,14 @@
 #####################
 
 import MyExceptions as ME
+import CacheOps as CaOps
 import CheckingOps as CkOps
 import DegappingOps as DgOps
 import GenerationOps as GnOps
 import GlobalVariables as GlobVars
 import ParsingOps as PrOps
+import TaxonomyOps as TxOps
+import TranslationOps as TrOps
 import IOOps as IOOps
 import datetime
 import sys
@@ -19,11 +22,15 @@ import os
 
 from Bio import SeqIO
 #from Bio.Alphabet import generic_dna
-#from Bio.Seq import Seq
+from Bio.Alphabet import IUPAC
+from Bio.Seq import Seq
+from Bio.SeqRecord import SeqRecord
 from Bio import SeqFeature
 from collections import OrderedDict
-from copy import copy
 from distutils.util import strtobool
+from functools import partial
+from multiprocessing import Pool
+from StringIO import StringIO
 from termcolor import colored
 
 # Add specific directory to sys.path in order to import its modules
@@ -55,6 +62,491 @@ import pdb
 #############
 # FUNCTIONS #
 #############
+
+# Data that is identical across all sequences of a run; populated by
+# annonex2embl() before the first record is generated
+_run_data = {}
+
+
+# Stands in for the record id in the warnings of function "_feature_table",
+# which are shared by identical sequences
+_record_marker = '\x00record_id\x00'
+
+# The feature tables of sequences that occur more than once in the
+# alignment, each with the number of sequences yet to use it; keyed by the
+# aligned sequence
+_feature_tables = {}
+
+
+def _feature_table(seq_name):
+    ''' An internal function that conducts steps 6.3 and 6.6 to 6.9 of
+        annonex2embl() for a single sequence of the alignment. As these
+        steps depend only on the aligned sequence (and not on its
+        qualifiers), their results are shared by identical sequences.
+    Args:
+        seq_name (str): the name of a sequence in the alignment;
+                        example: "Taxon_1"
+    Returns:
+        tupl.   The return consists of the final sequence (a Seq
+                object), the charset names, the list of the SeqFeatures
+                (except the source feature) and the list of warnings on
+                features not saved to output (i.e., tuples of the
+                exception message, the feature id and the feature type),
+                in which the record id is represented by "_record_marker"
+    Raises:
+        ME.MyException
+    '''
+    alignm_global = _run_data['alignm_global']
+    charset_dict = _run_data['charset_dict']
+    transl_table = _run_data['transl_table']
+    codon_walks = _run_data['codon_walks']
+    transl_memo = _run_data['transl_memo']
+    degap_cache = _run_data['degap_cache']
+
+    seq_record = SeqRecord(Seq(alignm_global[seq_name],
+                               IUPAC.IUPACAmbiguousDNA()), id=_record_marker)
+
+####################################
+
+# 6.3. CLEAN UP THE SEQUENCE OF THE SEQ_RECORD (i.e., remove leading or
+#      trailing ambiguities, remove gaps), but maintain correct
+#      annotations.
+#      Note 1: This clean-up has to occur before (!) the SeqFeature
+#      'source' is generated, as the source feature provides info on
+#      the full sequence length.
+#      Note 2: Charsets are identical across all sequences.
+
+# 6.3.1. Replace question marks in DNA sequence with 'N'
+    seq_record.seq._data = seq_record.seq._data.replace('?', 'N')
+
+# 6.3.2. Remove leading ambiguities, remove trailing ambiguities, degap
+#        the sequence and add gap features where stretches of Ns in
+#        sequence, while maintaining correct annotations
+#        Note: The resulting charsets and their location objects are
+#              reused for all sequences with the same positions of gaps
+#              and Ns (see DegappingOps.DegapCache).
+    seq_final, charsets_final, locations = degap_cache.degap(seq_record.seq)
+
+# 6.3.3. (FUTURE) Give note that leading or trailing ambiguities were
+#        removed; for future association with of fuzzy ends
+#        if seq_noltambigs != seq_record.seq:
+#            ltambigs_removed = True
+
+    # TFL assigns the deambiged and degapped sequence back
+    seq_record.seq = seq_final
+####################################
+
+# 6.6. POPULATE THE FEATURE KEYS WITH THE CHARSET INFORMATION
+#      Note: Each charset represents a dictionary that must be added in
+#      full to the list "SeqRecord.features"
+    seq_view = GnOps.SeqView(seq_record.seq)
+    # The precomputed translations (see step 5.2), keyed by feature
+    feature_walks = {}
+    for charset_name, charset_range in charsets_final.items():
+
+# 6.6.1. Proceed in loop only if charset_range is not empty
+#        An empty charset_range could be the case if the charset only
+#        consisted of 'N' (which were removed in steps 6.3.2 and 6.3.3).
+        if charset_range:
+
+# 6.6.2. Obtain the Location Object of charset_range (see step 6.3.2)
+            location_object = locations[charset_name]
+
+# 6.6.3. Assign a gene product to a gene name, unless it's a gap feature
+            if charset_name[0:4] == "gap":
+                charset_sym = None
+                charset_type = "gap"
+                charset_orient = "forw"
+                charset_product = None
+            else:
+                charset_sym, charset_type, charset_orient, charset_product = charset_dict[charset_name]
+
+# 6.6.4. Generate a regular SeqFeature and append to seq_record.features
+#        Note: The position indices for the stop codon are truncated in
+#              this step.
+            seq = seq_view.bases(location_object)
+
+            seq_feature = GnOps.GenerateSeqFeature().regular_feat(
+                charset_sym, charset_type, charset_orient, location_object, transl_table,
+                seq, charset_product)
+            seq_record.features.append(seq_feature)
+            walk = codon_walks.get(charset_name, alignm_global[seq_name])
+            if walk is not None:
+                feature_walks[id(seq_feature)] = walk
+
+####################################
+
+# 6.7. SORT ALL SEQ_RECORD.FEATURES (THE SOURCE FEATURE IS ADDED IN
+#      STEP 6.4) BY THEIR RELATIVE START POSITIONS
+    seq_record.features = sorted(seq_record.features,
+                                 key=lambda x: x.location.start.position)
+####################################
+
+# 6.8. TRANSLATE AND CHECK QUALITY OF TRANSLATION
+    removal_list = []
+    feature_warnings = []
+    last_seen = ["type", "before", "after"]
+    for indx, feature in enumerate(seq_record.features):
+        # Check if feature is a coding region
+        if feature.type == 'CDS' or feature.type == 'gene':
+            try:
+                # In TFL, features are truncated to the first
+                # internal stop codon, if present.
+                last_seen[0] = feature.type
+                last_seen[1] = feature.location
+                feature = CkOps.TranslCheck().\
+                    transl_and_quality_of_transl(seq_record,
+                                                 feature, transl_table,
+                                                 feature_walks.get(id(feature)),
+                                                 transl_memo)
+                last_seen[2] = feature.location
+            except ME.MyException as e:
+                feature_warnings.append((str(e), feature.id, feature.type))
+                removal_list.append(indx)
+        elif feature.type == 'IGS' or feature.type == 'intron':
+            if  last_seen[0] == 'CDS' or last_seen[0] == 'gene':
+                if not last_seen[1] == last_seen[2]:
+                    feature.location = CkOps.TranslCheck().\
+                                            adjustLocation(feature.location, last_seen[2])
+            last_seen = ["type","loc_before","loc_after"]
+        else:
+            last_seen = ["type","loc_before","loc_after"]
+    # TFL removes the objects in reverse order, because otherwise
+    # each removal would shift the indices of subsequent objects
+    # to the left.
+    for indx in sorted(removal_list, reverse=True):
+        seq_record.features.pop(indx)
+
+####################################
+# 6.9. INTRODUCE FUZZY ENDS
+    for feature in seq_record.features:
+        # Check if feature is a coding region
+        if feature.type == 'CDS' or feature.type == 'gene':
+            # Note: Don't use "feature.extract(seq_record.seq)" in TFLs,
+            #       as stop codon was truncated from feature under
+            #       Step 6.8, because in an ENA record, the AA sequence
+            #       of the translation does not have the stop codon
+            #       (i.e., the '*'), while the feature location
+            #       range (i.e., 738..2291) very much includes
+            #       its position (which is biologically logical).
+            coding_seq = seq_view.span(feature.location)
+            if not coding_seq.startswith(GlobVars.nex2ena_start_codon):
+                feature.location = GnOps.GenerateFeatLoc().\
+                    make_start_fuzzy(feature.location)
+            if all([not coding_seq.endswith(c)
+                    for c in GlobVars.nex2ena_stop_codons]):
+                feature.location = GnOps.GenerateFeatLoc().\
+                    make_end_fuzzy(feature.location)
+
+# (FUTURE)  Also introduce fuzzy ends to features when those had leading or trailing Ns removed,
+#           because the removed Ns may constitute start of stop codons.
+
+    charset_names = charsets_final.keys()
+    return (seq_record.seq, charset_names, seq_record.features,
+            feature_warnings)
+
+
+def generate_record(seq_name):
+    ''' This function conducts steps 6.1 to 6.10 of annonex2embl() for a
+        single sequence of the alignment. Steps 6.3 and 6.6 to 6.9 are
+        conducted by function "_feature_table", only once for identical
+        sequences.
+    Args:
+        seq_name (str): the name of a sequence in the alignment;
+                        example: "Taxon_1"
+    Returns:
+        record_text (str):  the EMBL record of the sequence, or None if
+                            the sequence is skipped
+    Raises:
+        ME.MyException
+    '''
+    alignm_global = _run_data['alignm_global']
+    filtered_qualifiers = _run_data['filtered_qualifiers']
+    email_addr = _run_data['email_addr']
+    descr_DEline = _run_data['descr_DEline']
+    taxcheck_bool = _run_data['taxcheck_bool']
+    taxon_status = _run_data['taxon_status']
+    linemask_bool = _run_data['linemask_bool']
+    topology = _run_data['topology']
+    tax_division = _run_data['tax_division']
+    uniq_seqid_col = _run_data['uniq_seqid_col']
+    organelle = _run_data['organelle']
+    seq_version = _run_data['seq_version']
+    shared_counts = _run_data['shared_counts']
+
+####################################
+
+# 6.1. SELECT CURRENT SEQUENCES AND CURRENT QUALIFIERS
+    current_seq = Seq(alignm_global[seq_name], IUPAC.IUPACAmbiguousDNA())
+    current_quals = filtered_qualifiers[seq_name]
+
+####################################
+
+# 6.2. GENERATE THE BASIC SEQ_RECORD (I.E., WITHOUT FEATURES)
+
+# 6.2.1. Generate the basic SeqRecord
+    seq_record = GnOps.GenerateSeqRecord().base_record(
+        current_seq, current_quals, uniq_seqid_col, seq_version,
+        descr_DEline, topology, tax_division, organelle)
+
+    # Add a function that automatically removes all sequences
+    # that consist only of Ns (or ?s).
+    skip = True
+    for i in seq_record.seq:
+        if i != 'N' and i != '?':
+            skip = False
+            break
+    if skip:
+        return None
+
+####################################
+
+# 6.3. / 6.6. TO 6.9. OBTAIN THE FEATURE TABLE OF THE SEQUENCE
+#      Note: The feature table of a sequence that occurs more than once
+#            in the alignment (or, in a worker process, in its chunk of
+#            sequences) is kept until all its sequences are done.
+    aligned_seq = alignm_global[seq_name]
+    if aligned_seq in shared_counts:
+        if aligned_seq not in _feature_tables:
+            _feature_tables[aligned_seq] = [_feature_table(seq_name),
+                                            shared_counts[aligned_seq]]
+        feature_table_entry = _feature_tables[aligned_seq]
+        feature_table_entry[1] -= 1
+        if not feature_table_entry[1]:
+            del _feature_tables[aligned_seq]
+        feature_table = feature_table_entry[0]
+    else:
+        feature_table = _feature_table(seq_name)
+    seq_final, charset_names, features, feature_warnings = feature_table
+    seq_record.seq = seq_final
+
+####################################
+
+# 6.4. GENERATE SEQFEATURE 'SOURCE' AND TEST TAXON NAME AGAINST
+#      NCBI TAXONOMY
+
+# 6.4.1. Generate SeqFeature 'source' and append to features list
+    source_feature = GnOps.GenerateSeqFeature().\
+        source_feat(len(seq_record), current_quals, charset_names)
+    seq_record.features.append(source_feature)
+####################################
+
+# 6.5. VALIDATE TAXON NAME
+
+# 6.5.1. Test taxon name against NCBI taxonomy; if not listed, adjust
+#        taxon name and append ecotype info
+    if taxcheck_bool:
+        seq_record = PrOps.ConfirmAdjustTaxonName(taxon_status).\
+            go(seq_record, email_addr)
+
+####################################
+
+# 6.6. TO 6.9. ADD THE REGULAR FEATURES TO THE SEQ_RECORD
+    seq_record.features.extend(features)
+    for message, feature_id, feature_type in feature_warnings:
+        print('%s annonex2embl WARNING: %s Feature `%s` '
+              '(type: `%s`) of sequence `%s` is not saved to '
+              'output.' % ('\n', colored(message.replace(_record_marker,
+                                                         seq_record.id), 'red'),
+                           colored(feature_id, 'red'),
+                           colored(feature_type, 'red'),
+                           colored(seq_record.id, 'red')))
+
+####################################
+
+# 6.10. DECISION ON OUTPUT FORMAT
+#       Note: The reference block, which is rendered only once, is inserted
+#             and the molecule type corrected while formatting the record.
+    return IOOps.Outp().format_EntryUpload(seq_record, linemask_bool,
+                                           _run_data['native_writer'],
+                                           _run_data['ref_block'])
+
+
+
+def _generate_captured_record(seq_name):
+    ''' An internal function that generates the record of a sequence (see
+        function "generate_record") and captures the warnings it prints,
+        so that they can be cached with the record (see function
+        "_generate_records_cached"); the warnings are printed nonetheless.
+    Returns:
+        (record_text, warnings) (tuple): the record and the warnings (str)
+    '''
+    stdout, sys.stdout = sys.stdout, StringIO()
+    try:
+        record_text = generate_record(seq_name)
+    finally:
+        warnings = sys.stdout.getvalue()
+        sys.stdout = stdout
+        sys.stdout.write(warnings)
+    return record_text, warnings
+
+
+def _generate_record_in_worker(seq_name, generate=generate_record):
+    ''' An internal function to generate a record inside a worker
+        process, via function "generate". The warnings printed meanwhile
+        are captured, so that the parent process prints them in the order
+        of the records. A sys.exit() is converted into an exception, so
+        that it reaches the parent process instead of ending the worker.
+        The record is returned together with its warnings and the changes
+        of the translation memo, which the parent process merges. '''
+    stdout, sys.stdout = sys.stdout, StringIO()
+    try:
+        record_entry = generate(seq_name)
+    except BaseException as e:
+        # The warnings of a failed record are printed right away
+        stdout.write(sys.stdout.getvalue())
+        sys.stdout = stdout
+        if isinstance(e, SystemExit):
+            raise ME.MyException(e.code)
+        raise
+    warnings = sys.stdout.getvalue()
+    sys.stdout = stdout
+    return (record_entry, warnings,
+            _run_data['transl_memo'].take_changes())
+
+
+def _generate_chunk_in_worker(seq_names, generate=generate_record):
+    ''' An internal function to generate the records of a chunk of
+        sequences inside a worker process (see function
+        "_generate_record_in_worker"). The sequences that occur more than
+        once are counted within the chunk, so that their feature tables
+        are shared within the chunk and freed by its end (see function
+        "generate_record"). '''
+    _feature_tables.clear()
+    _run_data['shared_counts'] = _shared_counts(_run_data['alignm_global'],
+                                                seq_names)
+    return [_generate_record_in_worker(seq_name, generate)
+            for seq_name in seq_names]
+
+
+def _generate_records_parallel(sorted_seqnames, jobs,
+                               generate=generate_record):
+    ''' An internal generator function that distributes the sequences in
+        chunks across a pool of "jobs" forked worker processes and yields
+        the EMBL records in the order of "sorted_seqnames", each after
+        printing its warnings. Chunks that are finished early are held
+        back by Pool.imap until all preceding chunks have been yielded. '''
+    chunksize = max(1, len(sorted_seqnames) // (jobs * 4))
+    chunks = [sorted_seqnames[start:start + chunksize]
+              for start in range(0, len(sorted_seqnames), chunksize)]
+    # The worker processes share the translations made before forking
+    _run_data['codon_walks'].translate_all()
+    pool = Pool(jobs)
+    try:
+        for chunk_entries in pool.imap(partial(_generate_chunk_in_worker,
+                                               generate=generate), chunks):
+            for record_entry, warnings, memo_changes in chunk_entries:
+                _run_data['transl_memo'].merge(memo_changes)
+                sys.stdout.write(warnings)
+                yield record_entry
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+
+def _shared_counts(alignm_global, sorted_seqnames):
+    ''' An internal function to count the sequences that occur more than
+        once among "sorted_seqnames", keyed by the aligned sequence (see
+        function "generate_record"). '''
+    seq_counts = {}
+    for seq_name in sorted_seqnames:
+        aligned_seq = alignm_global[seq_name]
+        seq_counts[aligned_seq] = seq_counts.get(aligned_seq, 0) + 1
+    return dict((aligned_seq, n_seqs) for aligned_seq, n_seqs
+                in seq_counts.items() if n_seqs > 1)
+
+
+def _translated_seqs(sorted_seqnames):
+    ''' An internal function to specify the sequences whose coding
+        charsets are translated in batch (see class
+        TranslationOps.CodonWalks), i.e. the distinct aligned sequences
+        among "sorted_seqnames". '''
+    alignm_global = _run_data['alignm_global']
+    _run_data['codon_walks'].set_seqs(list(set(
+        alignm_global[seq_name] for seq_name in sorted_seqnames)))
+
+
+def _record_key(seq_name, record_cache):
+    ''' An internal function to generate the key of the record of a
+        sequence in the record cache (see class CacheOps.RecordCache), from
+        the aligned sequence, its qualifiers and (if taxon names are
+        checked) the status of its taxon and genus name. '''
+    qualifiers = _run_data['filtered_qualifiers'][seq_name]
+    record_parts = (seq_name, _run_data['alignm_global'][seq_name],
+                    qualifiers.items())
+    if _run_data['taxcheck_bool']:
+        taxon_name = qualifiers.get('organism', 'undetermined organism')
+        record_parts += (_run_data['taxon_status'].get(taxon_name),
+                         _run_data['taxon_status'].get(
+                             taxon_name.split(' ', 1)[0]))
+    return record_cache.key(record_parts)
+
+
+def _generate_records_cached(sorted_seqnames, jobs, record_cache,
+                             ref_block):
+    ''' An internal generator function that yields the EMBL records in the
+        order of "sorted_seqnames", taking the records of unchanged
+        sequences from the record cache and generating the others (in
+        "jobs" worker processes, if more than one). The records are cached
+        without reference block, which is added upon request (ref_block),
+        and together with the warnings printed while they were generated,
+        which are printed again when they are reused. '''
+    record_keys = [_record_key(seq_name, record_cache)
+                   for seq_name in sorted_seqnames]
+    dirty_seqnames = [seq_name for seq_name, record_key
+                      in zip(sorted_seqnames, record_keys)
+                      if not record_cache.contains(record_key)]
+    # Only the generated records share feature tables
+    _run_data['shared_counts'] = _shared_counts(_run_data['alignm_global'],
+                                                dirty_seqnames)
+    _translated_seqs(dirty_seqnames)
+    if jobs > 1 and dirty_seqnames:
+        dirty_entries = _generate_records_parallel(dirty_seqnames, jobs,
+                                                   _generate_captured_record)
+    else:
+        dirty_entries = (_generate_captured_record(seq_name)
+                         for seq_name in dirty_seqnames)
+    dirty_seqnames = set(dirty_seqnames)
+    for seq_name, record_key in zip(sorted_seqnames, record_keys):
+        record_entry = None
+        if seq_name in dirty_seqnames:
+            record_text, warnings = next(dirty_entries)
+        else:
+            record_entry = record_cache.get(record_key)
+            # The entry may have been removed in the meantime
+            if record_entry is None:
+                record_text, warnings = _generate_captured_record(seq_name)
+        if record_entry is not None:
+            record_text, warnings = record_entry
+            sys.stdout.write(warnings)
+        # Skipped sequences (i.e., None) are not cached
+        elif record_text:
+            record_cache.set(record_key, record_text, warnings)
+        if record_text and ref_block is not None:
+            record_text = IOOps.Outp.complete_EntryUpload(record_text,
+                                                          ref_block)
+        yield record_text
+    record_cache.flush()
+
+
+def _abort_output(outp_file, journal):
+    ''' An internal function to clean up after the writing of the records
+        (or the completion of the outfile) has failed for whatever reason,
+        including interruptions: without a journal, the temporary outfile
+        is removed; with a journal, the temporary outfile and the journal
+        are kept, so that the run can be resumed after its last journaled
+        record. '''
+    if journal is None:
+        outp_file.abort()
+    else:
+        print('%s annonex2embl INFO: The records written so far are kept '
+              'in `%s`; rerun with the same arguments to resume after the '
+              'last record listed in it.' % ('\n', journal.path_to_journal))
+
+
 def annonex2embl(path_to_nex,
                  path_to_csv,
                  descr_DEline,
@@ -73,7 +565,16 @@ def annonex2embl(path_to_nex,
                  uniq_seqid_col='isolate',
                  transl_table='11',
                  organelle='plastid',
-                 seq_version='1'):
+                 seq_version='1',
+                 jobs='1',
+                 cache_dir='',
+                 cache_ttl='30',
+                 taxonomy_index='',
+                 embl_writer='native',
+                 buffer_size='8',
+                 shard_size='',
+                 shard='',
+                 resume='False'):
 
 ########################################################################
 
@@ -81,11 +582,75 @@ def annonex2embl(path_to_nex,
     productcheck_bool = strtobool(product_check)
     taxcheck_bool = strtobool(tax_check)
     linemask_bool = strtobool(linemask)
+    resume_bool = strtobool(resume)
+    if shard:
+        try:
+            shard_num, n_shards = IOOps.ShardMerge.parse_shard(shard)
+        except ME.MyException as e:
+            sys.exit('%s annonex2embl ERROR: %s' % ('\n', e))
 
 ########################################################################
 
 # 1. OPEN OUTFILE
-    outp_handle = open(path_to_outfile, 'a')
+#    Note: The records are written to a temporary file, which replaces the
+#          outfile only once all records have been written (see step 7).
+#    Note: Upon request (shard_size), the records are written to several
+#          outfiles, each of which receives its own manifest file (see
+#          step 9).
+#    Note: Upon request (resume), the written records are journaled, so
+#          that an interrupted run can be resumed by a run with identical
+#          settings; the journal of an interrupted run also holds the
+#          answers obtained from NCBI Entrez (see steps 5 and 5.1). Without
+#          a journal, the outfile does not depend on the course of the run
+#          (see class IOOps.AtomicOutp); the journal of an earlier run is
+#          removed, as it no longer matches the temporary file.
+    journal = IOOps.Journal(path_to_outfile)
+    settings = dict(path_to_nex=path_to_nex,
+                    path_to_csv=path_to_csv,
+                    mtimes=[int(os.path.getmtime(path)) for path
+                            in [path_to_nex, path_to_csv]
+                            if os.path.isfile(path)],
+                    descr_DEline=descr_DEline,
+                    author_names=author_names,
+                    product_check=productcheck_bool,
+                    tax_check=taxcheck_bool,
+                    linemask=linemask_bool,
+                    topology=topology,
+                    tax_division=tax_division,
+                    uniq_seqid_col=uniq_seqid_col,
+                    transl_table=transl_table,
+                    organelle=organelle,
+                    seq_version=seq_version,
+                    taxonomy_index=taxonomy_index,
+                    embl_writer=embl_writer,
+                    shard_size=shard_size,
+                    shard=shard)
+    journal_header, journal_entries = None, []
+    if resume_bool:
+        try:
+            journal_header, journal_entries = journal.read()
+        except ME.MyException as e:
+            sys.exit('%s annonex2embl ERROR: %s' % ('\n', e))
+        if journal_header is None:
+            print('%s annonex2embl INFO: No journal found at `%s`; starting '
+                  'from the first record.' % ('\n', journal.path_to_journal))
+        elif journal_header.get('settings') != settings:
+            sys.exit('%s annonex2embl ERROR: The journal `%s` was written by '
+                     'a run with different settings or infiles.'
+                     % ('\n', journal.path_to_journal))
+    else:
+        journal.remove()
+        journal = None
+    buffer_size = int(float(buffer_size) * 1024 * 1024)
+    if shard_size:
+        try:
+            outp_file = IOOps.ShardedOutp(path_to_outfile, shard_size,
+                                          buffer_size, int(jobs) > 1,
+                                          journal)
+        except ME.MyException as e:
+            sys.exit('%s annonex2embl ERROR: %s' % ('\n', e))
+    else:
+        outp_file = IOOps.AtomicOutp(path_to_outfile, buffer_size, journal)
 
 ########################################################################
 
@@ -100,8 +665,11 @@ def annonex2embl(path_to_nex,
 ########################################################################
 
 # 3. PARSE DATA FROM .CSV-FILE
+#    Note: The qualifiers are keyed by the sequence IDs, so that each
+#          sequence finds its qualifiers in constant time.
     try:
-        raw_qualifiers = IOOps.Inp().parse_csv_file(path_to_csv)
+        raw_qualifiers = IOOps.Inp().parse_csv_file(path_to_csv,
+                                                    uniq_seqid_col)
     except ME.MyException as e:
         sys.exit('%s annonex2embl ERROR: %s' % ('\n', e))
 
@@ -110,24 +678,24 @@ def annonex2embl(path_to_nex,
 # 4.1 CHECK QUALIFIERS
 # 4.1.1 Perform quality checks on qualifiers
     try:
-        CkOps.QualifierCheck(raw_qualifiers, uniq_seqid_col).\
+        CkOps.QualifierCheck(raw_qualifiers.values(), uniq_seqid_col).\
             quality_of_qualifiers()
     except ME.MyException as e:
         sys.exit('%s annonex2embl ERROR: %s' % ('\n', e))
 # 4.1.2 Remove qualifiers without content (i.e. empty qualifiers)
     nonempty_qualifiers = CkOps.QualifierCheck.\
-        _rm_empty_qual(raw_qualifiers)
+        _rm_empty_qual(raw_qualifiers.values())
 # 4.1.3 Enforce that all qualifier values consist of ASCII characters
-    filtered_qualifiers = CkOps.QualifierCheck.\
-        _enforce_ASCII(nonempty_qualifiers)
+    filtered_qualifiers = OrderedDict(zip(raw_qualifiers.keys(),
+        CkOps.QualifierCheck._enforce_ASCII(nonempty_qualifiers)))
 
 ####################################
 
 # 4.2 CHECK SEQUENCES
     sorted_seqnames = sorted(alignm_global.keys())
-    sorted_seqids = sorted([d[uniq_seqid_col] for d in filtered_qualifiers])
 # 4.2.1. Exit if seq names in NEX-file not identical to seq ids in csv-file
-    not_shared = list(set(sorted_seqnames) - set(sorted_seqids))
+    not_shared = [seq_name for seq_name in sorted_seqnames
+                  if seq_name not in filtered_qualifiers]
     if not_shared:
         sys.exit('%s annonex2embl ERROR: Sequence names in `%s` '
                  'are NOT IDENTICAL to sequence IDs in `%s`.'
@@ -135,255 +703,261 @@ def annonex2embl(path_to_nex,
                  % ('\n', colored(path_to_nex, 'red'),
                  colored(path_to_csv, 'red'), '\n',
                  colored(','.join(not_shared), 'red')))
+# 4.2.2. Restrict the sequences to the requested shard (if specified)
+#        Note: Each shard processes a contiguous slice of the sorted
+#              sequence names, so that the outfiles of the shards can be
+#              merged by concatenation (see class IOOps.ShardMerge).
+    if shard:
+        sorted_seqnames = IOOps.ShardMerge.shard_slice(sorted_seqnames,
+                                                       shard_num, n_shards)
 
 ########################################################################
 # 5. PARSE OUT FEATURE KEY, OBTAIN OFFICIAL GENE NAME AND GENE PRODUCT
+#    Note: If a cache directory is specified, gene products are looked up
+#          in the persistent cache before querying NCBI.
+    persistent_cache = None
+    if cache_dir:
+        try:
+            persistent_cache = CaOps.PersistentCache(cache_dir, cache_ttl)
+        except ME.MyException as e:
+            sys.exit('%s annonex2embl ERROR: %s' % ('\n', e))
+#    Note: The gene products of all distinct gene symbols are obtained
+#          concurrently, after the charset names have been parsed.
     charset_dict = {}
     for charset_name in charsets_global.keys():
         try:
             charset_sym, charset_type, charset_orient, charset_product = PrOps.\
-                ParseCharsetName(charset_name, email_addr, productcheck_bool).parse()
+                ParseCharsetName(charset_name, email_addr, False).parse()
         except ME.MyException as e:
             sys.exit('%s annonex2embl ERROR: %s' % ('\n',
                     colored(e, 'red')))
 
         charset_dict[charset_name] = (charset_sym, charset_type, charset_orient,
                                       charset_product)
+#    Note: Gene products journaled by an interrupted run are reused.
+    gene_products = {}
+    if journal_header is not None:
+        gene_products = journal_header['gene_products']
+    if productcheck_bool:
+        gene_syms = [charset_sym for charset_sym, charset_type, _, _
+                     in charset_dict.values()
+                     if (charset_type == 'CDS' or charset_type == 'gene') and
+                     charset_sym not in gene_products]
+        try:
+            if gene_syms:
+                gene_products.update(PrOps.GetEntrezInfo(email_addr,
+                    persistent_cache).obtain_gene_products(gene_syms))
+        except ME.MyException as e:
+            sys.exit('%s annonex2embl ERROR: %s' % ('\n',
+                    colored(e, 'red')))
+        for charset_name, charset_info in charset_dict.items():
+            charset_sym, charset_type, charset_orient, _ = charset_info
+            if charset_type == 'CDS' or charset_type == 'gene':
+                charset_dict[charset_name] = (charset_sym, charset_type,
+                    charset_orient, gene_products[charset_sym])
 
 ########################################################################
-# 6. GENERATING SEQ_RECORDS BY LOOPING THROUGH EACH SEQUENCE OF THE ALIGNMENT
-#    Work off the sequences alphabetically.
-    for counter, seq_name in enumerate(sorted_seqnames):
-        # TFLs generate safe copies of charset and alignment for every
-        # loop iteration
-        charsets_withgaps = copy(charsets_global)
-        alignm = copy(alignm_global)
-
-####################################
-
-# 6.1. SELECT CURRENT SEQUENCES AND CURRENT QUALIFIERS
-        current_seq = alignm[seq_name]
-        current_quals = [d for d in filtered_qualifiers
-                         if d[uniq_seqid_col] == seq_name][0]
-
-####################################
-
-# 6.2. GENERATE THE BASIC SEQ_RECORD (I.E., WITHOUT FEATURES)
-
-# 6.2.1. Generate the basic SeqRecord
-        seq_record = GnOps.GenerateSeqRecord().base_record(
-            current_seq, current_quals, uniq_seqid_col, seq_version,
-            descr_DEline, topology, tax_division, organelle)
-
-        # Add a function that automatically removes all sequences
-        # that consist only of Ns (or ?s).
-        skip = True
-        for i in seq_record.seq:
-            if i != 'N' and i != '?':
-                skip = False
-                break
-        if skip:
-            continue
-
-####################################
-
-# 6.3. CLEAN UP THE SEQUENCE OF THE SEQ_RECORD (i.e., remove leading or
-#      trailing ambiguities, remove gaps), but maintain correct
-#      annotations.
-#      Note 1: This clean-up has to occur before (!) the SeqFeature
-#      'source' is generated, as the source feature provides info on
-#      the full sequence length.
-#      Note 2: Charsets are identical across all sequences.
-
-# 6.3.1. Replace question marks in DNA sequence with 'N'
-        seq_record.seq._data = seq_record.seq._data.replace('?', 'N')
-        # TFL generates a safe copy of sequence to work on
-        seq_withgaps = copy(seq_record.seq)
-
-
-# 6.3.2. Remove leading ambiguities while maintaining
-#        correct annotations
-        seq_noleadambigs, charsets_noleadambigs = DgOps.\
-            RmAmbigsButMaintainAnno().rm_leadambig(seq_withgaps, 'N',
-                                                   charsets_withgaps)
-
-# 6.3.3. Remove trailing ambiguities while maintaining
-#        correct annotations
-        seq_notrailambigs, charsets_notrailambigs = DgOps.\
-            RmAmbigsButMaintainAnno().rm_trailambig(seq_noleadambigs,
-                                                    'N', charsets_noleadambigs)
-
-# 6.3.4. (FUTURE) Give note that leading or trailing ambiguities were
-#        removed; for future association with of fuzzy ends
-#        if seq_noltambigs != seq_record.seq:
-#            ltambigs_removed = True
-
-# 6.3.5. Degap the sequence while maintaining correct annotations
-        seq_nogaps, charsets_degapped = DgOps.\
-            DegapButMaintainAnno(seq_notrailambigs, '-',
-                                 charsets_notrailambigs).degap()
-# 6.3.6. Add gap features where stretches of Ns in sequence
-        seq_final, charsets_final = DgOps.\
-            AddGapFeature(seq_nogaps, charsets_degapped).add()
-        # TFL assigns the deambiged and degapped sequence back
-        seq_record.seq = seq_final
-####################################
-
-# 6.4. GENERATE SEQFEATURE 'SOURCE' AND TEST TAXON NAME AGAINST
-#      NCBI TAXONOMY
-
-# 6.4.1. Generate SeqFeature 'source' and append to features list
-        charset_names = charsets_final.keys()
-        source_feature = GnOps.GenerateSeqFeature().\
-            source_feat(len(seq_record), current_quals, charset_names)
-        seq_record.features.append(source_feature)
-####################################
-
-# 6.5. VALIDATE TAXON NAME
-
-# 6.5.1. Test taxon name against NCBI taxonomy; if not listed, adjust
-#        taxon name and append ecotype info
-        if taxcheck_bool:
-            seq_record = PrOps.ConfirmAdjustTaxonName().go(seq_record,
-                                                           email_addr)
-
-####################################
-
-# 6.6. POPULATE THE FEATURE KEYS WITH THE CHARSET INFORMATION
-#      Note: Each charset represents a dictionary that must be added in
-#      full to the list "SeqRecord.features"
-        for charset_name, charset_range in charsets_final.items():
-
-# 6.6.1. Proceed in loop only if charset_range is not empty
-#        An empty charset_range could be the case if the charset only
-#        consisted of 'N' (which were removed in steps 6.3.2 and 6.3.3).
-            if charset_range:
-
-# 6.6.2. Convert charset_range into Location Object
-                location_object = GnOps.GenerateFeatLoc().make_location(charset_range)
-
-# 6.6.3. Assign a gene product to a gene name, unless it's a gap feature
-                if charset_name[0:4] == "gap":
-                    charset_sym = None
-                    charset_type = "gap"
-                    charset_orient = "forw"
-                    charset_product = None
-                else:
-                    charset_sym, charset_type, charset_orient, charset_product = charset_dict[charset_name]
-
-# 6.6.4. Generate a regular SeqFeature and append to seq_record.features
-#        Note: The position indices for the stop codon are truncated in
-#              this step.
-                seq = []
-                [seq.append(seq_record[obj]) for obj in location_object]
-                seq = ''.join(seq)
-
-                seq_feature = GnOps.GenerateSeqFeature().regular_feat(
-                    charset_sym, charset_type, charset_orient, location_object, transl_table,
-                    seq, charset_product)
-                seq_record.features.append(seq_feature)
-
-####################################
-
-# 6.7. SORT ALL SEQ_RECORD.FEATURES EXCEPT THE FIRST ONE (WHICH
-#      CONSTITUTES THE SOURCE FEATURE) BY THEIR RELATIVE START
-#      POSITIONS
-        sorted_features = sorted(seq_record.features[1:],
-                                 key=lambda x: x.location.start.position)
-        seq_record.features = [seq_record.features[0]] + sorted_features
-####################################
-
-# 6.8. TRANSLATE AND CHECK QUALITY OF TRANSLATION
-        removal_list = []
-        last_seen = ["type", "before", "after"]
-        for indx, feature in enumerate(seq_record.features):
-            # Check if feature is a coding region
-            if feature.type == 'CDS' or feature.type == 'gene':
-                try:
-                    # In TFL, features are truncated to the first
-                    # internal stop codon, if present.
-                    last_seen[0] = feature.type
-                    last_seen[1] = feature.location
-                    feature = CkOps.TranslCheck().\
-                        transl_and_quality_of_transl(seq_record,
-                                                     feature, transl_table)
-                    last_seen[2] = feature.location
-                except ME.MyException as e:
-                    print('%s annonex2embl WARNING: %s Feature `%s` '
-                          '(type: `%s`) of sequence `%s` is not saved to '
-                          'output.' % ('\n', colored(e, 'red'),
-                                       colored(feature.id, 'red'),
-                                       colored(feature.type, 'red'),
-                                       colored(seq_record.id, 'red')))
-                    removal_list.append(indx)
-            elif feature.type == 'IGS' or feature.type == 'intron':
-                if  last_seen[0] == 'CDS' or last_seen[0] == 'gene':
-                    if not last_seen[1] == last_seen[2]:
-                        feature.location = CkOps.TranslCheck().\
-                                                adjustLocation(feature.location, last_seen[2])
-                last_seen = ["type","loc_before","loc_after"]
-            else:
-                last_seen = ["type","loc_before","loc_after"]
-        # TFL removes the objects in reverse order, because otherwise
-        # each removal would shift the indices of subsequent objects
-        # to the left.
-        for indx in sorted(removal_list, reverse=True):
-            seq_record.features.pop(indx)
-
-####################################
-# 6.9. INTRODUCE FUZZY ENDS
-        for feature in seq_record.features:
-            # Check if feature is a coding region
-            if feature.type == 'CDS' or feature.type == 'gene':
-                # Note: Don't use "feature.extract(seq_record.seq)" in TFLs,
-                #       as stop codon was truncated from feature under
-                #       Step 6.8, because in an ENA record, the AA sequence
-                #       of the translation does not have the stop codon
-                #       (i.e., the '*'), while the feature location
-                #       range (i.e., 738..2291) very much includes
-                #       its position (which is biologically logical).
-                charset_range_updated = range(feature.location.start.position,
-                    feature.location.end.position)
-                coding_seq = ''.join([seq_record.seq[i] for i in charset_range_updated])
-                if not coding_seq.startswith(GlobVars.nex2ena_start_codon):
-                    feature.location = GnOps.GenerateFeatLoc().\
-                        make_start_fuzzy(feature.location)
-                if all([not coding_seq.endswith(c)
-                        for c in GlobVars.nex2ena_stop_codons]):
-                    feature.location = GnOps.GenerateFeatLoc().\
-                        make_end_fuzzy(feature.location)
+# 5.1 VALIDATE TAXON NAMES
+#     Note: Each distinct taxon name (and, where required, genus name) is
+#           looked up only once; the results are used in step 6.5. Skipped
+#           sequences (i.e., those consisting only of Ns or ?s) are
+#           disregarded.
+#     Note: If a local taxonomy index is specified, it replaces the
+#           queries to NCBI Taxonomy.
+#     Note: Taxon names journaled by an interrupted run are not looked up
+#           again.
+    taxon_status = {}
+    if journal_header is not None:
+        taxon_status = journal_header['taxon_status']
+    if taxcheck_bool:
+        taxon_names = [filtered_qualifiers[seq_name].get('organism',
+                       'undetermined organism') for seq_name in sorted_seqnames
+                       if alignm_global[seq_name].strip('N?')]
+        taxon_names = [taxon_name for taxon_name in taxon_names
+                       if taxon_name not in taxon_status]
+        try:
+            taxonomy_handle = None
+            if taxonomy_index:
+                taxonomy_handle = TxOps.TaxonomyIndex(taxonomy_index)
+            if taxon_names:
+                taxon_status.update(PrOps.ConfirmAdjustTaxonName.resolve(
+                    taxon_names, email_addr, persistent_cache,
+                    taxonomy_handle))
+        except ME.MyException as e:
+            sys.exit('%s annonex2embl ERROR: %s' % ('\n', e))
 
-# (FUTURE)  Also introduce fuzzy ends to features when those had leading or trailing Ns removed,
-#           because the removed Ns may constitute start of stop codons.
+########################################################################
+# 5.1.1 BEGIN THE JOURNAL AND RESUME THE OUTFILE (IF REQUESTED)
+#       Note: The outfile of an interrupted run is truncated to its last
+#             journaled record; sequences journaled before are skipped in
+#             step 6. The date of the reference block is retained.
+    date_today = datetime.date.today().strftime("%d-%b-%Y").upper()
+    if journal_header is not None:
+        date_today = journal_header['date_today']
+    try:
+        if journal is not None:
+            journal.start(dict(settings=settings,
+                               date_today=date_today,
+                               gene_products=gene_products,
+                               taxon_status=taxon_status), journal_entries)
+        if journal_entries:
+            outp_file.resume(journal_entries)
+    except ME.MyException as e:
+        sys.exit('%s annonex2embl ERROR: %s' % ('\n', e))
+    done_seqnames = set(entry[0] for entry in journal_entries)
+    todo_seqnames = [seq_name for seq_name in sorted_seqnames
+                     if seq_name not in done_seqnames]
+    if journal_entries:
+        print('%s annonex2embl INFO: Resuming after %s of %s sequences.' %
+              ('\n', len(sorted_seqnames) - len(todo_seqnames),
+               len(sorted_seqnames)))
 
-####################################
+########################################################################
+# 5.2 TRANSLATE THE CODING CHARSETS OF ALL SEQUENCES AT ONCE
+#     Note: The translations are used in step 6.8. Each charset is
+#           translated upon its first request, and only in the distinct
+#           sequences whose records are generated (see function
+#           "_translated_seqs"). Without NumPy, or for an invalid
+#           translation table, each coding feature is translated in step
+#           6.8 instead.
+#     Note: The outcomes of the quality checks of identical coding
+#           regions are memoized (and kept in the persistent cache, if
+#           specified).
+    transl_memo = CkOps.TranslMemo(cache=persistent_cache)
+    codon_walks = TrOps.CodonWalks(dict(
+        (charset_name, (charsets_global[charset_name],
+                        1 if charset_info[2] == 'forw' else -1))
+        for charset_name, charset_info in charset_dict.items()
+        if charset_info[1] == 'CDS' or charset_info[1] == 'gene'),
+        transl_table)
 
-# 6.10. DECISION ON OUTPUT FORMAT
-        IOOps.Outp().write_EntryUpload(seq_record, outp_handle,
-                                       linemask_bool)
+########################################################################
+# 6. GENERATING SEQ_RECORDS BY LOOPING THROUGH EACH SEQUENCE OF THE ALIGNMENT
+#    Work off the sequences alphabetically.
+#    Note: All data that is identical across sequences is handed to the
+#          record generation via the module-level dictionary "_run_data",
+#          which forked worker processes inherit without pickling.
+#    Note: Sequences that occur more than once in the alignment share
+#          their feature table (see function "generate_record").
+#    Note: If a cache directory is specified, the records of sequences
+#          whose data (and the charsets and options of the run) are
+#          unchanged since an earlier run are taken from the cache (see
+#          function "_generate_records_cached").
+    shared_counts = _shared_counts(alignm_global, todo_seqnames)
+    ref_block = None
+    if not shard:
+        ref_block = IOOps.Outp.format_reference_block(author_names,
+                                                      date_today)
+    record_cache = None
+    if persistent_cache is not None:
+        record_cache = CaOps.RecordCache(persistent_cache, (
+            descr_DEline, uniq_seqid_col, taxcheck_bool,
+            linemask_bool, embl_writer, topology, tax_division, organelle,
+            seq_version, transl_table,
+            [(charset_name, charsets_global[charset_name].intervals,
+              # Gene products obtained from NCBI Entrez are string
+              # subclasses, whose repr differs
+              ['%s' % (part,) for part in charset_dict[charset_name]])
+             for charset_name in sorted(charsets_global.keys())]))
+    _run_data.update(charsets_global=charsets_global,
+                     alignm_global=alignm_global,
+                     filtered_qualifiers=filtered_qualifiers,
+                     charset_dict=charset_dict,
+                     email_addr=email_addr,
+                     descr_DEline=descr_DEline,
+                     taxcheck_bool=taxcheck_bool,
+                     taxon_status=taxon_status,
+                     linemask_bool=linemask_bool,
+                     native_writer=(embl_writer == 'native'),
+                     ref_block=None if record_cache is not None
+                         else ref_block,
+                     topology=topology,
+                     tax_division=tax_division,
+                     uniq_seqid_col=uniq_seqid_col,
+                     transl_table=transl_table,
+                     organelle=organelle,
+                     seq_version=seq_version,
+                     codon_walks=codon_walks,
+                     transl_memo=transl_memo,
+                     shared_counts=shared_counts,
+                     degap_cache=DgOps.DegapCache(charsets_global))
+    if record_cache is None:
+        _translated_seqs(todo_seqnames)
+    if record_cache is not None:
+        record_texts = _generate_records_cached(todo_seqnames, int(jobs),
+                                                record_cache, ref_block)
+    elif int(jobs) > 1:
+        record_texts = _generate_records_parallel(todo_seqnames, int(jobs))
+    else:
+        record_texts = (generate_record(seq_name)
+                        for seq_name in todo_seqnames)
+    try:
+        outp_file.write_records(record_texts, todo_seqnames)
+    except ME.MyException as e:
+        _abort_output(outp_file, journal)
+        sys.exit('%s annonex2embl ERROR: %s' % ('\n', e))
+    except BaseException:
+        _abort_output(outp_file, journal)
+        raise
+    transl_memo.flush()
+    print('%s annonex2embl INFO: Translation memo: %s hits, %s misses.' %
+          ('\n', transl_memo.hits, transl_memo.misses))
+    if record_cache is not None:
+        print('%s annonex2embl INFO: Record cache: %s records reused, %s '
+              'generated.' % ('\n', record_cache.reused,
+                              record_cache.generated))
 
 ########################################################################
 
 # 7. CLOSE OUTFILE
-    outp_handle.close()
+    try:
+        outp_file.commit()
+    except (IOError, OSError) as e:
+        _abort_output(outp_file, journal)
+        sys.exit('%s annonex2embl ERROR: Could not complete `%s`: %s' %
+                 ('\n', path_to_outfile, e))
+    except BaseException:
+        _abort_output(outp_file, journal)
+        raise
 
 ########################################################################
 
 # 8. POST-PROCESSING OF EntryUpload FILES
-# 8.1. Addition of author name
-    date_today = datetime.date.today().strftime("%d-%b-%Y").upper()
-    os.system("sed -i $'s/FH   Key             Location\/Qualifiers/" +
-              "RN   \[1\]" +
-              "\\\nRA   " + author_names +
-              "\\\nRT   \;" +
-              "\\\nRL   Submitted \(" + date_today + "\) to the INSDC." +
-              "\\\nXX" +
-              "\\\nFH   Key             Location\/Qualifiers/g' " + path_to_outfile)
-# 8.2. Corrections
-    os.system("sed -i 's/\; DNA\;/\; genomic DNA\;/g' "+path_to_outfile)
+#    Note: The addition of the author names (i.e., the reference block)
+#          and the correction of the molecule type are conducted on each
+#          record before it is written (see step 6.10).
 
 # 9. Create Manifest file
+#    Note: The outfile of a shard is described in a sidecar file instead;
+#          the manifest file is created upon merging the shards.
+    if shard:
+        try:
+            input_digest = IOOps.ShardMerge.input_digest([path_to_nex,
+                                                          path_to_csv])
+        except ME.MyException as e:
+            sys.exit('%s annonex2embl ERROR: %s' % ('\n', e))
+        IOOps.ShardMerge.write_sidecar(path_to_outfile, {
+            'shard': shard_num,
+            'n_shards': n_shards,
+            'n_seqnames': len(sorted_seqnames),
+            'first_seqname': sorted_seqnames[0] if sorted_seqnames else None,
+            'last_seqname': sorted_seqnames[-1] if sorted_seqnames else None,
+            'outfiles': [os.path.basename(path_to_shard)
+                         for path_to_shard in outp_file.paths],
+            'input_digest': input_digest,
+            # The paths to the infiles may differ between nodes
+            'settings': dict((key, value) for key, value in settings.items()
+                             if key not in ['path_to_nex', 'path_to_csv',
+                                            'mtimes', 'shard']),
+            'author_names': author_names,
+            'date_today': date_today,
+            'manifest_study': manifest_study,
+            'manifest_name': manifest_name,
+            'manifest_description': manifest_description})
     if(manifest_study!='' and manifest_name!=''):
-        IOOps.Outp().create_manifest_file(path_to_outfile, manifest_study, manifest_name, manifest_description)
+        for path_to_shard in outp_file.paths if not shard else []:
+            IOOps.Outp().create_manifest_file(path_to_shard, manifest_study, manifest_name, manifest_description)
     elif(manifest_study!='' or manifest_name!=''):
         raise ME.MyException('Error by creating manifest file. Please give both information -ms study name and -mn your name.')
+    if journal is not None:
+        journal.remove()
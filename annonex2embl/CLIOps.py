@@ -18,6 +18,8 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'annonex2embl'))
 
 # IMPORTANT: TFL must be after "sys.path.append"
 import Annonex2emblMain as AN2EMBLMain
+import IOOps
+import MyExceptions as ME
 import argparse
 
 ###############
@@ -62,13 +64,13 @@ class CLI():
         ### REQUIRED ###
         parser.add_argument('-n',
                             '--nexus',
-                            help='absolute path to infile; infile in NEXUS format; Example: /path_to_input/test.nex',
+                            help='absolute path to infile; infile in NEXUS format, optionally compressed with gzip or bzip2; Example: /path_to_input/test.nex',
                             default='/home/username/Desktop/test.nex',
                             required=True)
 
         parser.add_argument('-c',
                             '--csv',
-                            help='absolute path to infile; infile in CSV format; Example: /path_to_input/test.csv',
+                            help='absolute path to infile; infile in CSV format, optionally compressed with gzip or bzip2; Example: /path_to_input/test.csv',
                             default='/home/username/Desktop/test.csv',
                             required=True)
 
@@ -92,7 +94,7 @@ class CLI():
 
         parser.add_argument('-o',
                             '--outfile',
-                            help='absolute path to outfile; outfile in EMBL format; Example: /path_to_output/test.embl',
+                            help='absolute path to outfile; outfile in EMBL format, compressed with gzip if the name ends with .gz; Example: /path_to_output/test.embl',
                             default='/home/username/Desktop/test.embl',
                             required=True)
 
@@ -160,6 +162,61 @@ class CLI():
                             default='1',
                             required=False)
 
+        parser.add_argument('--jobs',
+                            #metavar='number of processes',
+                            help='Number of worker processes to generate the sequence records with (default: 1)',
+                            default='1',
+                            required=False)
+
+        parser.add_argument('--cache-dir',
+                            #metavar='cache directory',
+                            help='Directory of a persistent cache for NCBI Entrez lookups and for the records of earlier runs, which are reused for unchanged sequences (default: no cache)',
+                            default='',
+                            required=False)
+
+        parser.add_argument('--cache-ttl',
+                            #metavar='time-to-live',
+                            help='Number of days after which the cached results of NCBI Entrez lookups expire (translations and records never expire); 0 means never (default: 30)',
+                            default='30',
+                            required=False)
+
+        parser.add_argument('--taxonomy-index',
+                            #metavar='taxonomy index',
+                            help='Path to a local index of NCBI Taxonomy (see annonex2embl_taxdump_CMD.py), which replaces the online queries of --taxcheck (default: none)',
+                            default='',
+                            required=False)
+
+        parser.add_argument('--embl-writer',
+                            #metavar='EMBL writer',
+                            help='Writer of the EMBL records; "biopython" uses Bio.SeqIO instead of the native writer (default: native)',
+                            choices=['native', 'biopython'],
+                            default='native',
+                            required=False)
+
+        parser.add_argument('--buffer-size',
+                            #metavar='buffer size',
+                            help='Size of the output buffer in megabytes; records are written in batches of this size (default: 8)',
+                            default='8',
+                            required=False)
+
+        parser.add_argument('--shard-size',
+                            #metavar='shard size',
+                            help='Maximal size of an output file, as a number of records (example: 1000) or of bytes (example: 500M); the records are written to several output files (<outfile>_1.embl, <outfile>_2.embl, ...), each with its own manifest file (default: one output file)',
+                            default='',
+                            required=False)
+
+        parser.add_argument('--shard',
+                            #metavar='shard',
+                            help='Process only the i-th of N slices of the alphabetically sorted sequences, e.g. on one of several nodes; the outfiles of all N shards are combined with annonex2embl-merge; Example: 2/8 (default: all sequences)',
+                            default='',
+                            required=False)
+
+        parser.add_argument('--resume',
+                            #metavar='resume',
+                            help='A logical; Shall the written records be listed in a journal next to the outfile (<outfile>.journal), so that an interrupted run is resumed after its last listed record by rerunning it with the same arguments?',
+                            default='False',
+                            required=False)
+
         parser.add_argument('--version',
                             help='Print version information and exit',
                             action='version',
@@ -185,7 +242,59 @@ class CLI():
                                     args.collabel,
                                     args.ttable,
                                     args.organelle,
-                                    args.seqvers )
+                                    args.seqvers,
+                                    jobs=args.jobs,
+                                    cache_dir=args.cache_dir,
+                                    cache_ttl=args.cache_ttl,
+                                    taxonomy_index=args.taxonomy_index,
+                                    embl_writer=args.embl_writer,
+                                    buffer_size=args.buffer_size,
+                                    shard_size=args.shard_size,
+                                    shard=args.shard,
+                                    resume=args.resume )
+
+
+class MergeCLI():
+
+    def __init__(self):
+        self.client()
+
+    def client(self):
+
+        parser = argparse.ArgumentParser(description="  --  ".join([__author__, __copyright__, __info__, __version__]))
+
+        ### REQUIRED ###
+        parser.add_argument('-o',
+                            '--outfile',
+                            help='absolute path to the merged outfile; outfile in EMBL format, compressed with gzip if the name ends with .gz; Example: /path_to_output/test.embl',
+                            required=True)
+
+        parser.add_argument('shards',
+                            help='absolute paths to the outfiles of the shards (i.e., of the runs with option --shard), in any order; Example: /path_to_output/test_1.embl /path_to_output/test_2.embl',
+                            nargs='+')
+
+        ### OPTIONAL ###
+        parser.add_argument('--buffer-size',
+                            #metavar='buffer size',
+                            help='Size of the output buffer in megabytes (default: 8)',
+                            default='8',
+                            required=False)
+
+        parser.add_argument('--version',
+                            help='Print version information and exit',
+                            action='version',
+                            version='%(prog)s ' + __version__)
+
+        args = parser.parse_args()
+
+
+        try:
+            n_seqnames = IOOps.ShardMerge(args.shards).merge(args.outfile,
+                int(float(args.buffer_size) * 1024 * 1024))
+        except ME.MyException as e:
+            sys.exit('%s annonex2embl ERROR: %s' % ('\n', e))
+        print('Merged %s shards with %s sequences into `%s`.' %
+              (len(args.shards), n_seqnames, args.outfile))
 
 ########
 # MAIN #
@@ -193,3 +302,6 @@ class CLI():
 
 def start_annonex2embl():
     CLI()
+
+def start_annonex2embl_merge():
+    MergeCLI()
@@ -0,0 +1,439 @@
+#!/usr/bin/env python
+'''
+Classes to cache the results of NCBI Entrez lookups, translations and
+formatted records on disk
+'''
+
+#####################
+# IMPORT OPERATIONS #
+#####################
+
+import MyExceptions as ME
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import zlib
+
+###############
+# AUTHOR INFO #
+###############
+
+__author__ = 'Michael Gruenstaeudl <m.gruenstaeudl@fu-berlin.de>'
+__copyright__ = 'Copyright (C) 2016-2019 Michael Gruenstaeudl'
+__info__ = 'annonex2embl'
+__version__ = '2019.05.15.1500'
+
+#############
+# DEBUGGING #
+#############
+
+import pdb
+# pdb.set_trace()
+
+####################
+# GLOBAL VARIABLES #
+####################
+
+cache_filename = 'annonex2embl_cache.sqlite'
+
+# The cached tables, each with the column of the key and of the value
+cached_tables = [('gene_product', 'symbol', 'product'),
+                 ('taxon', 'name', 'status'),
+                 ('translation', 'key', 'outcome'),
+                 ('record', 'key', 'text')]
+
+# The tables whose entries expire after the time-to-live of the cache, as
+# the data at NCBI Entrez may change; the outcomes of translations are
+# deterministic, and the records are keyed by all data that determine
+# them (see class RecordCache), so that neither ever expires
+expiring_tables = ['gene_product', 'taxon']
+
+# The number of new records that are written to the cache at once
+record_batch_size = 1000
+
+# The version of the format of the records, which is part of the key of
+# every cached record (see class RecordCache). It must be incremented with
+# every change to annonex2embl that alters the records (or their warnings)
+# generated from unchanged data and settings, so that the records cached
+# by earlier versions are no longer reused.
+record_format_version = 1
+
+###########
+# CLASSES #
+###########
+
+
+class PersistentCache:
+    ''' This class contains functions to store and retrieve the results of
+        NCBI Entrez lookups (i.e., gene products and taxon names), the
+        outcomes of translations (see CheckingOps.TranslMemo) and formatted
+        records (see class RecordCache) in an SQLite database, so that they
+        can be reused across runs. Every entry carries the time at which it
+        was stored; the results of NCBI Entrez lookups that are older than
+        the time-to-live are treated as absent, whereas translations and
+        records never expire (see global variable "expiring_tables").
+    Args:
+        cache_dir (str):    path to the directory that holds the cache file;
+                            the directory is created if it does not exist
+        ttl_days (float):   the number of days after which the results of
+                            NCBI Entrez lookups expire; a value of 0 means
+                            that they never expire
+    Raises:
+        ME.MyException
+    '''
+
+    def __init__(self, cache_dir, ttl_days=30):
+        self.path_to_cache = os.path.join(cache_dir, cache_filename)
+        self.ttl = float(ttl_days) * 86400
+        try:
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            self.conn = sqlite3.connect(self.path_to_cache)
+            self.conn.execute('CREATE TABLE IF NOT EXISTS gene_product '
+                              '(symbol TEXT PRIMARY KEY, product TEXT, '
+                              'timestamp REAL)')
+            self.conn.execute('CREATE TABLE IF NOT EXISTS taxon '
+                              '(name TEXT PRIMARY KEY, status INTEGER, '
+                              'timestamp REAL)')
+            self.conn.execute('CREATE TABLE IF NOT EXISTS translation '
+                              '(key TEXT PRIMARY KEY, outcome TEXT, '
+                              'timestamp REAL)')
+            self.conn.execute('CREATE TABLE IF NOT EXISTS record '
+                              '(key TEXT PRIMARY KEY, text BLOB, '
+                              'timestamp REAL, warnings TEXT)')
+            if 'warnings' not in self._columns('main', 'record'):
+                self.conn.execute('ALTER TABLE record ADD COLUMN warnings '
+                                  'TEXT')
+            self.conn.commit()
+        except (OSError, sqlite3.Error) as e:
+            raise ME.MyException('Could not open cache file `%s`: %s' %
+                                 (self.path_to_cache, e))
+
+    def _columns(self, database, table):
+        ''' An internal function to list the columns of a table. '''
+        return [row[1] for row in self.conn.execute(
+            'PRAGMA %s.table_info(%s)' % (database, table))]
+
+    def _is_fresh(self, timestamp, table):
+        ''' An internal function to evaluate if an entry of a table with the
+            given timestamp has not yet expired. '''
+        return (not self.ttl or table not in expiring_tables or
+                time.time() - timestamp <= self.ttl)
+
+    def get_gene_product(self, gene_sym):
+        ''' This function returns the cached gene product of a gene symbol.
+        Args:
+            gene_sym (str): a gene symbol; example: 'psbI'
+        Returns:
+            gene_product (str): the gene product, or None if the gene
+                                symbol is not cached or its entry has
+                                expired
+        Raises:
+            none
+        '''
+        row = self.conn.execute('SELECT product, timestamp FROM gene_product '
+                                'WHERE symbol = ?', (gene_sym,)).fetchone()
+        if row and self._is_fresh(row[1], 'gene_product'):
+            return row[0]
+        return None
+
+    def set_gene_product(self, gene_sym, gene_product):
+        ''' This function stores the gene product of a gene symbol together
+            with the current time.
+        Args:
+            gene_sym (str):     a gene symbol; example: 'psbI'
+            gene_product (str): a gene product; example:
+                                'photosystem II protein I'
+        Returns:
+            currently nothing
+        Raises:
+            none
+        '''
+        self.conn.execute('INSERT OR REPLACE INTO gene_product '
+                          '(symbol, product, timestamp) VALUES (?, ?, ?)',
+                          (gene_sym, gene_product, time.time()))
+        self.conn.commit()
+
+    def get_taxon_status(self, taxon_name):
+        ''' This function returns the cached result of a taxon name lookup
+            (see ParsingOps.GetEntrezInfo.does_taxon_exist).
+        Args:
+            taxon_name (str):   a taxon name; example: 'Pyrus caucasica'
+        Returns:
+            tupl.   The return consists of a boolean that states if the
+                    taxon name is cached and not expired, and the cached
+                    result (True, False or None)
+        Raises:
+            none
+        '''
+        row = self.conn.execute('SELECT status, timestamp FROM taxon '
+                                'WHERE name = ?', (taxon_name,)).fetchone()
+        if row and self._is_fresh(row[1], 'taxon'):
+            return (True, None if row[0] is None else bool(row[0]))
+        return (False, None)
+
+    def set_taxon_status(self, taxon_name, taxon_status):
+        ''' This function stores the result of a taxon name lookup together
+            with the current time.
+        Args:
+            taxon_name (str):   a taxon name; example: 'Pyrus caucasica'
+            taxon_status (bool): the result of the lookup; True, False or
+                                None
+        Returns:
+            currently nothing
+        Raises:
+            none
+        '''
+        self.conn.execute('INSERT OR REPLACE INTO taxon '
+                          '(name, status, timestamp) VALUES (?, ?, ?)',
+                          (taxon_name, taxon_status, time.time()))
+        self.conn.commit()
+
+    def get_translations(self, limit):
+        ''' This function returns the most recently stored outcomes of
+            translations (which never expire).
+        Args:
+            limit (int):        the maximal number of outcomes returned
+        Returns:
+            outcomes (list):    a list of tuples (key, outcome), from the
+                                oldest to the most recent; see
+                                CheckingOps.AnnoCheck._outcome
+        Raises:
+            none
+        '''
+        rows = self.conn.execute('SELECT key, outcome, timestamp FROM '
+                                 'translation ORDER BY timestamp DESC '
+                                 'LIMIT ?', (limit,)).fetchall()
+        outcomes = []
+        for key, outcome, timestamp in reversed(rows):
+            transl, n_kept, failure = json.loads(outcome)
+            outcomes.append((str(key), (
+                None if transl is None else str(transl), n_kept,
+                None if failure is None else str(failure))))
+        return outcomes
+
+    def set_translations(self, outcomes):
+        ''' This function stores the outcomes of translations together with
+            the current time, in a single transaction.
+        Args:
+            outcomes (list):    a list of tuples (key, outcome)
+        Returns:
+            currently nothing
+        Raises:
+            none
+        '''
+        now = time.time()
+        self.conn.executemany('INSERT OR REPLACE INTO translation '
+                              '(key, outcome, timestamp) VALUES (?, ?, ?)',
+                              ((key, json.dumps(outcome), now)
+                               for key, outcome in outcomes))
+        self.conn.commit()
+
+    def has_record(self, record_key):
+        ''' This function evaluates if a formatted record is cached (cached
+            records never expire). '''
+        row = self.conn.execute('SELECT 1 FROM record WHERE key = ?',
+                                (record_key,)).fetchone()
+        return bool(row)
+
+    def get_record(self, record_key):
+        ''' This function returns a cached formatted record together with
+            the warnings printed while it was generated.
+        Args:
+            record_key (str):   the key of the record; see class RecordCache
+        Returns:
+            (record_text, warnings) (tuple): the formatted record and the
+                                warnings (str), or None if the record is
+                                not cached
+        Raises:
+            none
+        '''
+        row = self.conn.execute('SELECT text, warnings FROM record '
+                                'WHERE key = ?', (record_key,)).fetchone()
+        if row:
+            return (zlib.decompress(row[0]),
+                    (row[1] or '').encode('utf-8'))
+        return None
+
+    def set_records(self, records):
+        ''' This function stores formatted records (compressed with zlib)
+            and their warnings together with the current time, in a single
+            transaction.
+        Args:
+            records (list):     a list of tuples (record_key, record_text,
+                                warnings)
+        Returns:
+            currently nothing
+        Raises:
+            none
+        '''
+        now = time.time()
+        self.conn.executemany('INSERT OR REPLACE INTO record '
+                              '(key, text, timestamp, warnings) '
+                              'VALUES (?, ?, ?, ?)',
+                              ((record_key, sqlite3.Binary(zlib.compress(
+                                  record_text)), now,
+                                warnings.decode('utf-8', 'replace'))
+                               for record_key, record_text, warnings
+                               in records))
+        self.conn.commit()
+
+    def entries(self):
+        ''' This function returns all entries of the cache.
+        Returns:
+            entries (list): a list of tuples (table, key, value, timestamp,
+                            fresh), sorted by table and key
+        '''
+        entries = []
+        for table, key_col, value_col in cached_tables:
+            rows = self.conn.execute(
+                'SELECT %s, %s, timestamp FROM %s ORDER BY %s' %
+                (key_col, value_col, table, key_col)).fetchall()
+            entries.extend([(table, key, value, timestamp,
+                             self._is_fresh(timestamp, table))
+                            for key, value, timestamp in rows])
+        return entries
+
+    def clear(self, expired_only=False):
+        ''' This function removes entries from the cache.
+        Args:
+            expired_only (bool): if True, only expired entries (i.e., of
+                                 NCBI Entrez lookups) are removed
+        Returns:
+            n_removed (int):     the number of removed entries
+        '''
+        if expired_only and not self.ttl:
+            return 0
+        n_removed = 0
+        for table, key_col, value_col in cached_tables:
+            if expired_only and table not in expiring_tables:
+                continue
+            if expired_only:
+                cursor = self.conn.execute('DELETE FROM %s WHERE '
+                                           'timestamp < ?' % (table),
+                                           (time.time() - self.ttl,))
+            else:
+                cursor = self.conn.execute('DELETE FROM %s' % (table))
+            n_removed += cursor.rowcount
+        self.conn.commit()
+        return n_removed
+
+    def merge(self, cache_dir):
+        ''' This function copies the entries of another cache (e.g., the
+            node-local cache of a shard, see IOOps.ShardMerge) into this
+            cache; entries that are present in both caches are taken from
+            the more recent lookup.
+        Args:
+            cache_dir (str):    path to the directory that holds the other
+                                cache file
+        Returns:
+            n_merged (int):     the number of copied entries
+        Raises:
+            ME.MyException
+        '''
+        path_to_other = os.path.join(cache_dir, cache_filename)
+        if not os.path.isfile(path_to_other):
+            raise ME.MyException('Cache file `%s` not found.' %
+                                 (path_to_other))
+        n_merged = 0
+        try:
+            self.conn.execute('ATTACH DATABASE ? AS other', (path_to_other,))
+            other_tables = [row[0] for row in self.conn.execute(
+                'SELECT name FROM other.sqlite_master WHERE type = "table"')]
+            for table, key_col, value_col in cached_tables:
+                if table not in other_tables:
+                    continue
+                # The other cache may lack columns added later
+                other_columns = self._columns('other', table)
+                columns = [column for column in self._columns('main', table)
+                           if column in other_columns]
+                cursor = self.conn.execute(
+                    'INSERT OR REPLACE INTO main.%s (%s) SELECT %s '
+                    'FROM other.%s AS o LEFT JOIN main.%s AS m '
+                    'ON m.%s = o.%s WHERE m.%s IS NULL OR m.timestamp < '
+                    'o.timestamp' % (table, ', '.join(columns),
+                                     ', '.join('o.' + column
+                                               for column in columns),
+                                     table, table, key_col, key_col,
+                                     key_col))
+                n_merged += cursor.rowcount
+            self.conn.commit()
+            self.conn.execute('DETACH DATABASE other')
+        except sqlite3.Error as e:
+            raise ME.MyException('Could not merge cache file `%s`: %s' %
+                                 (path_to_other, e))
+        return n_merged
+
+    def close(self):
+        self.conn.close()
+
+
+class RecordCache:
+    ''' This class contains functions to reuse the formatted records of
+        earlier runs, so that only the records of sequences whose data
+        have changed are generated again. Each record is stored in a
+        PersistentCache under a digest of all data that determine it: the
+        version of the format of the records (see global variable
+        "record_format_version"), the data common to all records of a run
+        (e.g., the charsets and the options; see argument "base_parts") and
+        the data specific to the record (e.g., the aligned sequence and its
+        qualifiers; see function "key"). The warnings printed while a
+        record was generated are stored with it. New records are written to
+        the cache in batches.
+    Args:
+        cache (obj):        a CacheOps.PersistentCache object
+        base_parts (tuple): the data common to all records; must consist
+                            of strings, numbers, booleans, None, tuples and
+                            lists, whose repr is stable across runs
+    Raises:
+        none
+    '''
+
+    def __init__(self, cache, base_parts):
+        self.cache = cache
+        self.base_key = RecordCache.digest((record_format_version,
+                                            base_parts))
+        self.new_records = []
+        self.reused = 0
+        self.generated = 0
+
+    @staticmethod
+    def digest(parts):
+        ''' This function generates the SHA-1 digest of the repr of data. '''
+        return hashlib.sha1(repr(parts)).hexdigest()
+
+    def key(self, record_parts):
+        ''' This function generates the key of a record from the data
+            specific to it (see argument "base_parts"). '''
+        return RecordCache.digest((self.base_key, record_parts))
+
+    def contains(self, record_key):
+        return self.cache.has_record(record_key)
+
+    def get(self, record_key):
+        ''' This function returns a cached record and its warnings (as a
+            tuple), or None if the record is absent. '''
+        record_entry = self.cache.get_record(record_key)
+        if record_entry is not None:
+            self.reused += 1
+        return record_entry
+
+    def set(self, record_key, record_text, warnings=''):
+        ''' This function stores a newly generated record and its
+            warnings. '''
+        self.generated += 1
+        if isinstance(record_text, unicode):
+            record_text = record_text.encode('utf-8')
+        if isinstance(warnings, unicode):
+            warnings = warnings.encode('utf-8')
+        self.new_records.append((record_key, record_text, warnings))
+        if len(self.new_records) >= record_batch_size:
+            self.flush()
+
+    def flush(self):
+        ''' This function writes the new records to the cache. '''
+        if self.new_records:
+            self.cache.set_records(self.new_records)
+        self.new_records = []
@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+'''
+Class for a compact, interval-based representation of charsets
+'''
+
+#####################
+# IMPORT OPERATIONS #
+#####################
+
+from bisect import bisect_right
+from Bio.SeqFeature import ExactPosition, FeatureLocation, CompoundLocation
+
+###############
+# AUTHOR INFO #
+###############
+
+__author__ = 'Michael Gruenstaeudl <m.gruenstaeudl@fu-berlin.de>'
+__copyright__ = 'Copyright (C) 2016-2019 Michael Gruenstaeudl'
+__info__ = 'annonex2embl'
+__version__ = '2019.05.15.1500'
+
+#############
+# DEBUGGING #
+#############
+
+import pdb
+# pdb.set_trace()
+
+###########
+# CLASSES #
+###########
+
+class Charset(object):
+    ''' This class represents a charset (i.e., a set of 0-based nucleotide
+        positions) as a sorted list of non-overlapping, non-adjacent
+        intervals (start, end), where "end" is exclusive. Memory and
+        running time of all operations scale with the number of
+        intervals, not with the number of positions.
+    Args:
+        intervals (list):   a list of tuples (start, end); example:
+                            [(0, 3), (7, 9)] for the positions
+                            [0, 1, 2, 7, 8]
+    Returns:
+        [specific to function]
+    Raises:
+        -
+    '''
+
+    __slots__ = ('intervals',)
+
+    def __init__(self, intervals=()):
+        self.intervals = Charset._normalize(intervals)
+
+    @staticmethod
+    def _normalize(intervals):
+        ''' An internal static function to sort intervals, to drop empty
+            intervals and to merge overlapping or adjacent intervals. '''
+        merged = []
+        for start, end in sorted(intervals):
+            if end <= start:
+                continue
+            if merged and start <= merged[-1][1]:
+                if end > merged[-1][1]:
+                    merged[-1] = (merged[-1][0], end)
+            else:
+                merged.append((start, end))
+        return merged
+
+    @classmethod
+    def from_positions(cls, positions):
+        ''' This function generates a charset from a list of positions;
+            example: [1,2,3,7,8] -> Charset([(1, 4), (7, 9)])
+        '''
+        if isinstance(positions, Charset):
+            return positions
+        intervals = []
+        start = end = None
+        for pos in sorted(positions):
+            if end is not None and pos <= end:
+                if pos == end:
+                    end = pos + 1
+                continue
+            if start is not None:
+                intervals.append((start, end))
+            start, end = pos, pos + 1
+        if start is not None:
+            intervals.append((start, end))
+        charset = cls()
+        charset.intervals = intervals
+        return charset
+
+    @classmethod
+    def from_range(cls, start, end):
+        ''' This function generates a contiguous charset that spans the
+            positions from "start" to "end" (exclusive). '''
+        return cls([(start, end)])
+
+    def __iter__(self):
+        for start, end in self.intervals:
+            for pos in xrange(start, end):
+                yield pos
+
+    def __len__(self):
+        return sum(end - start for start, end in self.intervals)
+
+    def __nonzero__(self):
+        return bool(self.intervals)
+
+    __bool__ = __nonzero__
+
+    def __contains__(self, pos):
+        indx = bisect_right(self.intervals, (pos, float('inf'))) - 1
+        return indx >= 0 and self.intervals[indx][1] > pos
+
+    def __eq__(self, other):
+        if isinstance(other, Charset):
+            return self.intervals == other.intervals
+        try:
+            return list(self) == list(other)
+        except TypeError:
+            return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        if equal is NotImplemented:
+            return equal
+        return not equal
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'Charset(%r)' % (self.intervals)
+
+    @property
+    def start(self):
+        ''' The first position of the charset. '''
+        return self.intervals[0][0]
+
+    @property
+    def end(self):
+        ''' The position after the last position of the charset. '''
+        return self.intervals[-1][1]
+
+    def shift(self, offset):
+        ''' This function returns a copy of the charset in which every
+            position is moved by "offset"; example:
+            Charset([(2, 5)]).shift(-2) -> Charset([(0, 3)])
+        '''
+        charset = Charset()
+        charset.intervals = [(start + offset, end + offset)
+                             for start, end in self.intervals]
+        return charset
+
+    def clip(self, start=None, end=None):
+        ''' This function returns a copy of the charset that contains only
+            the positions >= "start" and < "end"; example:
+            Charset([(0, 4), (6, 9)]).clip(2, 7) -> Charset([(2, 4), (6, 7)])
+        '''
+        clipped = []
+        for iv_start, iv_end in self.intervals:
+            if start is not None and iv_start < start:
+                iv_start = start
+            if end is not None and iv_end > end:
+                iv_end = end
+            if iv_start < iv_end:
+                clipped.append((iv_start, iv_end))
+        charset = Charset()
+        charset.intervals = clipped
+        return charset
+
+    def remove_position(self, pos):
+        ''' This function returns a copy of the charset in which position
+            "pos" is deleted from the underlying sequence, i.e. "pos" is
+            removed from the charset and all subsequent positions move
+            one position to the left; example:
+            Charset([(0, 5)]).remove_position(3) -> Charset([(0, 4)])
+        '''
+        shifted = []
+        for start, end in self.intervals:
+            if end <= pos:
+                shifted.append((start, end))
+            elif start > pos:
+                shifted.append((start - 1, end - 1))
+            else:
+                shifted.append((start, end - 1))
+        return Charset(shifted)
+
+    def remap(self, coord_map):
+        ''' This function returns a copy of the charset in which the
+            boundaries of every interval are converted by the function
+            "coord_map". The function must be monotonic; intervals that
+            become empty are dropped. '''
+        return Charset([(coord_map(start), coord_map(end))
+                        for start, end in self.intervals])
+
+    def to_location(self):
+        ''' This function converts the charset into a SeqFeature location
+            object; either a FeatureLocation (if the charset is
+            contiguous) or a CompoundLocation.
+        '''
+        locations = [FeatureLocation(ExactPosition(start), ExactPosition(end))
+                     for start, end in self.intervals]
+        if len(locations) > 1:
+            return CompoundLocation(locations)
+        return locations[0]
@@ -10,11 +10,15 @@ Custom operations to check annotations
 import MyExceptions as ME
 import GenerationOps as GnOps
 import GlobalVariables as GlobVars
+import hashlib
 
+from Bio import Alphabet
+from Bio.Alphabet import IUPAC
+from Bio.Data import CodonTable
 from Bio.Seq import Seq
-from Bio.SeqRecord import SeqRecord
 from Bio.SeqFeature import FeatureLocation
 from Bio.SeqFeature import CompoundLocation
+from collections import OrderedDict
 from unidecode import unidecode
 from itertools import chain
 
@@ -34,6 +38,13 @@ __version__ = '2019.05.15.1500'
 import pdb
 # pdb.set_trace()
 
+####################
+# GLOBAL VARIABLES #
+####################
+
+# The maximal number of translation outcomes held in memory by TranslMemo
+transl_memo_size = 10000
+
 ###########
 # CLASSES #
 ###########
@@ -48,6 +59,9 @@ class AnnoCheck:
         record_id (str):    a string deatiling the name of the sequence in
                             question; example: "taxon_A"
         transl_table (int): an integer; example: 11 (for bacterial code)
+        walk (tupl):        the result of function "_walk_codons" for the
+                            extract, if precomputed (e.g., by
+                            TranslationOps.BatchTransl); optional
     Returns:
         tupl.   The return consists of the translated sequence (a str)
                 and the updated feature location (a location object);
@@ -56,25 +70,79 @@ class AnnoCheck:
         ME.MyException
     '''
 
-    def __init__(self, extract, feature, record_id, transl_table=11):
+    def __init__(self, extract, feature, record_id, transl_table=11,
+                 walk=None):
         self.extract = extract
         self.feature = feature
         self.record_id = record_id
         self.transl_table = transl_table
+        self.walk = walk
 
     @staticmethod
-    def _transl(extract, transl_table, to_stop=False, cds=False):
-        ''' An internal static function to translate a coding region. '''
-        transl = extract.translate(table=transl_table, to_stop=to_stop,
-                                   cds=cds)
-        # Adjustment for non-start codons given the necessary use of
-        # cds=True in TPL.
-        if not extract.startswith(GlobVars.nex2ena_start_codon):
-            first_codon_seq = extract[0:3]
-            first_aa = first_codon_seq.translate(table=transl_table,
-                                                 to_stop=to_stop, cds=False)
-            transl = first_aa + transl[1:]
-        return transl
+    def _codon_table(extract, transl_table):
+        ''' An internal static function to select the codon table that
+            Seq.translate would use for the extract. '''
+        if isinstance(transl_table, CodonTable.CodonTable):
+            return transl_table
+        if extract.alphabet == IUPAC.unambiguous_dna:
+            tables_by_id = CodonTable.unambiguous_dna_by_id
+            tables_by_name = CodonTable.unambiguous_dna_by_name
+        elif extract.alphabet == IUPAC.unambiguous_rna:
+            tables_by_id = CodonTable.unambiguous_rna_by_id
+            tables_by_name = CodonTable.unambiguous_rna_by_name
+        else:
+            tables_by_id = CodonTable.ambiguous_generic_by_id
+            tables_by_name = CodonTable.ambiguous_generic_by_name
+        try:
+            return tables_by_id[int(transl_table)]
+        except ValueError:
+            return tables_by_name[transl_table]
+
+    @staticmethod
+    def _walk_codons(extract, codon_table):
+        ''' An internal static function to translate all complete codons of
+            a coding region in a single pass, with the same codon
+            assignments as Seq.translate (i.e., stop codons become '*' and
+            ambiguous codons that may be stop codons become 'X').
+        Args:
+            extract (obj):      a sequence object; example: Seq('ATGGAGTAA',
+                                IUPACAmbiguousDNA())
+            codon_table (obj):  a CodonTable object
+        Returns:
+            tupl.   The return consists of the list of amino acids, the
+                    list of the indices of all stop codons and a boolean
+                    that is False if a codon is invalid (in which case
+                    the walk ends at that codon); example:
+                    (['M', 'E', '*'], [2], True)
+        '''
+        seq_str = str(extract).upper()
+        forward_table = codon_table.forward_table
+        stop_codons = codon_table.stop_codons
+        if codon_table.nucleotide_alphabet.letters is not None:
+            valid_letters = set(codon_table.nucleotide_alphabet.letters.upper())
+        else:
+            valid_letters = set(IUPAC.IUPACAmbiguousDNA.letters +
+                                IUPAC.IUPACAmbiguousRNA.letters)
+        gap = getattr(extract.alphabet, 'gap_char', None)
+        amino_acids = []
+        stop_indices = []
+        for i in range(0, len(seq_str) - len(seq_str) % 3, 3):
+            codon = seq_str[i:i + 3]
+            try:
+                amino_acids.append(forward_table[codon])
+                continue
+            except (KeyError, CodonTable.TranslationError):
+                pass
+            if codon in stop_codons:
+                stop_indices.append(len(amino_acids))
+                amino_acids.append('*')
+            elif valid_letters.issuperset(codon):
+                amino_acids.append('X')
+            elif gap is not None and codon == gap * 3:
+                amino_acids.append(gap)
+            else:
+                return (amino_acids, stop_indices, False)
+        return (amino_acids, stop_indices, True)
 
     @staticmethod
     def _check_protein_start(extract, transl_table):
@@ -84,62 +152,108 @@ class AnnoCheck:
         return transl.startswith('M')
 
     @staticmethod
-    def _adjust_feat_loc(location_object, transl_with_internStop,
-                         transl_without_internStop):
+    def _adjust_feat_loc(location_object, n_kept):
         ''' An internal static function to adjust the feature location if an
-            internal stop codon were present. '''
-        if len(transl_without_internStop) > len(transl_with_internStop):
-            # 1. Unnest the nested lists
-            contiguous_subsets = [range(e.start.position, e.end.position)
-                for e in location_object.parts]
-            compound_integer_range = sum(contiguous_subsets, [])
-            # 2. Adjust location range
-            len_with_internStop = len(transl_with_internStop) * 3
+            internal stop codon were present, by keeping only its first
+            "n_kept" positions. '''
+        if n_kept is None:
+            return location_object
+        # 1. Unnest the nested lists
+        contiguous_subsets = [range(e.start.position, e.end.position)
+            for e in location_object.parts]
+        compound_integer_range = sum(contiguous_subsets, [])
+        # 2. Adjust location range
+        adjusted_range = compound_integer_range[:n_kept]
+        # 3. Establish location
+        return GnOps.GenerateFeatLoc().make_location(adjusted_range)
+
+    def _outcome(self):
+        ''' An internal function to translate the extract and to evaluate
+            the translation; the outcome depends only on the extract and
+            the translation table, not on the feature, and can thus be
+            memoized (see class TranslMemo).
+        Returns:
+            tupl.   The return consists of the translation (a str), the
+                    number of positions to which the feature location is
+                    trimmed (None if it is kept) and the reason of a
+                    failure (None if successful); example:
+                    ('ME', None, None)
+        '''
+        try:
+            codon_table = AnnoCheck._codon_table(self.extract,
+                                                 self.transl_table)
+            if self.walk is not None:
+                amino_acids, stop_indices, valid = self.walk
+            else:
+                amino_acids, stop_indices, valid = AnnoCheck._walk_codons(
+                    self.extract, codon_table)
+        except Exception:
+            valid = False
+        if not valid:
+            return (None, None, 'unsuccessful')
+        seq_str = str(self.extract).upper()
+        n_codons = len(amino_acids)
+        is_complete_cds = (seq_str[:3] in codon_table.start_codons and
+                           len(seq_str) % 3 == 0 and
+                           seq_str[-3:] in codon_table.stop_codons and
+                           not [indx for indx in stop_indices
+                                if 0 < indx < n_codons - 1])
+        if is_complete_cds:
+            return (''.join(amino_acids[:-1]), None, None)
+        # Note: Tables with codons that code for both a stop and an
+        #       amino acid cannot be truncated at the first stop.
+        if [codon for codon in codon_table.stop_codons
+                if codon in codon_table.forward_table]:
+            return (None, None, 'unsuccessful')
+        if stop_indices:
             # IMPORTANT!: In TFL, the "+3" is for the stop codon, which is
             # counted in the location range, but is not part of the AA
             # sequence of the translation.
-            adjusted_range = compound_integer_range[:(len_with_internStop+3)]
-            # 3. Establish location
-            feat_loc = GnOps.GenerateFeatLoc().make_location(adjusted_range)
-        if len(transl_without_internStop) == len(transl_with_internStop):
-            feat_loc = location_object
-        return feat_loc
-
-    def check(self):
+            return (''.join(amino_acids[:stop_indices[0]]),
+                    stop_indices[0] * 3 + 3, None)
+        return (''.join(amino_acids), None, None)
+
+    def check(self, memo=None):
         ''' This function performs checks on a coding region.
-            Specifically, the function tries to translate the coding
-            region (CDS) directly, using the internal checker
-            "cds=True". If a direct translation fails, it confirms if
-            the CDS starts with a methionine. If the CDS does not start
-            with a methionine, a ValueError is raised. If the CDS does
-            start with a methionine, translations are conducted with
-            and without regard to internal stop codons. The shorter
-            of the two translations is kept. The feature location is
-            adjusted, where necessary.
+            Specifically, the function translates the codons of the
+            coding region (CDS) in a single pass and evaluates if the
+            CDS is complete (i.e., starts with a start codon, has a
+            length that is a multiple of three, ends with a stop codon
+            and does not contain an internal stop codon). If so, the
+            translation without the final stop codon is kept. If not,
+            the translation is truncated before the first stop codon
+            and the feature location is adjusted, where necessary.
+            The CDS is rejected if it contains an invalid codon.
+        Args:
+            memo (obj):     a TranslMemo object, in which the outcome of
+                            the translation is looked up; optional
         Note:
-            The asterisk indicating a stop codon is truncated under
-            _transl(to_stop=True) and must consequently be added again
-            (see line 137).
+            The results are identical to those of Seq.translate with
+            "cds=True" and, if that fails, with "to_stop=True".
         '''
-        try:
-            # Note: TFL must contain "cds=True"; don't delete it
-            transl_out = AnnoCheck._transl(self.extract,
-                                           self.transl_table, cds=True)
-            feat_loc = self.feature.location
-        except BaseException:
-            try:
-                without_internalStop = AnnoCheck._transl(self.extract,
-                                                         self.transl_table)
-                with_internalStop = AnnoCheck._transl(
-                    self.extract, self.transl_table, to_stop=True)
-                transl_out = with_internalStop
-                feat_loc = AnnoCheck._adjust_feat_loc(
-                    self.feature.location, with_internalStop, without_internalStop)
-            except BaseException:
-                raise ME.MyException(
-                    'Translation of feature `%s` of '
-                    'sequence `%s` is unsuccessful.' %
-                    (self.feature.id, self.record_id))
+        if memo is not None:
+            memo_key = TranslMemo.key(self.extract, self.transl_table,
+                                      self.feature.strand)
+            outcome = memo.get(memo_key)
+            if outcome is None:
+                outcome = self._outcome()
+                memo.set(memo_key, outcome)
+        else:
+            outcome = self._outcome()
+        transl_out, n_kept, failure = outcome
+        if failure:
+            raise ME.MyException(
+                'Translation of feature `%s` of '
+                'sequence `%s` is %s.' %
+                (self.feature.id, self.record_id, failure))
+        feat_loc = AnnoCheck._adjust_feat_loc(self.feature.location, n_kept)
+        codon_table = AnnoCheck._codon_table(self.extract, self.transl_table)
+        gap = getattr(self.extract.alphabet, 'gap_char', None)
+        if gap and gap in transl_out:
+            transl_out = Seq(transl_out, Alphabet.Gapped(
+                codon_table.protein_alphabet, gap))
+        else:
+            transl_out = Seq(transl_out, codon_table.protein_alphabet)
         if len(transl_out) < 2:
             raise ME.MyException(
                 'Translation of feature `%s` of '
@@ -170,22 +284,115 @@ class AnnoCheck:
             raise e
 
 
+class TranslMemo:
+    ''' This class contains functions to memoize the outcomes of
+        translations (see AnnoCheck._outcome) in a bounded store that
+        evicts the least recently used outcome, so that identical coding
+        regions (e.g., of many accessions of the same haplotype) are
+        translated and evaluated only once. If a cache is given, its
+        stored outcomes are loaded at the start, and new outcomes are
+        written to it by function "flush".
+    Args:
+        max_size (int): the maximal number of outcomes held in memory
+        cache (obj):    a CacheOps.PersistentCache object; optional
+    Raises:
+        none
+    '''
+
+    def __init__(self, max_size=transl_memo_size, cache=None):
+        self.max_size = max_size
+        self.cache = cache
+        self.outcomes = OrderedDict()
+        self.new_outcomes = []
+        self.hits = 0
+        self.misses = 0
+        if cache is not None:
+            for memo_key, outcome in cache.get_translations(max_size):
+                self.outcomes[memo_key] = outcome
+
+    @staticmethod
+    def key(extract, transl_table, strand):
+        ''' This function generates the memo key of an extract.
+        Args:
+            extract (obj):      a sequence object; example: Seq('ATGGAGTAA',
+                                IUPACAmbiguousDNA())
+            transl_table (int): an integer; example: 11
+            strand (int):       the strand of the feature; example: -1
+        Returns:
+            memo_key (str):     the digest of the extract (and of its
+                                alphabet, which determines the codon
+                                table), the translation table and the
+                                strand, separated by colons
+        '''
+        digest = hashlib.sha1('%s:%s' % (extract.alphabet.__class__.__name__,
+                                          str(extract).upper())).hexdigest()
+        return '%s:%s:%s' % (digest, transl_table, strand)
+
+    def get(self, memo_key):
+        ''' This function returns the memoized outcome of a key, or None if
+            the key is absent. '''
+        outcome = self.outcomes.pop(memo_key, None)
+        if outcome is None:
+            self.misses += 1
+            return None
+        self.outcomes[memo_key] = outcome
+        self.hits += 1
+        return outcome
+
+    def set(self, memo_key, outcome):
+        ''' This function memoizes the outcome of a key. '''
+        self.outcomes[memo_key] = outcome
+        if len(self.outcomes) > self.max_size:
+            self.outcomes.popitem(last=False)
+        if self.cache is not None:
+            self.new_outcomes.append((memo_key, outcome))
+
+    def take_changes(self):
+        ''' This function returns the counters and the outcomes not yet
+            written to the cache, and resets them; used to hand the changes
+            of a worker process to the parent process (see function
+            "merge"). '''
+        changes = (self.hits, self.misses, self.new_outcomes)
+        self.hits, self.misses, self.new_outcomes = 0, 0, []
+        return changes
+
+    def merge(self, changes):
+        ''' This function adds the changes of a worker process (see
+            function "take_changes"). '''
+        hits, misses, new_outcomes = changes
+        self.hits += hits
+        self.misses += misses
+        if self.cache is not None:
+            self.new_outcomes.extend(new_outcomes)
+
+    def flush(self):
+        ''' This function writes the new outcomes to the cache. '''
+        if self.cache is not None and self.new_outcomes:
+            self.cache.set_translations(self.new_outcomes)
+        self.new_outcomes = []
+
+
 class TranslCheck:
     ''' This class contains functions to coordinate different checks. '''
 
     def __init__(self):
         pass
 
-    # This function extract the sequence from pattern sequence
-    # for a forward and reverse strand
     def extract(self, feature, seq_record):
-        if feature._get_strand() == 1:
-            return feature.extract(seq_record)
-        else:
-            reverse = SeqRecord("")
-            for i in feature.location.parts[::-1]:
-                reverse.seq = reverse.seq + i.extract(seq_record).seq
-            return reverse
+        ''' This function extracts the sequence of a feature from a
+            SeqRecord; for a feature on the reverse strand, the bases of
+            all parts are collected first and then reverse-complemented
+            once.
+        Args:
+            feature (obj):      a SeqFeature object
+            seq_record (obj):   a SeqRecord object
+        Returns:
+            extract (obj):      a Seq object; example: Seq('ATGGAGTAA',
+                                IUPACAmbiguousDNA())
+        '''
+        bases = GnOps.SeqView(seq_record.seq).bases(feature.location,
+                                                    feature._get_strand())
+        return Seq(bases, seq_record.seq.alphabet)
 
     # by checking the translation of a CDS or an gene it may happen that
     # the location from the CDS or gene had to be adjusted. If after such
@@ -214,13 +421,17 @@ class TranslCheck:
         except:
             return locations[0]
 
-    def transl_and_quality_of_transl(self, seq_record, feature, transl_table):
+    def transl_and_quality_of_transl(self, seq_record, feature, transl_table,
+                                     walk=None, memo=None):
         ''' This function conducts a translation of a coding region and checks
             the quality of said translation.
         Args:
             seq_record (obj):   foobar; example: 'foobar'
             feature (obj):      foobar; example: 'foobar'
             transl_table (int):
+            walk (tupl):        the precomputed translation of the feature
+                                (see AnnoCheck); optional
+            memo (obj):         a TranslMemo object; optional
         Returns:
             True, unless exception
         Raises:
@@ -229,8 +440,8 @@ class TranslCheck:
 
         extract = self.extract(feature, seq_record)
         try:
-            transl, loc = AnnoCheck(extract.seq, feature, seq_record.id,
-                                    transl_table).check()
+            transl, loc = AnnoCheck(extract, feature, seq_record.id,
+                                    transl_table, walk).check(memo)
             if feature.type == 'CDS':
                 feature.qualifiers["translation"] = transl
             if feature.type == 'exon' or feature.type == 'gene':
@@ -7,8 +7,15 @@ Classes to degap sequences but maintain annotations
 # IMPORT OPERATIONS #
 #####################
 
+import GenerationOps as GnOps
+import hashlib
+import re
+
+from Bio.Seq import Seq
+from bisect import bisect_right
+from collections import OrderedDict
 from copy import copy
-from itertools import count, groupby
+from CharsetOps import Charset
 
 ###############
 # AUTHOR INFO #
@@ -26,6 +33,13 @@ __version__ = '2019.05.15.1500'
 import pdb
 # pdb.set_trace()
 
+####################
+# GLOBAL VARIABLES #
+####################
+
+# The maximal number of gap signatures held in memory by DegapCache
+degap_cache_size = 1000
+
 ###########
 # CLASSES #
 ###########
@@ -37,9 +51,9 @@ class AddGapFeature:
     Args:
         seq (str):      a string that represents an aligned, degapped
                         DNA sequence; example: "ATGNNNC"
-        charsets (dict):a dictionary with gene names (str) as keys and lists
-                        of nucleotide positions (list) as values; example:
-                        {"gene_1":[0,1],"gene_2":[2,3,4]}
+        charsets (dict):a dictionary with gene names (str) as keys and
+                        Charsets (or lists of nucleotide positions) as
+                        values; example: {"gene_1":[0,1],"gene_2":[2,3,4]}
     Returns:
         tupl.   The return consists of the input sequence and the
                 corresponding charsets (plus a gap charset, if
@@ -62,14 +76,10 @@ class AddGapFeature:
         charsets = self.charsets
         annotations = copy(charsets)
 
-        gap_indices = [i for i, nucl in enumerate(seq) if nucl=="N"]  # Indexing all 'N' in seq
-        gap_ranges = [list(g) for _,g in groupby(gap_indices, key=lambda n, c=count(): n-next(c))]
-        if gap_ranges:
-            for countr, rnge in enumerate(gap_ranges):
-                try:
-                    annotations["gap"+str(countr)] = rnge
-                except:
-                    print "Warning: Cannot process Ns in positions `%s`." %(','.join(rnge))
+        # Each stretch of 'N' in seq constitutes one gap charset
+        gap_ranges = [m.span() for m in re.finditer('N+', str(seq))]
+        for countr, (start, end) in enumerate(gap_ranges):
+            annotations["gap"+str(countr)] = Charset.from_range(start, end)
         return seq, annotations
 
 class DegapButMaintainAnno:
@@ -81,9 +91,9 @@ class DegapButMaintainAnno:
     Args:
         seq (str):      a string that represents an aligned DNA sequence;
                         example: "ATG-C"
-        charsets (dict):a dictionary with gene names (str) as keys and lists
-                        of nucleotide positions (list) as values; example:
-                        {"gene_1":[0,1],"gene_2":[2,3,4]}
+        charsets (dict):a dictionary with gene names (str) as keys and
+                        Charsets (or lists of nucleotide positions) as
+                        values; example: {"gene_1":[0,1],"gene_2":[2,3,4]}
     Returns:
         tupl.   The return consists of the degapped sequence and the
                 corresponding degapped charsets; example:
@@ -97,9 +107,41 @@ class DegapButMaintainAnno:
         self.rmchar = rmchar
         self.charsets = charsets
 
+    @staticmethod
+    def _gap_map(seq, rmchar):
+        ''' An internal static function to build the coordinate map from
+            the aligned to the ungapped sequence. The map consists of the
+            start and end of every run of "rmchar" plus the cumulative
+            number of gap positions before each run; example:
+            "A--T-G" -> ([1, 4], [3, 5], [0, 2])
+        '''
+        run_starts, run_ends, cum_gaps = [], [], []
+        n_gaps = 0
+        for m in re.finditer(re.escape(rmchar) + '+', str(seq)):
+            run_starts.append(m.start())
+            run_ends.append(m.end())
+            cum_gaps.append(n_gaps)
+            n_gaps += m.end() - m.start()
+        return run_starts, run_ends, cum_gaps
+
+    @staticmethod
+    def _to_ungapped(gap_map, pos):
+        ''' An internal static function to convert an (interval boundary)
+            position of the aligned sequence into the corresponding
+            position of the ungapped sequence. '''
+        run_starts, run_ends, cum_gaps = gap_map
+        indx = bisect_right(run_starts, pos) - 1
+        if indx < 0:
+            return pos
+        return pos - cum_gaps[indx] - (min(pos, run_ends[indx]) -
+                                       run_starts[indx])
+
     def degap(self):
         ''' This function works on overlapping charsets and is preferable over
-        "degap_legacy".
+        "degap_legacy". The coordinate map of the sequence is built once,
+        and each charset interval is then remapped in a single step, so
+        that the running time is linear in the length of the sequence
+        plus the number of charset intervals.
         Source: http://stackoverflow.com/questions/35233714/
         maintaining-overlapping-annotations-while-removing-dashes-from-string
         '''
@@ -108,16 +150,15 @@ class DegapButMaintainAnno:
         rmchar = self.rmchar
         charsets = self.charsets
 
+        gap_map = DegapButMaintainAnno._gap_map(seq, rmchar)
         annotations = copy(charsets)
-        index = seq.find(rmchar)
-        while index > -1:  # if any occurrence is found
-            for gene_name, indices in annotations.items():
-                if index in indices:
-                    indices.remove(index)
-                annotations[gene_name] = [e-1 if e > index else e
-                                          for e in indices]
-            seq = seq[:index] + seq[index+1:]
-            index = seq.find(rmchar)
+        for gene_name, indices in annotations.items():
+            annotations[gene_name] = Charset.from_positions(indices).remap(
+                lambda pos: DegapButMaintainAnno._to_ungapped(gap_map, pos))
+        if isinstance(seq, basestring):
+            seq = seq.replace(rmchar, '')
+        else:
+            seq = seq.ungap(rmchar)
         return seq, annotations
 
 
@@ -127,9 +168,9 @@ class RmAmbigsButMaintainAnno:
     Args:
         seq (str):      a string that represents an aligned DNA sequence;
                         example: "NNATGCNNN"
-        charsets (dict):a dictionary with gene names (str) as keys and lists
-                        of nucleotide positions (list) as values; example:
-                        {"gene_1":[0,1,2,3],"gene_2":[4,5,6,7,8]}
+        charsets (dict):a dictionary with gene names (str) as keys and
+                        Charsets (or lists of nucleotide positions) as
+                        values; example: {"gene_1":[0,1,2,3],"gene_2":[4,5,6,7,8]}
     Returns:
         tupl.   The return consists of the shortened DNA sequence and
                 the corresponding shortened charsets; example:
@@ -149,8 +190,8 @@ class RmAmbigsButMaintainAnno:
         if seq[0] == rmchar:
             lead_stripoff = len(seq)-len(seq.lstrip(rmchar))
             for gene_name, indices in charsets.items():
-                indices_shifted = [i-lead_stripoff for i in indices]
-                charsets[gene_name] = [i for i in indices_shifted if i >= 0]
+                charsets[gene_name] = Charset.from_positions(indices).\
+                    shift(-lead_stripoff).clip(start=0)
             seq = seq[lead_stripoff:]
 
         return seq, charsets
@@ -162,14 +203,91 @@ class RmAmbigsButMaintainAnno:
         '''
         if seq[-1] == rmchar:
             trail_stripoff = len(seq.rstrip(rmchar))
-            range_stripoff = range(trail_stripoff, len(seq))
             for gene_name, indices in charsets.items():
-                indices_new = copy(indices)
-                for index in range_stripoff:
-                    if index in indices_new:
-                        indices_new.remove(index)
-                #    else:
-                #        print "Warning: Index %s out of range." %(index)
-                charsets[gene_name] = indices_new
+                charsets[gene_name] = Charset.from_positions(indices).\
+                    clip(end=trail_stripoff)
             seq = seq[:trail_stripoff]
         return seq, charsets
+
+
+class DegapCache:
+    ''' This class contains a function to remove the leading and trailing
+        ambiguities of an aligned DNA sequence, to degap it and to add gap
+        charsets (see classes RmAmbigsButMaintainAnno, DegapButMaintainAnno
+        and AddGapFeature) while reusing the resulting charsets and their
+        location objects across sequences. As the charsets are identical
+        across sequences, the resulting charsets depend only on the
+        positions of the gaps and Ns of a sequence, which are summarized
+        in its signature; the results of the least recently used
+        signatures are evicted.
+    Args:
+        charsets (dict):a dictionary with gene names (str) as keys and
+                        Charsets as values; example:
+                        {"gene_1":Charset([(0, 2)])}
+        max_size (int): the maximal number of signatures held in memory
+    Raises:
+        currently nothing
+    '''
+
+    def __init__(self, charsets, max_size=degap_cache_size):
+        self.charsets = charsets
+        self.max_size = max_size
+        self.results = OrderedDict()
+
+    @staticmethod
+    def signature(seq, rmchar='N', gapchar='-'):
+        ''' This function generates the signature of an aligned sequence,
+            i.e. the digest of the length of the sequence and of the run
+            length encoding of its runs of "rmchar" and "gapchar";
+            example: "NNA--T" -> digest of "6:N0,2;-3,5;"
+        '''
+        runs = re.finditer('%s+|%s+' % (re.escape(rmchar),
+                                        re.escape(gapchar)), str(seq))
+        rle = ''.join(['%s%d,%d;' % (m.group()[0], m.start(), m.end())
+                       for m in runs])
+        return hashlib.sha1('%d:%s' % (len(seq), rle)).digest()
+
+    def degap(self, seq, rmchar='N', gapchar='-'):
+        ''' This function removes the leading and trailing ambiguities and
+            the gaps of a sequence and adds gap charsets.
+        Args:
+            seq (obj):      a Seq object of an aligned DNA sequence, in
+                            which missing data is coded as "rmchar";
+                            example: Seq("NNATG-C")
+        Returns:
+            tupl.   The return consists of the degapped sequence, the
+                    corresponding charsets (including the gap charsets)
+                    and a dictionary with the charset names as keys and
+                    independent copies of the location objects of the
+                    charsets (None for empty charsets) as values; the
+                    charsets must not be modified.
+        '''
+        seq_signature = DegapCache.signature(seq, rmchar, gapchar)
+        result = self.results.pop(seq_signature, None)
+        if result is None:
+            seq, charsets = RmAmbigsButMaintainAnno().\
+                rm_leadambig(seq, rmchar, copy(self.charsets))
+            seq, charsets = RmAmbigsButMaintainAnno().\
+                rm_trailambig(seq, rmchar, charsets)
+            seq, charsets = DegapButMaintainAnno(seq, gapchar,
+                                                 charsets).degap()
+            seq, charsets = AddGapFeature(seq, charsets).add()
+            locations = dict((charset_name, Charset.from_positions(
+                              charset_range).to_location()
+                              if charset_range else None)
+                             for charset_name, charset_range
+                             in charsets.items())
+            result = (charsets, locations)
+        else:
+            seq_str = str(seq).lstrip(rmchar).rstrip(rmchar).\
+                replace(gapchar, '')
+            seq = Seq(seq_str, seq.alphabet)
+        self.results[seq_signature] = result
+        if len(self.results) > self.max_size:
+            self.results.popitem(last=False)
+        charsets, locations = result
+        return (seq, charsets,
+                dict((charset_name, GnOps.GenerateFeatLoc.copy_location(
+                      location_object) if location_object is not None
+                      else None)
+                     for charset_name, location_object in locations.items()))
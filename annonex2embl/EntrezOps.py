@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+'''
+Classes to query the NCBI Entrez E-utilities concurrently
+'''
+
+#####################
+# IMPORT OPERATIONS #
+#####################
+
+import MyExceptions as ME
+import httplib
+import os
+import random
+import socket
+import threading
+import time
+import urllib
+import urllib2
+
+from Bio import Entrez
+from email.utils import mktime_tz, parsedate_tz
+from multiprocessing.pool import ThreadPool
+from StringIO import StringIO
+
+###############
+# AUTHOR INFO #
+###############
+
+__author__ = 'Michael Gruenstaeudl <m.gruenstaeudl@fu-berlin.de>'
+__copyright__ = 'Copyright (C) 2016-2019 Michael Gruenstaeudl'
+__info__ = 'annonex2embl'
+__version__ = '2019.05.15.1500'
+
+#############
+# DEBUGGING #
+#############
+
+import pdb
+# pdb.set_trace()
+
+####################
+# GLOBAL VARIABLES #
+####################
+
+eutils_url = 'https://eutils.ncbi.nlm.nih.gov/entrez/eutils/'
+
+# Requests per second permitted by NCBI without and with an API key
+rate_default = 3
+rate_apikey = 10
+
+# The token buckets shared by all clients of a process, keyed by rate
+shared_buckets = {}
+shared_buckets_lock = threading.Lock()
+
+###########
+# CLASSES #
+###########
+
+
+class TokenBucket:
+    ''' This class contains functions to limit the rate at which requests
+        are issued by several threads. Tokens are refilled continuously at
+        "rate" tokens per second, up to "capacity" tokens.
+    Args:
+        rate (float):   the number of tokens added per second
+        capacity (int): the maximal number of tokens; defaults to 1, so
+                        that requests are spread evenly
+    '''
+
+    def __init__(self, rate, capacity=1):
+        self.rate = float(rate)
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.last = time.time()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        ''' This function blocks until a token is available and takes it. '''
+        while True:
+            with self.lock:
+                now = time.time()
+                self.tokens = min(self.capacity,
+                                  self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class EntrezClient:
+    ''' This class contains functions to issue requests to the NCBI Entrez
+        E-utilities from several threads at once. All clients of a process
+        share one TokenBucket, so that the NCBI rate limit is honored.
+        Unlike Bio.Entrez, the email address and the API key are passed
+        with each request instead of being set globally.
+    Args:
+        email_addr (str):   your email address; example:
+                            "m.gruenstaeudl@fu-berlin.de"
+        api_key (str):      an optional NCBI API key; defaults to the
+                            environment variable NCBI_API_KEY
+        timeout (float):    the number of seconds after which a request is
+                            abandoned
+        max_tries (int):    the maximal number of attempts per request
+        n_threads (int):    the number of threads used by function "map"
+    Raises:
+        ME.MyException
+    '''
+
+    def __init__(self, email_addr, api_key=None, timeout=30, max_tries=4,
+                 n_threads=10):
+        self.email_addr = email_addr
+        self.api_key = api_key or os.environ.get('NCBI_API_KEY')
+        self.timeout = timeout
+        self.max_tries = max_tries
+        self.n_threads = n_threads
+        rate = rate_apikey if self.api_key else rate_default
+        with shared_buckets_lock:
+            if rate not in shared_buckets:
+                shared_buckets[rate] = TokenBucket(rate)
+            self.bucket = shared_buckets[rate]
+
+    @staticmethod
+    def _is_transient(error):
+        ''' An internal static function to evaluate if a failed request is
+            worth repeating; this is the case for HTTP errors 429 (too many
+            requests) and 5xx as well as for network errors and incomplete
+            responses. '''
+        if isinstance(error, urllib2.HTTPError):
+            return error.code == 429 or error.code >= 500
+        return isinstance(error, (urllib2.URLError, socket.error,
+                                  httplib.HTTPException))
+
+    @staticmethod
+    def _retry_delay(error, attempt):
+        ''' An internal static function to determine the number of seconds
+            to wait before repeating a failed request: the delay requested
+            by the server via the header "Retry-After" (in seconds or as a
+            date), if present, and otherwise an exponential backoff with
+            random jitter, so that concurrent requests are not repeated in
+            lockstep. '''
+        headers = error.info() if isinstance(error, urllib2.HTTPError) \
+            else None
+        retry_after = headers.getheader('Retry-After') if headers else None
+        if retry_after:
+            retry_after = retry_after.strip()
+            if retry_after.isdigit():
+                return float(retry_after)
+            retry_date = parsedate_tz(retry_after)
+            if retry_date is not None:
+                return max(0, mktime_tz(retry_date) - time.time())
+        return 2 ** attempt * random.uniform(0.5, 1.5)
+
+    def request(self, eutil, **params):
+        ''' This function submits a request to an E-utility via HTTP POST
+            and returns the parsed response.
+        Args:
+            eutil (str):    the name of the E-utility; example: 'esearch'
+            params (dict):  the parameters of the request; example:
+                            db='gene', term='psbI [sym]'
+        Returns:
+            record (obj):   the response as parsed by Bio.Entrez.read
+        Raises:
+            ME.MyException
+        '''
+        params['tool'] = 'annonex2embl'
+        params['email'] = self.email_addr
+        if self.api_key:
+            params['api_key'] = self.api_key
+        data = urllib.urlencode(params)
+        url = eutils_url + eutil + '.fcgi'
+        for attempt in range(self.max_tries):
+            self.bucket.acquire()
+            try:
+                handle = urllib2.urlopen(url, data, self.timeout)
+                response = handle.read()
+                handle.close()
+                break
+            except Exception as e:
+                if (not EntrezClient._is_transient(e) or
+                        attempt == self.max_tries - 1):
+                    raise ME.MyException('An error occurred while '
+                                         'retrieving data from %s: %s' %
+                                         (eutil, e))
+                time.sleep(EntrezClient._retry_delay(e, attempt))
+        try:
+            return Entrez.read(StringIO(response))
+        except Exception:
+            raise ME.MyException('An error occurred while parsing the '
+                                 'data from %s.' % (eutil))
+
+    def map(self, func, items):
+        ''' This function applies "func" to each item concurrently and
+            returns the results in the order of the items. An exception
+            raised by "func" is re-raised. '''
+        items = list(items)
+        if len(items) < 2:
+            return [func(item) for item in items]
+        pool = ThreadPool(min(self.n_threads, len(items)))
+        try:
+            return pool.map(func, items)
+        finally:
+            pool.close()
+            pool.join()
@@ -10,11 +10,12 @@ Custom operations for EMBL submission preparation tool
 import GlobalVariables as GlobVars
 import MyExceptions as ME
 
-from operator import itemgetter
-from itertools import groupby
+from CharsetOps import Charset
 from Bio import SeqFeature
+from Bio.Seq import reverse_complement
 from Bio.SeqRecord import SeqRecord
 from Bio.SeqFeature import ExactPosition, FeatureLocation, CompoundLocation
+from copy import copy
 
 ###############
 # AUTHOR INFO #
@@ -44,53 +45,38 @@ class GenerateFeatLoc:
     def __init__(self):
         pass
 
-    @staticmethod
-    def _exact(csrange):
-        ''' An internal static function to generate an exact feature
-            location. '''
-        start_pos = csrange[0]
-        stop_pos = csrange[-1] + 1
-        start_exact = ExactPosition(start_pos)
-        stop_exact = ExactPosition(stop_pos)
-        return FeatureLocation(start_exact, stop_exact)
-
-    @staticmethod
-    def _extract_contiguous_subsets(compound_integer_range):
-        ''' An internal static function to extract all contiguous
-            integer ranges from compound integer range.
-        '''
-#        Examples:
-#            Example 1:
-#            >>> compound_integer_range = [1,2,3,7,8,9]
-#            >>> _extract_contiguous_subsets(compound_integer_range)
-#            Out: [[1, 2, 3], [7, 8, 9]]
-
-        outlist = []
-        for k, g in groupby(enumerate(compound_integer_range),
-                            lambda i_x: i_x[0] - i_x[1]):
-            outlist.append(map(itemgetter(1), g))
-        return outlist
-
     def make_location(self, charset_range):
         ''' This function goes through a decision tree and generates
             fitting feature locations.
         Args:
-            charset_range (list): a list of index positions, example: [1,2,3,8,9 ...]
+            charset_range (obj): a Charset or a list of index positions,
+                                 example: [1,2,3,8,9 ...]
         Returns:
             FeatureLocation (obj):  A SeqFeature location object; either a
                                     FeatureLocation or a CompoundLocation
         Raises:
             -
         '''
-        contiguous_ranges = GenerateFeatLoc._extract_contiguous_subsets(
-            charset_range)
-        # Convert each contiguous range into an exact feature location
-        for countr, rnge in enumerate(contiguous_ranges):
-            contiguous_ranges[countr] = GenerateFeatLoc._exact(rnge)
-        if len(contiguous_ranges) > 1:
-            return CompoundLocation(contiguous_ranges)
-        else:
-            return contiguous_ranges[0]
+        # Each contiguous interval of the charset becomes an exact
+        # feature location
+        return Charset.from_positions(charset_range).to_location()
+
+    @staticmethod
+    def copy_location(location_object):
+        ''' This function generates an independent copy of a location
+            object, so that a prebuilt location can be handed out several
+            times; the copy (and each of its parts) can be modified, e.g.
+            by setting its strand, without affecting the original.
+        Args:
+            location_object (obj):  a FeatureLocation or a CompoundLocation
+        Returns:
+            location_object (obj):  a copy of the location object
+        '''
+        location_copy = copy(location_object)
+        if isinstance(location_object, CompoundLocation):
+            location_copy.parts = [copy(part) for part in
+                                   location_object.parts]
+        return location_copy
 
     def make_location_complement(self, location_object):
         location_object._set_strand(-1)
@@ -160,6 +146,52 @@ class GenerateFeatLoc:
         return location_object
 
 
+class SeqView:
+    ''' This class provides read-only access to the bases of a sequence,
+        from which the bases of a simple or compound location are
+        extracted with one slice per location part (instead of one
+        SeqRecord lookup per position).
+    Args:
+        seq (obj):  a Seq object or a string; example: Seq('ATGGAGTAA',
+                    IUPACAmbiguousDNA())
+    Returns:
+        [specific to function]
+    Raises:
+        -
+    '''
+
+    def __init__(self, seq):
+        self.seq_str = str(seq)
+
+    def bases(self, location_object, strand=None):
+        ''' This function returns the bases of a location.
+        Args:
+            location_object (obj):  a simple or compound location object,
+                                    whose parts are in ascending order
+            strand (int):           if -1, the bases are returned as the
+                                    reverse complement
+        Returns:
+            bases (str):            example: 'ATGGAGTAA'
+        '''
+        parts = getattr(location_object, 'parts', [location_object])
+        bases = ''.join([self.seq_str[int(part.start):int(part.end)]
+                         for part in parts])
+        if strand == -1:
+            bases = reverse_complement(bases)
+        return bases
+
+    def span(self, location_object):
+        ''' This function returns the bases from the start to the end of a
+            location, including the bases between its parts.
+        Args:
+            location_object (obj):  a simple or compound location object
+        Returns:
+            bases (str):            example: 'ATGGAGTAA'
+        '''
+        return self.seq_str[int(location_object.start):
+                            int(location_object.end)]
+
+
 class GenerateSeqFeature:
     ''' This class contains functions to generate SeqFeatures. '''
 
@@ -186,7 +218,7 @@ class GenerateSeqFeature:
         Raises:
             [currently nothing]
         '''
-        full_index = range(0, full_len)
+        full_index = Charset.from_range(0, full_len)
         feature_loc = GenerateFeatLoc().make_location(full_index)
         quals['mol_type'] = "genomic DNA"
         source_feature = SeqFeature.SeqFeature(
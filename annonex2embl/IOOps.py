@@ -7,13 +7,27 @@ Custom operations input and output processes
 # IMPORT OPERATIONS #
 #####################
 
+import bz2
+import gzip
+import hashlib
+import json
 import os
+import re
+import time
 import MyExceptions as ME
 
+from CharsetOps import Charset
 from csv import DictReader
-from Bio.Nexus import Nexus
+from itertools import izip, repeat
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
+from string import maketrans
 from StringIO import StringIO
+from Bio import Alphabet
 from Bio import SeqIO
+from Bio.Seq import Seq
+from Bio.SeqFeature import AfterPosition, BeforePosition, CompoundLocation, \
+    ExactPosition, FeatureLocation
 
 ###############
 # AUTHOR INFO #
@@ -59,31 +73,641 @@ class Inp:
         different ending. '''
         return fn[:fn.rfind('.')] + '.' + new_end
 
+    @staticmethod
+    def open_file(path_to_file):
+        ''' This function opens a file for reading; files compressed with
+            gzip or bzip2 are recognized by their first bytes and
+            decompressed transparently.
+        Args:
+            path_to_file (str): the path to a file
+        Returns:
+            handle (obj):       a file object
+        Raises:
+            IOError
+        '''
+        with open(path_to_file, 'rb') as handle:
+            magic = handle.read(3)
+        if magic[:2] == '\x1f\x8b':
+            return gzip.open(path_to_file, 'rb')
+        if magic == 'BZh':
+            return bz2.BZ2File(path_to_file, 'r')
+        return open(path_to_file, 'rb')
 
-    def parse_csv_file(self, path_to_csv):
-        ''' This function parses a csv file. '''
+    def parse_csv_file(self, path_to_csv, key_col=None):
+        ''' This function parses a csv file. If a column label is given
+            as "key_col", the rows are returned as a dictionary keyed by
+            the values of that column, so that each row can be looked up
+            in constant time.
+        Args:
+            path_to_csv (str): the path to a csv file
+            key_col (str):     the label of the column that uniquely
+                               identifies each row; example: "isolate"
+        Returns:
+            a_matrix (list):   a list of dictionaries (one per row) or,
+                               if "key_col" is given, an OrderedDict of
+                               these dictionaries
+        Raises:
+            ME.MyException
+        '''
         try:
-            reader = DictReader(open(path_to_csv, 'rb'), delimiter=',',
+            reader = DictReader(Inp.open_file(path_to_csv), delimiter=',',
                                 quotechar='"', skipinitialspace=True)
             a_matrix = list(reader)
         except:
             raise ME.MyException('Parsing of .csv-file unsuccessful.')
-        return a_matrix
+        if key_col is None:
+            return a_matrix
+        keyed_matrix = OrderedDict()
+        for row in a_matrix:
+            if key_col not in row:
+                raise ME.MyException('csv-file does not contain a column '
+                                     'labelled `%s`' % (key_col))
+            if row[key_col] in keyed_matrix:
+                raise ME.MyException('The sequence ID `%s` occurs more than '
+                                     'once in column `%s` of the .csv-file.'
+                                     % (row[key_col], key_col))
+            keyed_matrix[row[key_col]] = row
+        return keyed_matrix
 
     def parse_nexus_file(self, path_to_nex):
-        ''' This function parses a NEXUS file. '''
+        ''' This function parses a NEXUS file. The sequences are streamed
+            by ParseNexusStream, but collected into a single dictionary, as
+            the records are generated in alphabetical order of the sequence
+            names (which requires all names) and by name. '''
+        nex_stream = ParseNexusStream(path_to_nex)
         try:
-            aln = Nexus.Nexus()
-            aln.read(path_to_nex)
-            charsets = aln.charsets
-            matrix = aln.matrix
-        except Nexus.NexusError as ne:
-            raise ne
+            matrix = dict(nex_stream.matrix())
+            charsets = nex_stream.charsets
+        except ME.MyException as e:
+            raise e
         except:
             raise ME.MyException('Parsing of .nex-file unsuccessful.')
         return (charsets, matrix)
 
 
+class ParseNexusStream:
+    ''' This class contains functions to parse the DATA (or CHARACTERS)
+        block and the SETS block of a NEXUS file in a single pass over
+        the file. The sequences of the MATRIX are yielded one by one as
+        soon as they are complete, so that the matrix is never held as
+        a whole in memory by the parser.
+    Args:
+        path_to_nex (str):  the path to a NEXUS file, which may be compressed
+                            with gzip or bzip2; example:
+                            "/path_to_input/test.nex"
+    Returns:
+        [specific to function]
+    Raises:
+        ME.MyException
+    '''
+
+    def __init__(self, path_to_nex):
+        self.path_to_nex = path_to_nex
+        self.ntax = None
+        self.nchar = None
+        self.gap = '-'
+        self.missing = '?'
+        self.interleave = False
+        self.charsets = {}
+        self._leftover = ''
+
+    @staticmethod
+    def _strip_comments(handle):
+        ''' An internal static function to remove (possibly nested and
+            multi-line) NEXUS comments in square brackets from the lines
+            of a file. '''
+        depth = 0
+        for line in handle:
+            if depth == 0 and '[' not in line:
+                yield line
+                continue
+            outchars = []
+            for char in line:
+                if char == '[':
+                    depth += 1
+                elif char == ']' and depth > 0:
+                    depth -= 1
+                elif depth == 0:
+                    outchars.append(char)
+            yield ''.join(outchars)
+
+    @staticmethod
+    def _split_name(line):
+        ''' An internal static function to split a matrix line into the
+            taxon name (optionally in single quotes) and the remainder
+            of the line. '''
+        line = line.strip()
+        if line.startswith("'"):
+            end = line.find("'", 1)
+            if end == -1:
+                raise ME.MyException('Unbalanced quotes in taxon name `%s` '
+                                     'of .nex-file.' % (line))
+            return line[1:end], line[end+1:]
+        parts = line.split(None, 1)
+        if len(parts) == 1:
+            return parts[0], ''
+        return parts[0], parts[1]
+
+    @staticmethod
+    def _options(cmd_body):
+        ''' An internal static function to parse the options of a
+            DIMENSIONS or FORMAT command into a dictionary; example:
+            "DATATYPE=DNA GAP=- MISSING=?" ->
+            {'datatype': 'DNA', 'gap': '-', 'missing': '?'} '''
+        options = {}
+        for key, value in re.findall(r'(\w+)\s*(?:=\s*(\S+))?', cmd_body):
+            options[key.lower()] = value
+        return options
+
+    def _resolve(self, token):
+        ''' An internal function to resolve a single element of a
+            charset definition into a 0-based position or, if the element
+            names a set of positions, into a list of intervals. '''
+        if token == '.':
+            return self.nchar - 1
+        if token.isdigit():
+            return int(token) - 1
+        if token in self.charsets:
+            return self.charsets[token].intervals
+        if token.lower() == 'all':
+            return [(0, self.nchar)]
+        raise ME.MyException('Unknown element `%s` in charset definition '
+                             'of .nex-file.' % (token))
+
+    def _parse_charset(self, cmd_body):
+        ''' An internal function to parse a CHARSET command into a name
+            and a Charset, without expanding the ranges into positions;
+            example: "foo_CDS = 4-6 9" -> ('foo_CDS', Charset([(3, 6), (8, 9)]))
+        '''
+        try:
+            name, definition = cmd_body.split('=', 1)
+        except ValueError:
+            raise ME.MyException('Formatting error in charset definition '
+                                 '`%s` of .nex-file.' % (cmd_body.strip()))
+        name = name.strip().lstrip('*').strip().strip("'")
+        tokens = re.findall(r"[^\s\-\\]+|-|\\", definition)
+        intervals = []
+        indx = 0
+        while indx < len(tokens):
+            start = self._resolve(tokens[indx])
+            indx += 1
+            if isinstance(start, list):
+                intervals.extend(start)
+                continue
+            if indx < len(tokens) and tokens[indx] == '-':
+                end = self._resolve(tokens[indx+1])
+                indx += 2
+                step = 1
+                if indx < len(tokens) and tokens[indx] == '\\':
+                    step = int(tokens[indx+1])
+                    indx += 2
+                if step == 1:
+                    intervals.append((start, end+1))
+                else:
+                    intervals.extend((pos, pos+1)
+                                     for pos in xrange(start, end+1, step))
+            else:
+                intervals.append((start, start+1))
+        return name, Charset(intervals)
+
+    def _command(self, cmd):
+        ''' An internal function to evaluate a single NEXUS command
+            (i.e., the text between two semicolons) outside of the
+            MATRIX. '''
+        parts = cmd.strip().split(None, 1)
+        if not parts:
+            return
+        keyword = parts[0].lower()
+        cmd_body = parts[1] if len(parts) > 1 else ''
+        if keyword == 'dimensions':
+            options = self._options(cmd_body)
+            if 'ntax' in options:
+                self.ntax = int(options['ntax'])
+            if 'nchar' in options:
+                self.nchar = int(options['nchar'])
+        elif keyword == 'format':
+            options = self._options(cmd_body)
+            self.gap = options.get('gap') or self.gap
+            self.missing = options.get('missing') or self.missing
+            if 'interleave' in options:
+                self.interleave = options['interleave'].lower() \
+                    not in ('no', 'false')
+        elif keyword == 'charset':
+            name, positions = self._parse_charset(cmd_body)
+            self.charsets[name] = positions
+
+    def _normalize(self, chars):
+        ''' An internal function to convert the gap and the missing
+            symbols declared in the FORMAT command to "-" and "?". '''
+        if self.gap == '-' and self.missing == '?':
+            return chars
+        table = maketrans(self.gap + self.missing, '-?')
+        return chars.translate(table)
+
+    def _check_length(self, taxon, chars):
+        if len(chars) != self.nchar:
+            raise ME.MyException('Sequence `%s` of .nex-file has a length '
+                                 'of %s, but NCHAR is %s.'
+                                 % (taxon, len(chars), self.nchar))
+
+    def _matrix_rows(self, lines, skip_matrix=False):
+        ''' An internal generator function that consumes the lines of
+            the MATRIX up to its terminating semicolon and yields each
+            sequence as a tuple (taxon, sequence). Sequential matrices
+            are yielded row by row; interleaved matrices are yielded
+            after the last block. '''
+        if not self.ntax or not self.nchar:
+            raise ME.MyException('Dimensions of .nex-file must be '
+                                 'specified before the matrix.')
+        interleaved = OrderedDict()
+        taxon, chunks, length = None, [], 0
+        ntax_seen = 0
+        for line in lines:
+            end_of_matrix = ';' in line
+            if end_of_matrix:
+                line, self._leftover = line.split(';', 1)
+            if skip_matrix:
+                if end_of_matrix:
+                    return
+                continue
+            if line.strip():
+                if self.interleave:
+                    name, rest = ParseNexusStream._split_name(line)
+                    interleaved.setdefault(name, []).append(
+                        ''.join(rest.split()))
+                elif taxon is None:
+                    taxon, rest = ParseNexusStream._split_name(line)
+                    chunks, length = [], 0
+                    chunk = ''.join(rest.split())
+                    chunks.append(chunk)
+                    length += len(chunk)
+                else:
+                    chunk = ''.join(line.split())
+                    chunks.append(chunk)
+                    length += len(chunk)
+                if taxon is not None and length >= self.nchar:
+                    chars = ''.join(chunks)
+                    self._check_length(taxon, chars)
+                    ntax_seen += 1
+                    yield (taxon, self._normalize(chars))
+                    taxon, chunks, length = None, [], 0
+            if end_of_matrix:
+                break
+        if taxon is not None:
+            self._check_length(taxon, ''.join(chunks))
+        for name, name_chunks in interleaved.items():
+            chars = ''.join(name_chunks)
+            self._check_length(name, chars)
+            ntax_seen += 1
+            yield (name, self._normalize(chars))
+        if ntax_seen != self.ntax:
+            raise ME.MyException('The matrix of .nex-file contains %s '
+                                 'sequences, but NTAX is %s.'
+                                 % (ntax_seen, self.ntax))
+
+    def _events(self, skip_matrix=False):
+        ''' An internal generator function that walks once through the
+            file, evaluates all commands and yields the sequences of
+            the MATRIX as tuples (taxon, sequence). '''
+        with Inp.open_file(self.path_to_nex) as handle:
+            lines = ParseNexusStream._strip_comments(handle)
+            # Note: The lines of a command are collected in a list and
+            #       joined only once the command may be complete, so that
+            #       commands across many lines are not copied repeatedly.
+            pieces, is_keyword_known = [], False
+            for line in lines:
+                pieces.append(line)
+                if is_keyword_known and ';' not in line:
+                    continue
+                pending = ''.join(pieces)
+                while True:
+                    words = pending.split(None, 1)
+                    if words and words[0].lower() == 'matrix':
+                        # Note: The lines of the MATRIX are consumed directly
+                        #       from the file, so that they never accumulate.
+                        first = [words[1]] if len(words) > 1 else []
+                        matrix_lines = ParseNexusStream._chain(first, lines)
+                        self._leftover = ''
+                        for item in self._matrix_rows(matrix_lines,
+                                                      skip_matrix):
+                            yield item
+                        pending = self._leftover
+                        continue
+                    if ';' not in pending:
+                        break
+                    cmd, pending = pending.split(';', 1)
+                    self._command(cmd)
+                # The keyword of the pending command, once complete, is
+                # not MATRIX
+                pieces = [pending]
+                is_keyword_known = re.match(r'\s*\S+\s', pending) is not None
+            pending = ''.join(pieces)
+            if pending.strip():
+                self._command(pending)
+
+    @staticmethod
+    def _chain(first, lines):
+        ''' An internal generator function that yields the given first
+            lines, followed by the remaining lines of the file. '''
+        for line in first:
+            yield line
+        for line in lines:
+            yield line
+
+    def matrix(self):
+        ''' This function yields the sequences of the MATRIX of the
+            NEXUS file as tuples (taxon, sequence) in the order of the
+            file. Once the generator is exhausted, the charsets of the
+            file are available via the attribute "charsets".
+        Returns:
+            generator of tuples; example: ('Taxon_1', 'ATG-C')
+        Raises:
+            ME.MyException
+        '''
+        for item in self._events():
+            yield item
+
+    def parse_charsets(self):
+        ''' This function parses only the charsets of the NEXUS file,
+            skipping over the MATRIX without storing it.
+        Returns:
+            charsets (dict): a dictionary with charset names (str) as
+                             keys and Charsets as values; example:
+                             {"gene_1":Charset([(0, 2)]),
+                              "gene_2":Charset([(2, 5)])}
+        Raises:
+            ME.MyException
+        '''
+        for _ in self._events(skip_matrix=True):
+            pass
+        return self.charsets
+
+
+class EmblWriter:
+    ''' This class contains functions to format a SeqRecord in EMBL format
+        without Bio.SeqIO. The output is byte-identical to that of
+        Bio.SeqIO.write(..., 'embl') (Biopython 1.76) for the records
+        generated by annonex2embl, i.e. records with a DNA alphabet and a
+        plain Seq, without references, comments, keywords or database
+        cross-references, and with feature locations of exact or fuzzy
+        (i.e., "<" or ">") positions. Other records are detected by
+        function "is_supported".
+    Args:
+        seq_record (obj):   a SeqRecord object
+    Returns:
+        [specific to function]
+    Raises:
+        [specific to function]
+    '''
+
+    MAX_WIDTH = 80
+    QUALIFIER_INDENT = 21
+    QUALIFIER_INDENT_STR = 'FT' + ' ' * (QUALIFIER_INDENT - 2)
+    QUALIFIER_INDENT_TMP = 'FT   %s                '
+    FTQUAL_NO_QUOTE = ('anticodon', 'citation', 'codon_start', 'compare',
+                       'direction', 'estimated_length', 'mod_base', 'number',
+                       'rpt_type', 'rpt_unit_range', 'tag_peptide',
+                       'transl_except', 'transl_table')
+    FEATURE_HEADER = 'FH   Key             Location/Qualifiers\nFH\n'
+    SUPPORTED_ANNOTATIONS = set(['topology', 'data_file_division',
+                                 'organelle'])
+    SUPPORTED_POSITIONS = (ExactPosition, BeforePosition, AfterPosition)
+    EMBL_DIVISIONS = ('PHG', 'ENV', 'FUN', 'HUM', 'INV', 'MAM', 'VRT', 'MUS',
+                      'PLN', 'PRO', 'ROD', 'SYN', 'TGN', 'UNC', 'VRL', 'XXX')
+
+    def __init__(self, seq_record):
+        self.seq_record = seq_record
+        self.lines = []
+
+    @staticmethod
+    def is_supported(seq_record):
+        ''' This function evaluates if a SeqRecord can be formatted by this
+            class.
+        Args:
+            seq_record (obj):   a SeqRecord object
+        Returns:
+            True, if the record is supported; otherwise False
+        '''
+        if (seq_record.dbxrefs or not EmblWriter.SUPPORTED_ANNOTATIONS.
+                issuperset(seq_record.annotations)):
+            return False
+        if (type(seq_record.seq) is not Seq or not isinstance(
+                Alphabet._get_base_alphabet(seq_record.seq.alphabet),
+                Alphabet.DNAAlphabet)):
+            return False
+        for feature in seq_record.features:
+            if not feature.type:
+                return False
+            for part in getattr(feature.location, 'parts',
+                                [feature.location]):
+                if (type(part) is not FeatureLocation or part.ref or
+                        part.ref_db or not isinstance(part.start,
+                        EmblWriter.SUPPORTED_POSITIONS) or not
+                        isinstance(part.end, EmblWriter.SUPPORTED_POSITIONS)):
+                    return False
+            if (isinstance(feature.location, CompoundLocation) and
+                    (feature.location.ref or feature.location.ref_db)):
+                return False
+        return True
+
+    @staticmethod
+    def _position_string(pos, offset=0):
+        ''' An internal static function to format a position, with
+            "offset" added to its number. '''
+        if isinstance(pos, ExactPosition):
+            return '%i' % (pos.position + offset)
+        elif isinstance(pos, BeforePosition):
+            return '<%i' % (pos.position + offset)
+        return '>%i' % (pos.position + offset)
+
+    @staticmethod
+    def _part_string(location, rec_length):
+        ''' An internal static function to format a simple location,
+            ignoring its strand. '''
+        start, end = location.start, location.end
+        if isinstance(start, ExactPosition) and isinstance(end, ExactPosition):
+            if start.position == end.position:
+                if end.position == rec_length:
+                    return '%i^1' % (rec_length)
+                return '%i^%i' % (end.position, end.position + 1)
+            if start.position + 1 == end.position:
+                return '%i' % (end.position)
+        return (EmblWriter._position_string(start, +1) + '..' +
+                EmblWriter._position_string(end))
+
+    @staticmethod
+    def _location_string(location, rec_length):
+        ''' An internal static function to format a simple or compound
+            location; on the reverse strand, the complement is placed
+            outside of the join and the parts are listed in reverse
+            order. '''
+        if isinstance(location, CompoundLocation):
+            if location.strand == -1:
+                return 'complement(%s(%s))' % (location.operator, ','.join(
+                    [EmblWriter._part_string(part, rec_length)
+                     for part in location.parts[::-1]]))
+            return '%s(%s)' % (location.operator, ','.join(
+                [EmblWriter._location_string(part, rec_length)
+                 for part in location.parts]))
+        if location.strand == -1:
+            return 'complement(%s)' % (EmblWriter._part_string(location,
+                                                               rec_length))
+        return EmblWriter._part_string(location, rec_length)
+
+    @staticmethod
+    def _wrap_location(location):
+        ''' An internal static function to split a location string into
+            lines at commas. '''
+        length = EmblWriter.MAX_WIDTH - EmblWriter.QUALIFIER_INDENT
+        wrapped = []
+        while len(location) > length:
+            index = location[:length].rfind(',')
+            if index == -1:
+                break
+            wrapped.append(location[:index + 1])
+            location = location[index + 1:]
+        wrapped.append(location)
+        return ('\n' + EmblWriter.QUALIFIER_INDENT_STR).join(wrapped)
+
+    @staticmethod
+    def _split_multi_line(text, max_len):
+        ''' An internal static function to split a text into lines of at
+            most "max_len" characters at whitespace; single words that are
+            too long are kept on a line of their own (preceded by an empty
+            line if it is the first word, as by Bio.SeqIO). '''
+        text = text.strip()
+        if len(text) <= max_len:
+            return [text]
+        words = text.split()
+        line = ''
+        while words and len(line) + 1 + len(words[0]) <= max_len:
+            line = (line + ' ' + words.pop(0)).strip()
+        answer = [line]
+        while words:
+            line = words.pop(0)
+            while words and len(line) + 1 + len(words[0]) <= max_len:
+                line = line + ' ' + words.pop(0)
+            answer.append(line)
+        return answer
+
+    def _add_multi_line(self, tag, text):
+        for line in EmblWriter._split_multi_line(text, self.MAX_WIDTH - 5):
+            self.lines.append(tag + '   ' + line + '\n')
+
+    def _add_qualifier(self, key, value):
+        if value is None:
+            self.lines.append('%s/%s\n' % (self.QUALIFIER_INDENT_STR, key))
+            return
+        if type(value) == str:
+            value = value.replace('"', '""')
+        if (isinstance(value, (int, long)) or key in self.FTQUAL_NO_QUOTE):
+            line = '%s/%s=%s' % (self.QUALIFIER_INDENT_STR, key, value)
+        else:
+            line = '%s/%s="%s"' % (self.QUALIFIER_INDENT_STR, key, value)
+        while line.lstrip():
+            if len(line) <= self.MAX_WIDTH:
+                self.lines.append(line + '\n')
+                return
+            for index in range(min(len(line) - 1, self.MAX_WIDTH),
+                               self.QUALIFIER_INDENT + 1, -1):
+                if line[index] == ' ':
+                    break
+            if line[index] != ' ':
+                index = self.MAX_WIDTH
+            self.lines.append(line[:index] + '\n')
+            line = self.QUALIFIER_INDENT_STR + line[index:].lstrip()
+
+    def _add_feature(self, feature, rec_length):
+        location = EmblWriter._location_string(feature.location, rec_length)
+        f_type = feature.type.replace(' ', '_')
+        self.lines.append((self.QUALIFIER_INDENT_TMP % f_type)
+                          [:self.QUALIFIER_INDENT] +
+                          EmblWriter._wrap_location(location) + '\n')
+        for key, values in feature.qualifiers.items():
+            if isinstance(values, (list, tuple)):
+                for value in values:
+                    self._add_qualifier(key, value)
+            else:
+                self._add_qualifier(key, values)
+
+    def _add_sequence(self):
+        data = str(self.seq_record.seq).lower()
+        seq_len = len(data)
+        a_count = data.count('a')
+        c_count = data.count('c')
+        g_count = data.count('g')
+        t_count = data.count('t')
+        self.lines.append('SQ   Sequence %i BP; %i A; %i C; %i G; %i T; '
+                          '%i other;\n' % (seq_len, a_count, c_count, g_count,
+                          t_count, seq_len - (a_count + c_count + g_count +
+                                              t_count)))
+        for line_start in range(0, seq_len, 60):
+            line_data = data[line_start:line_start + 60]
+            blocks = [' ' + line_data[i:i + 10]
+                      for i in range(0, 60, 10)]
+            if len(line_data) < 60:
+                blocks = [block.ljust(11) for block in blocks]
+            self.lines.append('    ' + ''.join(blocks) +
+                              str(line_start + len(line_data)).rjust(10) +
+                              '\n')
+
+    def format(self, eusubm_bool=False):
+        ''' This function formats the SeqRecord in EMBL format. Upon
+            request (eusubm_bool), the ID and AC lines are masked as in
+            function Outp.format_EntryUpload.
+        Args:
+            eusubm_bool (bool): decision if the ID and AC lines are masked
+        Returns:
+            record_text (str):  the formatted record
+        Raises:
+            ValueError
+        '''
+        seq_record = self.seq_record
+        if '.' in seq_record.id and seq_record.id.rsplit('.', 1)[1].isdigit():
+            accession, version = seq_record.id.rsplit('.', 1)
+            version = 'SV ' + version
+        else:
+            accession, version = seq_record.id, ''
+        if ';' in accession:
+            raise ValueError('Cannot have semi-colon in EMBL accession, %s' %
+                             repr(str(accession)))
+        if ' ' in accession:
+            raise ValueError('Cannot have spaces in EMBL accession, %s' %
+                             repr(str(accession)))
+        topology = str(seq_record.annotations.get('topology', ''))
+        division = str(seq_record.annotations.get('data_file_division',
+                                                  'UNC'))
+        if division not in self.EMBL_DIVISIONS:
+            division = {'BCT': 'PRO', 'UNK': 'UNC'}.get(division, 'UNC')
+        ID_line = 'ID   %s; %s; %s; DNA; ; %s; %i BP.' % (
+            accession, version, topology, division, len(seq_record))
+        AC_line = 'AC   ' + accession + ';'
+        if eusubm_bool:
+            ID_line = Outp._mask_ID_line(ID_line)
+            AC_line = 'AC   XXX;'
+        self.lines = [ID_line + '\n', 'XX\n', AC_line + '\n', 'XX\n']
+        descr = seq_record.description
+        if descr == '<unknown description>':
+            descr = '.'
+        self._add_multi_line('DE', descr)
+        self.lines.append('XX\n')
+        self.lines.append('OS   .\nOC   .\nXX\n')
+        self.lines.append(self.FEATURE_HEADER)
+        rec_length = len(seq_record)
+        for feature in seq_record.features:
+            self._add_feature(feature, rec_length)
+        self.lines.append('XX\n')
+        self._add_sequence()
+        self.lines.append('//\n')
+        record_text = ''.join(self.lines)
+        self.lines = []
+        if eusubm_bool:
+            # As in Outp.format_EntryUpload, the record is preceded (instead
+            # of followed) by a newline
+            record_text = '\n' + record_text[:-1]
+        return record_text
+
+
 class Outp:
     ''' This class contains two functions for various output operations.
     Args:
@@ -97,34 +721,99 @@ class Outp:
     def __init__(self):
         pass
 
-    def write_EntryUpload(self, seq_record, outp_handle, eusubm_bool):
-        ''' This function writes a seqRecord in ENA format for a submission
+    @staticmethod
+    def _mask_ID_line(ID_line):
+        ''' An internal static function to mask all fields of an ID line
+            except the topology. '''
+        ID_line_parts = ID_line.split('; ')
+        if len(ID_line_parts) == 7:
+            ID_line_parts = ['XXX' if ID_line_parts.index(p) in
+                             [0, 1, 3, 4, 5, 6] else p for p in ID_line_parts]
+        return 'ID   ' + '; '.join(ID_line_parts)
+
+    @staticmethod
+    def format_reference_block(author_names, date_today):
+        ''' This function formats the reference block (RN, RA, RT and RL
+            lines) of a submission via Entry Upload.
+        Args:
+            author_names (str): the names of the authors; example:
+                                "Doe J.; Roe R."
+            date_today (str):   the date of submission; example:
+                                "16-OCT-2026"
+        Returns:
+            ref_block (str):    the reference block, incl. the closing
+                                "XX" line
+        '''
+        return ('RN   [1]\n' +
+                'RA   ' + author_names + '\n' +
+                'RT   ;\n' +
+                'RL   Submitted (' + date_today + ') to the INSDC.\n' +
+                'XX\n')
+
+    @staticmethod
+    def complete_EntryUpload(record_text, ref_block):
+        ''' This function completes a formatted record for a submission via
+            Entry Upload: the reference block is inserted before the feature
+            header, and the molecule type "DNA" is replaced by "genomic
+            DNA".
+        Args:
+            record_text (str):  a record formatted by function
+                                "format_EntryUpload"
+            ref_block (str):    a reference block formatted by function
+                                "format_reference_block"
+        Returns:
+            record_text (str):  the completed record
+        '''
+        FH_line = 'FH   Key             Location/Qualifiers'
+        record_text = record_text.replace(FH_line, ref_block + FH_line)
+        return record_text.replace('; DNA;', '; genomic DNA;')
+
+    def format_EntryUpload(self, seq_record, eusubm_bool, native=True,
+                           ref_block=None):
+        ''' This function formats a seqRecord in ENA format for a submission
             via Entry Upload. Upon request (eusubm_bool), it also masks the ID and AC
             lines as requested by ENA for submissions.
         Args:
             seq_record (obj)
-            outp_handle (obj)
             eusubm_bool(str)
+            native (bool):  decision if the record is formatted by class
+                            EmblWriter (where supported) instead of
+                            Bio.SeqIO
+            ref_block (str): a reference block; if given, the record is
+                            completed by function "complete_EntryUpload"
         Returns:
-            currently nothing
+            record_text (str): the formatted record
         Raises:
-            -
+            ME.MyException
         '''
+        record_text = self._format_record(seq_record, eusubm_bool, native)
+        if ref_block is not None:
+            record_text = Outp.complete_EntryUpload(record_text, ref_block)
+        return record_text
+
+    def _format_record(self, seq_record, eusubm_bool, native):
+        ''' An internal function to format a seqRecord in EMBL format (see
+            function "format_EntryUpload"). '''
+        if native and EmblWriter.is_supported(seq_record):
+            try:
+                record_text = EmblWriter(seq_record).format(eusubm_bool)
+            except (ValueError, KeyError):
+                raise ME.MyException('%s annonex2embl ERROR: Problem with \
+            `%s`. Did not write to internal handle.' % ('\n', seq_record.id))
+            # Line breaks other than newlines are normalized by the
+            # masking of Bio.SeqIO output; such records are left to it
+            if not (eusubm_bool and '\r' in record_text):
+                return record_text
         temp_handle = StringIO()
         try:
             SeqIO.write(seq_record, temp_handle, 'embl')
-        except:
+        except Exception:
             raise ME.MyException('%s annonex2embl ERROR: Problem with \
-            `%s`. Did not write to internal handle.' % ('\n', seq_name))
+            `%s`. Did not write to internal handle.' % ('\n', seq_record.id))
         if eusubm_bool:
             temp_handle_lines = temp_handle.getvalue().splitlines()
             if temp_handle_lines[0].split()[0] == 'ID':
-                ID_line = temp_handle_lines[0]
-                ID_line_parts = ID_line.split('; ')
-                if len(ID_line_parts) == 7:
-                    ID_line_parts = ['XXX' if ID_line_parts.index(p) in
-                                     [0, 1, 3, 4, 5, 6] else p for p in ID_line_parts]
-                temp_handle_lines[0] = 'ID   ' + '; '.join(ID_line_parts)
+                temp_handle_lines[0] = Outp._mask_ID_line(temp_handle_lines[0])
             if temp_handle_lines[2].split()[0] == 'AC':
                 temp_handle_lines[2] = 'AC   XXX;'
             temp_handle_new = '\n' + '\n'.join(temp_handle_lines)
@@ -133,16 +822,688 @@ class Outp:
         else:
             pass
 
-        outp_handle.write(temp_handle.getvalue())
+        record_text = temp_handle.getvalue()
         temp_handle.close()
+        return record_text
 
-        # return something?
+    def write_EntryUpload(self, seq_record, outp_handle, eusubm_bool,
+                          native=True):
+        ''' This function writes a seqRecord in ENA format for a submission
+            via Entry Upload (see function "format_EntryUpload").
+        Args:
+            seq_record (obj)
+            outp_handle (obj)
+            eusubm_bool(str)
+            native (bool)
+        Returns:
+            currently nothing
+        Raises:
+            ME.MyException
+        '''
+        outp_handle.write(self.format_EntryUpload(seq_record, eusubm_bool,
+                                                  native))
 
     def create_manifest_file(self, path_to_outfile, study, name, description = ""):
-        test = ''.join(path_to_outfile.split('.')[:-1]) + '.manifest'
+        if path_to_outfile.endswith('.gz'):
+            path_to_outfile = path_to_outfile[:-3]
+        test = '.'.join(path_to_outfile.split('.')[:-1]) + '.manifest'
         manifest = open(test, "w")
         manifest.write("STUDY\t" + study + "\n")
         manifest.write("NAME\t" + name + "\n")
         if(description != ""):
             manifest.write("Description\t" + description + "\n")
         manifest.close()
+
+
+class Journal:
+    ''' This class keeps a journal of the records that have been written
+        to the output file(s), so that an interrupted run can be resumed.
+        The journal is placed next to the output file (i.e., the output
+        file with suffix ".journal"). Its first line holds a header in JSON
+        format (i.e., the settings of the run and the answers obtained from
+        NCBI Entrez); each further line lists a completed sequence ID, the
+        name of the output file it was written to, the byte offset at which
+        the output file ends after the record (the records are flushed to
+        the output file before they are journaled) and the number of
+        records and (uncompressed) bytes of the output file up to this
+        offset. A trailing line that was not written completely is
+        disregarded.
+    Args:
+        path_to_outfile (str):  path to the output file
+        interval (float):       the maximal number of seconds between two
+                                commits to the journal
+    Raises:
+        ME.MyException
+    '''
+
+    suffix = '.journal'
+
+    def __init__(self, path_to_outfile, interval=30):
+        self.path_to_journal = path_to_outfile + Journal.suffix
+        self.interval = interval
+        self.handle = None
+        self.last_commit = time.time()
+
+    @staticmethod
+    def _encode(obj):
+        ''' An internal static function to encode the strings decoded to
+            unicode by json (recursively) as UTF-8. '''
+        if isinstance(obj, unicode):
+            return obj.encode('utf-8')
+        if isinstance(obj, list):
+            return [Journal._encode(item) for item in obj]
+        if isinstance(obj, dict):
+            return dict((Journal._encode(key), Journal._encode(value))
+                        for key, value in obj.items())
+        return obj
+
+    def read(self):
+        ''' This function reads the journal of an interrupted run.
+        Args:
+            none
+        Returns:
+            (header, entries) (tuple): the header (dict), or None if there
+                                       is no journal, and the entries (list
+                                       of tuples: seq_name, outfile name,
+                                       offset, n_records, n_bytes)
+        Raises:
+            ME.MyException
+        '''
+        if not os.path.isfile(self.path_to_journal):
+            return None, []
+        try:
+            with open(self.path_to_journal, 'rb') as journal_handle:
+                lines = journal_handle.read().split('\n')
+            header = Journal._encode(json.loads(lines[0][1:]))
+        except (IOError, ValueError) as e:
+            raise ME.MyException('Could not read journal `%s`: %s' %
+                                 (self.path_to_journal, e))
+        entries = []
+        # The last element follows the last newline and is thus incomplete
+        for line in lines[1:-1]:
+            fields = line.split('\t')
+            try:
+                entries.append((fields[0], fields[1], int(fields[2]),
+                                int(fields[3]), int(fields[4])))
+            except (IndexError, ValueError):
+                break
+        return header, entries
+
+    def start(self, header, entries=[]):
+        ''' This function (re)writes the journal with a header and the
+            entries of an interrupted run, to which further entries are
+            appended by function "commit". '''
+        path_to_tmp = self.path_to_journal + '.tmp'
+        try:
+            with open(path_to_tmp, 'wb') as journal_handle:
+                journal_handle.write('#%s\n' % (json.dumps(header,
+                                                           sort_keys=True)))
+                journal_handle.writelines('%s\t%s\t%s\t%s\t%s\n' % entry
+                                          for entry in entries)
+            os.rename(path_to_tmp, self.path_to_journal)
+            self.handle = open(self.path_to_journal, 'ab')
+        except (IOError, OSError) as e:
+            raise ME.MyException('Could not write journal `%s`: %s' %
+                                 (self.path_to_journal, e))
+        self.last_commit = time.time()
+
+    def is_due(self):
+        ''' This function evaluates if the interval between two commits has
+            passed. '''
+        return time.time() - self.last_commit >= self.interval
+
+    def commit(self, seq_names, outfile_name, offset, n_records, n_bytes):
+        ''' This function journals sequence IDs whose records have been
+            flushed to an output file. '''
+        if self.handle is not None:
+            self.handle.writelines('%s\t%s\t%s\t%s\t%s\n' % (seq_name,
+                                   outfile_name, offset, n_records, n_bytes)
+                                   for seq_name in seq_names)
+            self.handle.flush()
+        self.last_commit = time.time()
+
+    def remove(self):
+        ''' This function removes the journal once the run is completed. '''
+        if self.handle is not None:
+            self.handle.close()
+            self.handle = None
+        if os.path.isfile(self.path_to_journal):
+            os.remove(self.path_to_journal)
+
+
+class AtomicOutp:
+    ''' This class writes an output file atomically: the records are written
+        to a temporary file in the same directory (i.e., the output file
+        with suffix ".tmp") through a large buffer, in batches of about the
+        size of the buffer, and the temporary file is renamed to the output
+        file only once all records are written and synced to disk. An
+        existing output file is replaced, but not before then; if the run
+        is aborted unexpectedly, the temporary file is left in place. If the
+        name of the output file ends with ".gz", the records are compressed
+        with gzip as they are written.
+        Upon request (journal), each batch is flushed and journaled, so
+        that the run can be resumed after the last batch (see function
+        "resume"); for compressed output files, each batch then forms a
+        gzip member of its own. Uncompressed output files are also
+        journaled once the interval of the journal has passed; for
+        compressed output files, this is not done, so that the member
+        boundaries (and thus the file) depend only on the records and the
+        size of the buffer, not on the duration of the run.
+    Args:
+        path_to_outfile (str):  path to the output file
+        buffer_size (int):      size of the buffer in bytes; example:
+                                8388608 (i.e., 8 MB)
+        journal (obj):          an optional Journal object
+    Raises:
+        ME.MyException
+    '''
+
+    def __init__(self, path_to_outfile, buffer_size=8388608, journal=None):
+        self.path_to_outfile = path_to_outfile
+        self.path_to_tmp = path_to_outfile + '.tmp'
+        self.buffer_size = buffer_size
+        self.journal = journal
+        self.is_compressed = path_to_outfile.endswith('.gz')
+        self.handle = None
+        self.raw_handle = None
+        self.paths = [path_to_outfile]
+        self.n_records, self.n_bytes = 0, 0
+
+    def _open(self, mode='wb'):
+        try:
+            self.raw_handle = open(self.path_to_tmp, mode, self.buffer_size)
+        except IOError as e:
+            raise ME.MyException('Could not open `%s` for writing: %s' %
+                                 (self.path_to_tmp, e))
+        # For compressed output files, the gzip member is begun by function
+        # "_member"
+        if not self.is_compressed:
+            self.handle = self.raw_handle
+
+    def _member(self):
+        if self.handle is None:
+            # The modification time is omitted from the gzip header, so
+            # that identical records result in identical files
+            self.handle = gzip.GzipFile(self.path_to_outfile, 'wb', 6,
+                                        self.raw_handle, mtime=0)
+        return self.handle
+
+    def _write_batch(self, batch, seq_names):
+        ''' An internal function to write a batch of records and, if a
+            journal is kept, to flush and journal them. '''
+        if batch:
+            self._member().writelines(batch)
+        if self.journal is None or not seq_names:
+            return
+        if self.handle is not None and self.handle is not self.raw_handle:
+            self.handle.close()
+            self.handle = None
+        self.raw_handle.flush()
+        self.journal.commit(seq_names, os.path.basename(self.path_to_outfile),
+                            self.raw_handle.tell(), self.n_records,
+                            self.n_bytes)
+
+    def is_checkpoint_due(self):
+        ''' This function evaluates if the records written so far are to be
+            journaled before the buffer is full (see class description). '''
+        return (self.journal is not None and not self.is_compressed and
+                self.journal.is_due())
+
+    def write_records(self, record_texts, seq_names=None):
+        ''' This function writes formatted records; empty records are
+            skipped.
+        Args:
+            record_texts (iter): an iterable of formatted records (str)
+            seq_names (iter):    the sequence IDs of the records, which are
+                                 journaled (if a journal is kept)
+        Returns:
+            n_records (int):     the number of records written
+        Raises:
+            ME.MyException
+        '''
+        if self.raw_handle is None:
+            self._open()
+        if seq_names is None:
+            seq_names = repeat(None)
+        n_records = 0
+        batch, batch_names, batch_size = [], [], 0
+        # The records are iterated first, so that a generator of records
+        # runs to its end
+        for record_text, seq_name in izip(record_texts, seq_names):
+            batch_names.append(seq_name)
+            if record_text:
+                # Function writelines would write the internal
+                # representation of unicode strings
+                if isinstance(record_text, unicode):
+                    record_text = record_text.encode('utf-8')
+                batch.append(record_text)
+                batch_size += len(record_text)
+                self.n_records += 1
+                self.n_bytes += len(record_text)
+                n_records += 1
+            if batch_size >= self.buffer_size or self.is_checkpoint_due():
+                self._write_batch(batch, batch_names)
+                batch, batch_names, batch_size = [], [], 0
+        self._write_batch(batch, batch_names)
+        return n_records
+
+    def resume(self, entries):
+        ''' This function reopens the temporary file of an interrupted run
+            (or the output file, if it had already been completed) and
+            truncates it to the byte offset of the last journaled record.
+        Args:
+            entries (list): the entries of the journal (see class Journal)
+        Raises:
+            ME.MyException
+        '''
+        offset, n_records, n_bytes = entries[-1][2:]
+        if not os.path.isfile(self.path_to_tmp):
+            if os.path.isfile(self.path_to_outfile):
+                os.rename(self.path_to_outfile, self.path_to_tmp)
+            elif offset:
+                raise ME.MyException('Could not resume: neither `%s` nor `%s`'
+                                     ' exists.' % (self.path_to_tmp,
+                                                   self.path_to_outfile))
+            else:
+                self._open()
+                return
+        if os.path.getsize(self.path_to_tmp) < offset:
+            raise ME.MyException('Could not resume: `%s` is shorter than '
+                                 'journaled.' % (self.path_to_tmp))
+        self._open('r+b')
+        self.raw_handle.truncate(offset)
+        self.raw_handle.seek(offset)
+        self.n_records, self.n_bytes = n_records, n_bytes
+
+    def commit(self):
+        ''' This function syncs the temporary file to disk and renames it to
+            the output file. '''
+        if self.raw_handle is None:
+            self._open()
+        if self.is_compressed and not self.raw_handle.tell():
+            # An empty compressed output file consists of an empty member
+            self._member()
+        if self.handle is not None and self.handle is not self.raw_handle:
+            self.handle.close()
+        self.raw_handle.flush()
+        os.fsync(self.raw_handle.fileno())
+        self.raw_handle.close()
+        os.rename(self.path_to_tmp, self.path_to_outfile)
+
+    def abort(self):
+        ''' This function removes the temporary file (also after a failed
+            commit); the output file is left untouched. '''
+        if self.raw_handle is not None:
+            self.raw_handle.close()
+            if os.path.isfile(self.path_to_tmp):
+                os.remove(self.path_to_tmp)
+            self.handle = self.raw_handle = None
+
+
+class ShardedOutp:
+    ''' This class writes the records to several output files (i.e.,
+        shards), each of which is written atomically by class AtomicOutp.
+        A new shard is begun once the current shard holds the maximal
+        number of records or would exceed the maximal number of bytes.
+        Shards are named after the output file, with the shard number
+        appended to the file name; example: "out.embl" -> "out_1.embl"
+        and "out.embl.gz" -> "out_1.embl.gz". The number of bytes refers to
+        the uncompressed records.
+        Upon request (concurrent), completed shards are synced and renamed
+        in a background thread while the next shard is written.
+    Args:
+        path_to_outfile (str):  path to the output file
+        shard_size (str):       the maximal size of a shard, as a number of
+                                records (example: '1000') or a number of
+                                bytes with suffix K, M or G (example: '2G')
+        buffer_size (int):      size of the buffer in bytes
+        concurrent (bool):      decision if shards are completed in a
+                                background thread
+        journal (obj):          an optional Journal object
+    Raises:
+        ME.MyException
+    '''
+
+    def __init__(self, path_to_outfile, shard_size, buffer_size=8388608,
+                 concurrent=False, journal=None):
+        self.path_to_outfile = path_to_outfile
+        self.max_records, self.max_bytes = ShardedOutp.parse_shard_size(
+            shard_size)
+        self.buffer_size = buffer_size
+        self.journal = journal
+        self.pool = ThreadPool(1) if concurrent else None
+        self.pending = []
+        self.paths = []
+        self._next_shard()
+
+    @staticmethod
+    def parse_shard_size(shard_size):
+        ''' This function parses the maximal size of a shard.
+        Args:
+            shard_size (str):   example: '1000' or '500M'
+        Returns:
+            (max_records, max_bytes) (tuple): one of which is 0
+        Raises:
+            ME.MyException
+        '''
+        units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+        size = shard_size.strip().upper().rstrip('B')
+        try:
+            if size[-1:] in units:
+                max_records, max_bytes = 0, int(float(size[:-1]) *
+                                                units[size[-1]])
+            else:
+                max_records, max_bytes = int(size), 0
+        except ValueError:
+            max_records = max_bytes = 0
+        if max_records < 1 and max_bytes < 1:
+            raise ME.MyException('Invalid shard size `%s`.' % (shard_size))
+        return max_records, max_bytes
+
+    @staticmethod
+    def shard_path(path_to_outfile, shard_num):
+        ''' This function generates the path to a shard. '''
+        root, ext = os.path.splitext(path_to_outfile)
+        if ext == '.gz':
+            root, ext = os.path.splitext(root)
+            ext += '.gz'
+        return '%s_%s%s' % (root, shard_num, ext)
+
+    def _next_shard(self):
+        self.paths.append(ShardedOutp.shard_path(self.path_to_outfile,
+                                                 len(self.paths) + 1))
+        self.shard = AtomicOutp(self.paths[-1], self.buffer_size,
+                                self.journal)
+        self.n_records, self.n_bytes = 0, 0
+
+    def _is_full(self, record_size):
+        if not self.n_records:
+            return False
+        if self.max_records:
+            return self.n_records >= self.max_records
+        return self.n_bytes + record_size > self.max_bytes
+
+    def _commit_shard(self):
+        if self.pool is None:
+            self.shard.commit()
+        else:
+            self.pending.append(self.pool.apply_async(self.shard.commit))
+
+    def write_records(self, record_texts, seq_names=None):
+        ''' This function writes formatted records, beginning new shards as
+            required; empty records are skipped.
+        Args:
+            record_texts (iter): an iterable of formatted records (str)
+            seq_names (iter):    the sequence IDs of the records, which are
+                                 journaled (if a journal is kept)
+        Returns:
+            n_records (int):     the number of records written
+        Raises:
+            ME.MyException
+        '''
+        if seq_names is None:
+            seq_names = repeat(None)
+        n_records = 0
+        batch, batch_names, batch_size = [], [], 0
+        for record_text, seq_name in izip(record_texts, seq_names):
+            # Empty records are handed on to the shard, which journals them
+            record_size = len(record_text) if record_text else 0
+            if record_size and self._is_full(record_size):
+                self.shard.write_records(batch, batch_names)
+                batch, batch_names, batch_size = [], [], 0
+                self._commit_shard()
+                self._next_shard()
+            batch.append(record_text)
+            batch_names.append(seq_name)
+            if record_size:
+                batch_size += record_size
+                self.n_records += 1
+                self.n_bytes += record_size
+                n_records += 1
+            if batch_size >= self.buffer_size or \
+                    self.shard.is_checkpoint_due():
+                self.shard.write_records(batch, batch_names)
+                batch, batch_names, batch_size = [], [], 0
+        self.shard.write_records(batch, batch_names)
+        return n_records
+
+    def resume(self, entries):
+        ''' This function resumes an interrupted run: shards that had been
+            completed but not yet renamed are truncated to their last
+            journaled record and renamed, and the last journaled shard is
+            reopened (see function AtomicOutp.resume).
+        Args:
+            entries (list): the entries of the journal (see class Journal)
+        Raises:
+            ME.MyException
+        '''
+        last_entries = dict((entry[1], entry) for entry in entries)
+        paths = []
+        while len(paths) <= len(last_entries):
+            paths.append(ShardedOutp.shard_path(self.path_to_outfile,
+                                                len(paths) + 1))
+            if os.path.basename(paths[-1]) == entries[-1][1]:
+                break
+        else:
+            raise ME.MyException('Could not resume: the journal refers to '
+                                 'the unknown outfile `%s`.' % (entries[-1][1]))
+        for path_to_shard in paths[:-1]:
+            shard = AtomicOutp(path_to_shard, self.buffer_size)
+            if os.path.isfile(shard.path_to_tmp):
+                shard.resume([last_entries[os.path.basename(path_to_shard)]])
+                shard.commit()
+            elif not os.path.isfile(path_to_shard):
+                raise ME.MyException('Could not resume: `%s` does not exist.'
+                                     % (path_to_shard))
+        self.paths = paths[:-1]
+        self._next_shard()
+        self.shard.resume(entries)
+        self.n_records, self.n_bytes = self.shard.n_records, self.shard.n_bytes
+
+    def _join(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            for result in self.pending:
+                result.get()
+
+    def commit(self):
+        ''' This function completes the current shard and waits until all
+            shards are synced and renamed. '''
+        self._commit_shard()
+        self._join()
+
+    def abort(self):
+        ''' This function removes the temporary file of the current shard;
+            completed shards are kept. '''
+        self.shard.abort()
+        self._join()
+
+
+class ShardMerge:
+    ''' This class contains functions to split a run into shards, each of
+        which processes a contiguous slice of the alphabetically sorted
+        sequence names (e.g., on a different node), and to merge the
+        output of the shards. Each shard writes its records without the
+        reference block and without the correction of the molecule type,
+        and describes itself in a sidecar file (i.e., the outfile with
+        suffix ".shard.json"). The merged outfile is completed by function
+        Outp.complete_EntryUpload with a single reference block, so that
+        it is identical to the outfile of a run without shards.
+    Args:
+        paths_to_shards (list): paths to the outfiles of the shards
+    Returns:
+        [specific to function]
+    Raises:
+        ME.MyException
+    '''
+
+    sidecar_suffix = '.shard.json'
+
+    def __init__(self, paths_to_shards):
+        self.sidecars = []
+        for path_to_shard in paths_to_shards:
+            path_to_sidecar = path_to_shard + ShardMerge.sidecar_suffix
+            try:
+                with open(path_to_sidecar) as handle:
+                    sidecar = json.load(handle)
+            except (IOError, ValueError) as e:
+                raise ME.MyException('Could not read sidecar file `%s` of '
+                                     'shard `%s`: %s' % (path_to_sidecar,
+                                     path_to_shard, e))
+            sidecar['dir'] = os.path.dirname(path_to_shard)
+            self.sidecars.append(sidecar)
+        self.sidecars.sort(key=lambda sidecar: sidecar['shard'])
+        self._check()
+
+    @staticmethod
+    def parse_shard(shard):
+        ''' This function parses the specification of a shard.
+        Args:
+            shard (str):    the number of the shard and the number of
+                            shards; example: '2/8'
+        Returns:
+            (shard_num, n_shards) (tuple)
+        Raises:
+            ME.MyException
+        '''
+        try:
+            shard_num, n_shards = [int(num) for num in shard.split('/')]
+        except ValueError:
+            shard_num = n_shards = 0
+        if not 1 <= shard_num <= n_shards:
+            raise ME.MyException('Invalid shard `%s`; expected `i/N` with '
+                                 '1 <= i <= N.' % (shard))
+        return shard_num, n_shards
+
+    @staticmethod
+    def shard_slice(sorted_seqnames, shard_num, n_shards):
+        ''' This function returns the slice of the sorted sequence names
+            that is processed by a shard; the slices of all shards are of
+            nearly equal size and contiguous. '''
+        n_seqnames = len(sorted_seqnames)
+        return sorted_seqnames[n_seqnames * (shard_num - 1) // n_shards:
+                               n_seqnames * shard_num // n_shards]
+
+    @staticmethod
+    def input_digest(paths_to_infiles, chunk_size=1048576):
+        ''' This function returns the digest of the content of the infiles
+            of a run (i.e., the NEXUS and the CSV file), so that the shards
+            of a run can be confirmed to stem from identical infiles, even
+            if these are located at different paths on different nodes.
+        Args:
+            paths_to_infiles (list):    paths to the infiles
+            chunk_size (int):           size of the chunks read at once
+        Returns:
+            input_digest (str):         a SHA-1 digest in hexadecimal form
+        Raises:
+            ME.MyException
+        '''
+        digest = hashlib.sha1()
+        for path_to_infile in paths_to_infiles:
+            try:
+                digest.update('%s\n' % (os.path.getsize(path_to_infile)))
+                with open(path_to_infile, 'rb') as handle:
+                    for chunk in iter(lambda: handle.read(chunk_size), ''):
+                        digest.update(chunk)
+            except (IOError, OSError) as e:
+                raise ME.MyException('Could not read infile `%s`: %s' %
+                                     (path_to_infile, e))
+        return digest.hexdigest()
+
+    @staticmethod
+    def write_sidecar(path_to_outfile, sidecar):
+        ''' This function writes the sidecar file of a shard.
+        Args:
+            path_to_outfile (str):  the path to the outfile of the shard
+            sidecar (dict):         the description of the shard
+        Returns:
+            currently nothing
+        '''
+        sidecar_file = AtomicOutp(path_to_outfile + ShardMerge.sidecar_suffix)
+        sidecar_file.write_records([json.dumps(sidecar, indent=1,
+                                               sort_keys=True) + '\n'])
+        sidecar_file.commit()
+
+    def _check(self):
+        ''' An internal function to confirm that the shards are complete,
+            stem from the same infiles and settings and are in alphabetical
+            order. The date of the reference block is taken from the first
+            shard, as the shards may have been run on different days. '''
+        n_shards = self.sidecars[0]['n_shards']
+        shard_nums = [sidecar['shard'] for sidecar in self.sidecars]
+        if shard_nums != range(1, n_shards + 1):
+            raise ME.MyException('Expected shards 1 to %s, but received '
+                                 'shards %s.' % (n_shards, ', '.join(
+                                 [str(num) for num in shard_nums])))
+        for key in ['n_shards', 'input_digest', 'settings', 'author_names',
+                    'manifest_study', 'manifest_name',
+                    'manifest_description']:
+            if any(sidecar.get(key) != self.sidecars[0].get(key)
+                   for sidecar in self.sidecars):
+                raise ME.MyException('The shards differ in `%s`.' % (key))
+        last_seqname = None
+        for sidecar in self.sidecars:
+            if not sidecar['n_seqnames']:
+                continue
+            if (last_seqname is not None and
+                    sidecar['first_seqname'] <= last_seqname):
+                raise ME.MyException('The sequences of shard %s do not '
+                                     'follow those of the previous shards '
+                                     'in alphabetical order.' %
+                                     (sidecar['shard']))
+            last_seqname = sidecar['last_seqname']
+
+    def _completed_chunks(self, ref_block, chunk_size):
+        ''' An internal generator function that yields the content of all
+            shards, in chunks of complete lines, completed by function
+            Outp.complete_EntryUpload. '''
+        for sidecar in self.sidecars:
+            for outfile in sidecar['outfiles']:
+                with Inp.open_file(os.path.join(sidecar['dir'],
+                                                outfile)) as handle:
+                    leftover = ''
+                    while True:
+                        chunk = handle.read(chunk_size)
+                        if not chunk:
+                            break
+                        chunk = leftover + chunk
+                        end = chunk.rfind('\n') + 1
+                        leftover = chunk[end:]
+                        yield Outp.complete_EntryUpload(chunk[:end],
+                                                        ref_block)
+                    yield Outp.complete_EntryUpload(leftover, ref_block)
+
+    def merge(self, path_to_outfile, buffer_size=8388608):
+        ''' This function writes the records of all shards to a single
+            outfile, together with its manifest file (if specified for the
+            shards).
+        Args:
+            path_to_outfile (str):  path to the merged outfile
+            buffer_size (int):      size of the buffer in bytes
+        Returns:
+            n_seqnames (int):       the number of sequences of all shards
+        Raises:
+            ME.MyException
+        '''
+        # The strings of the sidecar file are decoded to unicode by json
+        sidecar = dict((key, value.encode('utf-8') if isinstance(value,
+                        unicode) else value) for key, value
+                       in self.sidecars[0].items())
+        ref_block = Outp.format_reference_block(sidecar['author_names'],
+                                                sidecar['date_today'])
+        outp_file = AtomicOutp(path_to_outfile, buffer_size)
+        try:
+            outp_file.write_records(self._completed_chunks(ref_block,
+                                                           buffer_size))
+        except IOError as e:
+            outp_file.abort()
+            raise ME.MyException('Could not read the outfiles of the '
+                                 'shards: %s' % (e))
+        outp_file.commit()
+        if sidecar['manifest_study'] and sidecar['manifest_name']:
+            Outp().create_manifest_file(path_to_outfile,
+                                        sidecar['manifest_study'],
+                                        sidecar['manifest_name'],
+                                        sidecar['manifest_description'])
+        return sum(sidecar['n_seqnames'] for sidecar in self.sidecars)
@@ -7,12 +7,12 @@ Classes to parse charset names
 # IMPORT OPERATIONS #
 #####################
 
+import EntrezOps
 import GlobalVariables as GlobVars
 import MyExceptions as ME
 import sys
 import pdb
 
-from Bio import Entrez
 from collections import Counter
 
 ###############
@@ -31,20 +31,53 @@ __version__ = '2019.05.15.1500'
 import pdb
 # pdb.set_trace()
 
+####################
+# GLOBAL VARIABLES #
+####################
+
+# The maximal number of gene symbols combined in one ESearch query
+gene_syms_per_query = 50
+
 ###########
 # CLASSES #
 ###########
 
 class GetEntrezInfo:
     ''' This class contains functions to obtain gene information from gene
-    symbols. '''
-
-    def __init__(self, email_addr):
+    symbols. If a cache (see CacheOps.PersistentCache) is supplied, gene
+    products are looked up in the cache before querying NCBI. All queries
+    are issued via an EntrezOps.EntrezClient. If a taxonomy index (see
+    TaxonomyOps.TaxonomyIndex) is supplied, taxon names are looked up in
+    the index instead of NCBI Taxonomy. '''
+
+    def __init__(self, email_addr, cache=None, client=None,
+                 taxonomy_index=None):
         self.email_addr = email_addr
+        self.cache = cache
+        self.client = client or EntrezOps.EntrezClient(email_addr)
+        self.taxonomy_index = taxonomy_index
 
     @staticmethod
-    def _id_lookup(gene_sym, retmax=10):
-        ''' An internal static function to convert a gene symbol to an Entrez ID
+    def _check_gene_sym(gene_sym):
+        ''' An internal static function to evaluate if a gene symbol can be
+            submitted to ESearch.
+        Args:
+            gene_sym (str): a gene symbol; example: 'psbI'
+        Returns:
+            currently nothing
+        Raises:
+            ME.MyException
+        '''
+        if not gene_sym:
+            raise ME.MyException('No gene symbol detected.')
+        if '_' in gene_sym:
+            raise ME.MyException(
+                'Gene symbol `%s` contains an '
+                'underscore, which is not allowed.' %
+                (gene_sym))
+
+    def _id_lookup(self, gene_sym, retmax=10):
+        ''' An internal function to convert a gene symbol to an Entrez ID
             via ESearch.
         Args:
             gene_sym (str): a gene symbol; example: 'psbI'
@@ -61,27 +94,15 @@ class GetEntrezInfo:
 #                >>> _id_lookup(gene_sym)
 #                Out: ['26835430', '26833718', '26833393', ...]
 
-        if not gene_sym:
-            raise ME.MyException('No gene symbol detected.')
-        if '_' in gene_sym:
-            raise ME.MyException(
-                'Gene symbol `%s` contains an '
-                'underscore, which is not allowed.' %
-                (gene_sym))
+        GetEntrezInfo._check_gene_sym(gene_sym)
         query_term = gene_sym + ' [sym]'
-        try:
-            esearch_records = Entrez.esearch(db='gene', term=query_term,
-                                             retmax=retmax, retmod='xml')
-        except BaseException:
-            raise ME.MyException('An error occurred while retrieving '
-                                 'data from %s.' % ('ESearch'))
-        parsed_records = Entrez.read(esearch_records)
+        parsed_records = self.client.request('esearch', db='gene',
+                                             term=query_term, retmax=retmax)
         entrez_id_list = parsed_records['IdList']
         return entrez_id_list
 
-    @staticmethod
-    def _gene_product_lookup(entrez_id_list):
-        ''' An internal static function to convert a list of Entrez IDs to a
+    def _gene_product_lookup(self, entrez_id_list):
+        ''' An internal function to convert a list of Entrez IDs to a
         list of Entrez gene records via EPost and ESummary.
         Args:
             entrez_id_list (list): a list of Entrez IDs; example: ['26835430',
@@ -98,25 +119,13 @@ class GetEntrezInfo:
 #                >>> _record_lookup(entrez_id_list)
 #                Out: ???
 
-        epost_query = Entrez.epost('gene', id=','.join(entrez_id_list))
-        try:
-            epost_results = Entrez.read(epost_query)
-        except BaseException:
-            raise ME.MyException(
-                'An error occurred while retrieving data from '
-                '%s.' %
-                ('EPost'))
+        epost_results = self.client.request('epost', db='gene',
+                                            id=','.join(entrez_id_list))
         webenv = epost_results['WebEnv']
         query_key = epost_results['QueryKey']
-        try:
-            esummary_records = Entrez.esummary(db='gene', webenv=webenv,
-                                               query_key=query_key)
-        except BaseException:
-            raise ME.MyException(
-                'An error occurred while retrieving data from '
-                '%s.' %
-                ('ESummary'))
-        entrez_rec_list = Entrez.read(esummary_records)
+        entrez_rec_list = self.client.request('esummary', db='gene',
+                                              webenv=webenv,
+                                              query_key=query_key)
         return entrez_rec_list
 
     @staticmethod
@@ -135,12 +144,7 @@ class GetEntrezInfo:
 #                >>> entrez_rec_list = []
 #                >>> _parse_records(entrez_rec_list)
 
-        try:
-            documentSummarySet = entrez_rec_list['DocumentSummarySet']
-            docs = documentSummarySet['DocumentSummary']
-        except BaseException:
-            raise ME.MyException('An error occurred while parsing the '
-                                 'data from %s.' % ('ESummary'))
+        docs = GetEntrezInfo._summary_docs(entrez_rec_list)
         list_gene_product = [doc['Description'] for doc in docs]
         #list_gene_symbol = [doc['NomenclatureSymbol'] for doc in docs]
         #list_gene_name = [doc['Name'] for doc in docs]
@@ -150,8 +154,103 @@ class GetEntrezInfo:
         return gene_product
 
     @staticmethod
-    def _taxname_lookup(taxon_name, retmax=1):
-        ''' An internal static function to look up a taxon name at NCBI
+    def _summary_docs(entrez_rec_list):
+        ''' An internal static function to extract the document summaries
+            from the parsed output of ESummary. '''
+        try:
+            documentSummarySet = entrez_rec_list['DocumentSummarySet']
+            docs = documentSummarySet['DocumentSummary']
+        except BaseException:
+            raise ME.MyException('An error occurred while parsing the '
+                                 'data from %s.' % ('ESummary'))
+        return docs
+
+    @staticmethod
+    def _split_gene_products(docs, entrez_ids):
+        ''' An internal static function to assign the gene records of a
+            batch query to the gene symbols whose ESearch returned their
+            Entrez IDs (via the attribute "uid" of the records) and to
+            select the gene product of each gene symbol by majority (see
+            "_parse_gene_products").
+        Args:
+            docs (list):        a list of Entrez gene records
+            entrez_ids (dict):  the Entrez IDs of the gene records found per
+                                gene symbol; example: {'matK': ['26835430',
+                                ...], 'rbcL': [...]}
+        Returns:
+            gene_products (dict): the gene products, keyed by gene symbol;
+                                  gene symbols without records are omitted
+        Raises:
+            none
+        '''
+        docs_per_id = dict((doc.attributes.get('uid'), doc) for doc in docs)
+        gene_products = {}
+        for gene_sym, entrez_id_list in entrez_ids.items():
+            list_gene_product = [docs_per_id[entrez_id]['Description']
+                                 for entrez_id in entrez_id_list
+                                 if entrez_id in docs_per_id]
+            if list_gene_product:
+                gene_products[gene_sym] = Counter(list_gene_product).\
+                    most_common()[0][0]
+        return gene_products
+
+    def _gene_products_lookup_batch(self, gene_syms, retmax=10):
+        ''' An internal function to obtain the gene products of several
+            gene symbols via one ESearch per gene symbol (as in function
+            "obtain_gene_product", i.e. with at most "retmax" hits each) and
+            a single ESummary over all Entrez IDs found, i.e. with about a
+            third of the requests of individual lookups (which also require
+            an EPost and an ESummary per gene symbol). The ESearches are not
+            combined (with OR), as the hits of a combined query would be
+            shared by all gene symbols, so that frequent gene symbols could
+            crowd out rare ones.
+            Gene symbols without hits are looked up individually (see
+            function "obtain_gene_product").
+        Args:
+            gene_syms (list):   a list of gene symbols; example:
+                                ['matK', 'rbcL']
+            retmax (int):       the number of maximally retained hits per
+                                gene symbol
+        Returns:
+            gene_products (list): the gene products in the order of
+                                  "gene_syms"
+        Raises:
+            ME.MyException
+        '''
+        entrez_ids = dict((gene_sym, self._id_lookup(gene_sym, retmax))
+                          for gene_sym in gene_syms)
+        entrez_id_list = sorted(set(entrez_id for id_list
+                                    in entrez_ids.values()
+                                    for entrez_id in id_list))
+        gene_products = {}
+        if entrez_id_list:
+            entrez_rec_list = self.client.request('esummary', db='gene',
+                id=','.join(entrez_id_list))
+            gene_products = GetEntrezInfo._split_gene_products(
+                GetEntrezInfo._summary_docs(entrez_rec_list), entrez_ids)
+        return [gene_products[gene_sym] if gene_sym in gene_products
+                else self.obtain_gene_product(gene_sym)
+                for gene_sym in gene_syms]
+
+    @staticmethod
+    def _check_taxon_name(taxon_name):
+        ''' An internal static function to evaluate if a taxon name can be
+            looked up.
+        Args:
+            taxon_name (str): a taxon name; example: 'Pyrus tamamaschjanae'
+        Returns:
+            currently nothing
+        Raises:
+            ME.MyException
+        '''
+        if not taxon_name:
+            raise ME.MyException('No taxon name detected.')
+        if '_' in taxon_name:
+            raise ME.MyException('Taxon name `%s` contains an underscore, '
+                                 'which is not allowed.' % (taxon_name))
+
+    def _taxname_lookup(self, taxon_name, retmax=1):
+        ''' An internal function to look up a taxon name at NCBI
             Taxonomy via ESearch.
         Args:
             taxon_name (str): a taxon name; example: 'Pyrus tamamaschjanae'
@@ -168,21 +267,10 @@ class GetEntrezInfo:
 #                >>> _taxname_lookup(taxon_name)
 #                Out: 0
 
-        if not taxon_name:
-            raise ME.MyException('No taxon name detected.')
-        if '_' in taxon_name:
-            raise ME.MyException('Taxon name `%s` contains an underscore, '
-                                 'which is not allowed.' % (taxon_name))
+        GetEntrezInfo._check_taxon_name(taxon_name)
         query_term = taxon_name
-        try:
-            esearch_records = Entrez.esearch(db='taxonomy', term=query_term,
-                                             retmax=retmax, retmod='xml')
-        except BaseException:
-            raise ME.MyException(
-                'An error occurred while retrieving data from '
-                '%s.' %
-                ('ESearch'))
-        parsed_records = Entrez.read(esearch_records)
+        parsed_records = self.client.request('esearch', db='taxonomy',
+                                             term=query_term, retmax=retmax)
         entrez_hitcount = parsed_records['Count']
         return entrez_hitcount
 
@@ -196,20 +284,24 @@ class GetEntrezInfo:
 #                >>> GetGeneInfo()._entrezid_lookup(gene_sym)
 #                Out: ['26835430', '26833718', '26833393', ...]
 
-        Entrez.email = self.email_addr
+        if self.cache:
+            gene_product = self.cache.get_gene_product(gene_sym)
+            if gene_product is not None:
+                return gene_product
         try:
-            entrez_id_list = GetEntrezInfo._id_lookup(gene_sym)
+            entrez_id_list = self._id_lookup(gene_sym)
         except ME.MyException as e:
             raise e
         try:
-            entrez_rec_list = GetEntrezInfo._gene_product_lookup(
-                entrez_id_list)
+            entrez_rec_list = self._gene_product_lookup(entrez_id_list)
         except ME.MyException as e:
             raise e
         try:
             gene_product = GetEntrezInfo._parse_gene_products(entrez_rec_list)
         except ME.MyException as e:
             raise e
+        if self.cache:
+            self.cache.set_gene_product(gene_sym, gene_product)
         return gene_product
 
     def does_taxon_exist(self, taxon_name):
@@ -218,29 +310,157 @@ class GetEntrezInfo:
             taxon_name (str): a taxon name; example: 'Pyrus tamamaschjanae'
             retmax (int):     the number of maximally retained hits
         Returns:
-            entrez_id_list (list): a list of Entrez IDs; example: ['26835430',
-                            '26833718', '26833393', ...]
+            taxon_status (bool): True if exactly one taxon matches, False if
+                                 no taxon matches, None otherwise
         Raises:
             none
         '''
-        Entrez.email = self.email_addr
-        try:
-            entrez_hitcount = GetEntrezInfo._taxname_lookup(taxon_name)
-        except ME.MyException as e:
-            raise e
+        if self.taxonomy_index:
+            GetEntrezInfo._check_taxon_name(taxon_name)
+            entrez_hitcount = self.taxonomy_index.hitcount(taxon_name)
+        else:
+            if self.cache:
+                is_cached, taxon_status = self.cache.\
+                    get_taxon_status(taxon_name)
+                if is_cached:
+                    return taxon_status
+            try:
+                entrez_hitcount = self._taxname_lookup(taxon_name)
+            except ME.MyException as e:
+                raise e
+        taxon_status = None
         if entrez_hitcount == '0':
-            return False
+            taxon_status = False
         if entrez_hitcount == '1':
-            return True
+            taxon_status = True
+        if self.cache and not self.taxonomy_index:
+            self.cache.set_taxon_status(taxon_name, taxon_status)
+        return taxon_status
+
+    def _lookup_concurrently(self, keys, lookup, cache_table, batched=False):
+        ''' An internal function to look up each distinct key, using the
+            cache table ("gene_product" or "taxon") where possible and
+            querying the remaining keys concurrently via "lookup". If
+            "batched", "lookup" receives the list of remaining keys and
+            returns their values in order. The cache is only accessed from
+            the calling thread. '''
+        results = {}
+        missing = []
+        for key in sorted(set(keys)):
+            if not self.cache:
+                missing.append(key)
+                continue
+            if cache_table == 'taxon':
+                is_cached, value = self.cache.get_taxon_status(key)
+            else:
+                value = self.cache.get_gene_product(key)
+                is_cached = value is not None
+            if is_cached:
+                results[key] = value
+            else:
+                missing.append(key)
+        if batched:
+            values = lookup(missing) if missing else []
+        else:
+            values = self.client.map(lookup, missing)
+        for key, value in zip(missing, values):
+            results[key] = value
+            if self.cache and cache_table == 'taxon':
+                self.cache.set_taxon_status(key, value)
+            elif self.cache:
+                self.cache.set_gene_product(key, value)
+        return results
+
+    def obtain_gene_products(self, gene_syms):
+        ''' This function obtains the gene products of several gene symbols
+            concurrently (see function "obtain_gene_product").
+        Args:
+            gene_syms (list): a list of gene symbols; example: ['matK', 'rbcL']
+        Returns:
+            gene_products (dict): the gene products, keyed by gene symbol
+        Raises:
+            ME.MyException
+        '''
+        uncached_handle = GetEntrezInfo(self.email_addr, client=self.client)
+        def lookup_batch(gene_sym_batch):
+            return zip(gene_sym_batch, uncached_handle.
+                       _gene_products_lookup_batch(gene_sym_batch))
+        def lookup(gene_syms):
+            batches = [gene_syms[i:i + gene_syms_per_query]
+                       for i in range(0, len(gene_syms), gene_syms_per_query)]
+            return [gene_product for batch in self.client.map(lookup_batch,
+                    batches) for gene_sym, gene_product in batch]
+        return self._lookup_concurrently(gene_syms, lookup, 'gene_product',
+                                         batched=True)
+
+    def do_taxa_exist(self, taxon_names):
+        ''' This function evaluates several taxon names concurrently (see
+            function "does_taxon_exist").
+        Args:
+            taxon_names (list): a list of taxon names; example:
+                                ['Pyrus caucasica', 'Pyrus']
+        Returns:
+            taxon_status (dict): the results, keyed by taxon name
+        Raises:
+            ME.MyException
+        '''
+        if self.taxonomy_index:
+            return dict((taxon_name, self.does_taxon_exist(taxon_name))
+                        for taxon_name in set(taxon_names))
+        uncached_handle = GetEntrezInfo(self.email_addr, client=self.client)
+        return self._lookup_concurrently(taxon_names,
+            uncached_handle.does_taxon_exist, 'taxon')
 
 
 class ConfirmAdjustTaxonName:
     ''' This class contains functions to confirm or adjust a sequence's
     taxon name.
+    Args:
+        taxon_status (dict): optional results of taxon name lookups, as
+                             returned by function "resolve"; taxon names
+                             that are not contained are looked up
+                             individually
     '''
 
-    def __init__(self):
-        pass
+    def __init__(self, taxon_status=None):
+        self.taxon_status = taxon_status or {}
+
+    def _does_taxon_exist(self, taxon_name, email_addr):
+        ''' An internal function to evaluate if a taxon exists, preferably
+            via the results of previous lookups. '''
+        if taxon_name in self.taxon_status:
+            return self.taxon_status[taxon_name]
+        return GetEntrezInfo(email_addr).does_taxon_exist(taxon_name)
+
+    @staticmethod
+    def resolve(taxon_names, email_addr, cache=None, taxonomy_index=None):
+        ''' This function looks up each distinct taxon name once and, for
+            those species names that are not listed in NCBI Taxonomy,
+            each distinct genus name once.
+            Args:
+                taxon_names (list): a list of taxon names; example:
+                                    ['Pyrus caucasica', 'Pyrus caucasica']
+                email_addr (dict):  your email address; example:
+                                    "m.gruenstaeudl@fu-berlin.de"
+                cache (obj):        an optional CacheOps.PersistentCache object
+                taxonomy_index (obj): an optional TaxonomyOps.TaxonomyIndex
+                                    object, which replaces NCBI Taxonomy
+            Returns:
+                taxon_status (dict): the results of the lookups, keyed by
+                                     taxon name
+            Raises:
+                ME.MyException
+        '''
+        entrez_handle = GetEntrezInfo(email_addr, cache,
+                                      taxonomy_index=taxonomy_index)
+        taxon_status = entrez_handle.do_taxa_exist(
+            [taxon_name for taxon_name in taxon_names if ' ' in taxon_name])
+        genus_names = set(taxon_name.split(' ', 1)[0] for taxon_name, status
+                          in taxon_status.items() if not status)
+        taxon_status.update(entrez_handle.do_taxa_exist(
+            [genus_name for genus_name in genus_names
+             if genus_name not in taxon_status]))
+        return taxon_status
 
     def go(self, seq_record, email_addr):
         ''' This function evaluates a taxon name against NCBI taxonomy;
@@ -261,12 +481,12 @@ class ConfirmAdjustTaxonName:
             sys.exit('%s annonex2embl ERROR: Could not locate a '
                      'whitespace between genus name and specific epithet '
                      'in taxon name of sequence `%s`.' % ('\n', seq_record.id))
-        if not GetEntrezInfo(email_addr).does_taxon_exist(seq_record.name):
+        if not self._does_taxon_exist(seq_record.name, email_addr):
             print('%s annonex2embl WARNING: Taxon name of sequence `%s` '
                   'not found in NCBI Taxonomy: `%s`. Please consider sending '
                   'a taxon request to ENA.'
                   % ('\n', seq_record.id, seq_record.name))
-            if not GetEntrezInfo(email_addr).does_taxon_exist(genus_name):
+            if not self._does_taxon_exist(genus_name, email_addr):
                 sys.exit('%s annonex2embl ERROR: Neither genus name, '
                          'nor species name of sequence `%s` were found in '
                          'NCBI Taxonomy.' % ('\n', seq_record.id))
@@ -290,14 +510,17 @@ class ParseCharsetName:
                             "psbI_CDS"
         email_addr (dict):  your email address; example:
                             "m.gruenstaeudl@fu-berlin.de"
+        product_check (bool): decision if gene products are looked up
+        cache (obj):        an optional CacheOps.PersistentCache object
     Raises:
         currently nothing
     '''
 
-    def __init__(self, charset_name, email_addr, product_check):
+    def __init__(self, charset_name, email_addr, product_check, cache=None):
         self.charset_name = charset_name
         self.email_addr = email_addr
         self.product_check = product_check
+        self.cache = cache
 
     @staticmethod
     def _extract_charstet_information(charset_name):
@@ -344,7 +567,7 @@ class ParseCharsetName:
                     "charset_sym, charset_type, charset_orient, charset_product"
         '''
         charset_sym, charset_type, charset_orient = ParseCharsetName._extract_charstet_information(self.charset_name)
-        entrez_handle = GetEntrezInfo(self.email_addr)
+        entrez_handle = GetEntrezInfo(self.email_addr, self.cache)
         if (charset_type == 'CDS' or charset_type == 'gene') and self.product_check:
             try:
                 charset_product = entrez_handle.obtain_gene_product(
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+'''
+Classes to look up taxon names in a local index of the NCBI Taxonomy
+'''
+
+#####################
+# IMPORT OPERATIONS #
+#####################
+
+import MyExceptions as ME
+import os
+import sqlite3
+
+###############
+# AUTHOR INFO #
+###############
+
+__author__ = 'Michael Gruenstaeudl <m.gruenstaeudl@fu-berlin.de>'
+__copyright__ = 'Copyright (C) 2016-2019 Michael Gruenstaeudl'
+__info__ = 'annonex2embl'
+__version__ = '2019.05.15.1500'
+
+#############
+# DEBUGGING #
+#############
+
+import pdb
+# pdb.set_trace()
+
+###########
+# CLASSES #
+###########
+
+
+class TaxonomyIndex:
+    ''' This class contains functions to build and query an SQLite index of
+        the taxon names of an NCBI Taxonomy dump (files "names.dmp" and
+        "nodes.dmp" of "taxdump.tar.gz"), so that taxon names can be
+        checked without network access.
+    Args:
+        path_to_index (str): path to an index generated by function "build"
+    Raises:
+        ME.MyException
+    '''
+
+    def __init__(self, path_to_index):
+        if not os.path.isfile(path_to_index):
+            raise ME.MyException('Taxonomy index `%s` not found.'
+                                 % (path_to_index))
+        try:
+            self.conn = sqlite3.connect(path_to_index)
+            self.conn.execute('SELECT 1 FROM names LIMIT 1')
+        except sqlite3.Error as e:
+            raise ME.MyException('Could not open taxonomy index `%s`: %s' %
+                                 (path_to_index, e))
+
+    @staticmethod
+    def _read_dmp(path_to_dmp, n_fields):
+        ''' An internal static generator function to read the first
+            "n_fields" fields of each line of a .dmp-file, in which fields
+            are separated by "\\t|\\t" and lines end with "\\t|". '''
+        with open(path_to_dmp) as dmp_handle:
+            for line in dmp_handle:
+                fields = line.rstrip('\n').rstrip('|').rstrip('\t').\
+                    split('\t|\t')
+                if len(fields) >= n_fields:
+                    yield fields[:n_fields]
+
+    @staticmethod
+    def build(path_to_names, path_to_nodes, path_to_index):
+        ''' This function indexes the taxon names (of all name classes) of
+            an NCBI Taxonomy dump. Names are stored in lower case, as
+            Entrez searches are case-insensitive; names of taxa that are
+            absent from "nodes.dmp" are skipped.
+        Args:
+            path_to_names (str): path to the file "names.dmp"
+            path_to_nodes (str): path to the file "nodes.dmp"
+            path_to_index (str): path to the index to be generated; an
+                                 existing index is replaced
+        Returns:
+            n_names (int):       the number of indexed names
+        Raises:
+            ME.MyException
+        '''
+        path_to_tmp = path_to_index + '.tmp'
+        if os.path.exists(path_to_tmp):
+            os.remove(path_to_tmp)
+        try:
+            conn = sqlite3.connect(path_to_tmp)
+            conn.execute('CREATE TABLE nodes (tax_id INTEGER PRIMARY KEY, '
+                         'rank TEXT)')
+            conn.execute('CREATE TABLE names (name TEXT, tax_id INTEGER, '
+                         'PRIMARY KEY (name, tax_id)) WITHOUT ROWID')
+            conn.executemany('INSERT INTO nodes VALUES (?, ?)',
+                ((int(tax_id), rank) for tax_id, parent_id, rank in
+                 TaxonomyIndex._read_dmp(path_to_nodes, 3)))
+            conn.execute('CREATE TEMP TABLE raw_names (name TEXT, '
+                         'tax_id INTEGER)')
+            conn.executemany('INSERT INTO raw_names VALUES (?, ?)',
+                ((name.decode('utf-8', 'replace').lower(), int(tax_id))
+                 for tax_id, name in
+                 TaxonomyIndex._read_dmp(path_to_names, 2)))
+            conn.execute('INSERT OR IGNORE INTO names SELECT raw_names.name, '
+                         'raw_names.tax_id FROM raw_names JOIN nodes ON '
+                         'raw_names.tax_id = nodes.tax_id ORDER BY 1, 2')
+            n_names = conn.execute('SELECT COUNT(*) FROM names').fetchone()[0]
+            conn.commit()
+            conn.close()
+        except (IOError, ValueError, sqlite3.Error) as e:
+            raise ME.MyException('Could not build taxonomy index `%s`: %s' %
+                                 (path_to_index, e))
+        os.rename(path_to_tmp, path_to_index)
+        return n_names
+
+    def hitcount(self, taxon_name):
+        ''' This function counts the taxa that carry a taxon name, in the
+            format of the field "Count" of an Entrez ESearch; only the
+            counts '0', '1' and '2' (i.e., more than one) are discerned.
+        Args:
+            taxon_name (str):   a taxon name; example: 'Pyrus caucasica'
+        Returns:
+            hitcount (str):     the number of taxa; example: '1'
+        Raises:
+            none
+        '''
+        if isinstance(taxon_name, str):
+            taxon_name = taxon_name.decode('utf-8', 'replace')
+        rows = self.conn.execute('SELECT tax_id FROM names WHERE name = ? '
+                                 'LIMIT 2',
+                                 (taxon_name.strip().lower(),)).fetchall()
+        return str(len(rows))
+
+    def close(self):
+        self.conn.close()
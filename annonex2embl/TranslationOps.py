@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+'''
+Classes to translate the coding charsets of all sequences of an alignment
+at once
+'''
+
+#####################
+# IMPORT OPERATIONS #
+#####################
+
+import CheckingOps as CkOps
+
+from Bio.Alphabet import IUPAC
+from Bio.Seq import Seq
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+###############
+# AUTHOR INFO #
+###############
+
+__author__ = 'Michael Gruenstaeudl <m.gruenstaeudl@fu-berlin.de>'
+__copyright__ = 'Copyright (C) 2016-2019 Michael Gruenstaeudl'
+__info__ = 'annonex2embl'
+__version__ = '2019.05.15.1500'
+
+#############
+# DEBUGGING #
+#############
+
+import pdb
+# pdb.set_trace()
+
+####################
+# GLOBAL VARIABLES #
+####################
+
+# Batch translation requires NumPy; without it, each sequence is
+# translated individually by CheckingOps.AnnoCheck
+numpy_available = np is not None
+
+###########
+# CLASSES #
+###########
+
+
+class BatchTransl:
+    ''' This class translates a coding charset in all sequences of an
+        alignment at once. The charset columns of all sequences are held
+        in a 2-D byte array (sequences x columns), which is degapped and
+        stripped of leading and trailing Ns per row (as in steps 6.3.1 to
+        6.3.5 of annonex2embl), reverse-complemented where required, and
+        translated codon by codon via a 64-entry lookup table. Rows that
+        contain ambiguous or non-DNA characters are translated by
+        CheckingOps.AnnoCheck._walk_codons instead.
+    Args:
+        alignm (dict):      a dictionary with sequence names (str) as keys
+                            and aligned sequences (str) as values
+        transl_table (int): an integer; example: 11 (for bacterial code)
+    Returns:
+        [specific to function]
+    Raises:
+        ValueError, KeyError (for an invalid translation table)
+    '''
+
+    def __init__(self, alignm, transl_table):
+        self.seq_names = sorted(alignm.keys())
+        self.seqs = [alignm[seq_name].replace('?', 'N')
+                     for seq_name in self.seq_names]
+        # Positions retained after removal of leading and trailing Ns
+        self.lead_end = np.array([len(seq) - len(seq.lstrip('N'))
+                                  for seq in self.seqs])
+        self.trail_start = np.array([len(seq.rstrip('N'))
+                                     for seq in self.seqs])
+        self.codon_table = CkOps.AnnoCheck._codon_table(
+            Seq('', IUPAC.IUPACAmbiguousDNA()), transl_table)
+        self.base_to_bits, self.complement, self.aa_lookup = \
+            BatchTransl._lookup_tables(self.codon_table)
+
+    @staticmethod
+    def _lookup_tables(codon_table):
+        ''' An internal static function to generate the lookup tables for
+            the conversion of bases to 2-bit codes (4 for any other
+            character), for the complement of bases and for the
+            translation of the 64 unambiguous codons (0 for codons that
+            are neither assigned to an amino acid nor a stop). '''
+        base_to_bits = np.full(256, 4, dtype=np.uint8)
+        for bits, base in enumerate('ACGT'):
+            base_to_bits[ord(base)] = bits
+            base_to_bits[ord(base.lower())] = bits
+        complement = np.arange(256, dtype=np.uint8)
+        for base, compl_base in zip('ACGTRYKMSWBVDHN', 'TGCAYRMKSWVBHDN'):
+            complement[ord(base)] = ord(compl_base)
+            complement[ord(base.lower())] = ord(compl_base)
+        aa_lookup = np.zeros(64, dtype=np.uint8)
+        for code in range(64):
+            codon = ''.join('ACGT'[(code >> shift) & 3] for shift in (4, 2, 0))
+            if codon in codon_table.forward_table:
+                aa_lookup[code] = ord(codon_table.forward_table[codon])
+            elif codon in codon_table.stop_codons:
+                aa_lookup[code] = ord('*')
+        return base_to_bits, complement, aa_lookup
+
+    def _block(self, charset):
+        ''' An internal function to generate the 2-D byte array of the
+            charset columns of all sequences, together with the mask of the
+            columns that are retained in each sequence. '''
+        intervals = charset.intervals
+        rows = [''.join([seq[start:end] for start, end in intervals])
+                for seq in self.seqs]
+        col_indx = np.concatenate([np.arange(start, end)
+                                   for start, end in intervals])
+        block = np.frombuffer(''.join(rows), dtype=np.uint8).\
+            reshape(len(rows), len(col_indx))
+        keep = ((block != ord('-')) &
+                (col_indx >= self.lead_end[:, None]) &
+                (col_indx < self.trail_start[:, None]))
+        return block, keep
+
+    def walks(self, charset, strand=1):
+        ''' This function translates a charset in all sequences.
+        Args:
+            charset (obj):  a CharsetOps.Charset object
+            strand (int):   -1 if the charset is on the reverse strand
+        Returns:
+            walks (dict):   a dictionary with sequence names as keys and
+                            the results of the translation as values, in
+                            the format of CheckingOps.AnnoCheck._walk_codons
+        '''
+        if not charset:
+            return dict((seq_name, ('', [], True))
+                        for seq_name in self.seq_names)
+        block, keep = self._block(charset)
+        n_rows, n_cols = block.shape
+        lengths = keep.sum(axis=1)
+        # Move the retained bases of each row to its front, in order
+        order = np.argsort(~keep, axis=1, kind='mergesort')
+        bases = np.take_along_axis(block, order, axis=1)
+        if strand == -1:
+            rev_indx = np.clip(lengths[:, None] - 1 - np.arange(n_cols), 0,
+                               None)
+            bases = self.complement[np.take_along_axis(bases, rev_indx,
+                                                       axis=1)]
+        n_codons = lengths // 3
+        max_codons = n_codons.max()
+        bits = self.base_to_bits[bases[:, :max_codons * 3]].\
+            reshape(n_rows, max_codons, 3)
+        in_frame = np.arange(max_codons) < n_codons[:, None]
+        codes = (np.minimum(bits[:, :, 0], 3).astype(np.int32) * 16 +
+                 np.minimum(bits[:, :, 1], 3) * 4 +
+                 np.minimum(bits[:, :, 2], 3))
+        amino_acids = self.aa_lookup[codes]
+        needs_walk = (((bits > 3).any(axis=2) | (amino_acids == 0)) &
+                      in_frame).any(axis=1)
+        # The complement of sequences that contain U would be RNA-specific
+        needs_walk |= ((block == ord('U')) | (block == ord('u'))).any(axis=1)
+        walks = {}
+        for row, seq_name in enumerate(self.seq_names):
+            if needs_walk[row]:
+                extract = bases[row, :lengths[row]].tostring()
+                if strand == -1 and 'U' in extract.upper():
+                    # The per-sequence path reproduces this case exactly
+                    continue
+                row_aas, stop_indices, valid = CkOps.AnnoCheck.\
+                    _walk_codons(Seq(extract, IUPAC.IUPACAmbiguousDNA()),
+                                 self.codon_table)
+                walks[seq_name] = (''.join(row_aas), stop_indices, valid)
+            else:
+                row_aas = amino_acids[row, :n_codons[row]]
+                walks[seq_name] = (row_aas.tostring(),
+                    np.flatnonzero(row_aas == ord('*')).tolist(), True)
+        return walks
+
+
+class CodonWalks:
+    ''' This class translates the coding charsets of a set of aligned
+        sequences lazily: each charset is translated in all sequences at
+        once (see class BatchTransl) upon its first request. Identical
+        aligned sequences are translated only once, as the translations are
+        keyed by the aligned sequence.
+    Args:
+        coding_charsets (dict): a dictionary with charset names as keys and
+                                tuples of a CharsetOps.Charset object and
+                                its strand (1 or -1) as values
+        transl_table (int):     an integer; example: 11 (for bacterial code)
+    Returns:
+        [specific to function]
+    Raises:
+        -
+    '''
+
+    def __init__(self, coding_charsets, transl_table):
+        self.coding_charsets = coding_charsets
+        self.transl_table = transl_table
+        self.aligned_seqs = []
+        self.batch_transl = None
+        self.walks = {}
+
+    def set_seqs(self, aligned_seqs):
+        ''' This function specifies the aligned sequences to be translated
+            and discards any earlier translations.
+        Args:
+            aligned_seqs (list):    a list of aligned sequences (str)
+        Returns:
+            none
+        '''
+        self.aligned_seqs = aligned_seqs
+        self.batch_transl = None
+        self.walks = {}
+
+    def _batch(self):
+        ''' An internal function to set up the batch translation of the
+            specified sequences, unless NumPy is unavailable or the
+            translation table is invalid (None). '''
+        if self.batch_transl is None:
+            self.batch_transl = False
+            if numpy_available and self.aligned_seqs:
+                try:
+                    self.batch_transl = BatchTransl(dict(
+                        (aligned_seq, aligned_seq)
+                        for aligned_seq in self.aligned_seqs),
+                        self.transl_table)
+                except (ValueError, KeyError):
+                    pass
+        return self.batch_transl or None
+
+    def get(self, charset_name, aligned_seq):
+        ''' This function returns the translation of a charset in an aligned
+            sequence, in the format of CheckingOps.AnnoCheck._walk_codons.
+        Args:
+            charset_name (str): the name of the charset
+            aligned_seq (str):  the aligned sequence
+        Returns:
+            walk (tupl):        the translation, or None if the charset is
+                                not a coding charset or the sequence has not
+                                been translated in batch
+        '''
+        if charset_name not in self.coding_charsets:
+            return None
+        if charset_name not in self.walks:
+            batch_transl = self._batch()
+            if batch_transl is None:
+                return None
+            charset, strand = self.coding_charsets[charset_name]
+            self.walks[charset_name] = batch_transl.walks(charset, strand)
+        return self.walks[charset_name].get(aligned_seq)
+
+    def translate_all(self):
+        ''' This function translates all coding charsets at once (e.g.,
+            before forking worker processes, which thus share the
+            translations).
+        Args:
+            -
+        Returns:
+            none
+        '''
+        for charset_name in self.coding_charsets:
+            self.get(charset_name, None)
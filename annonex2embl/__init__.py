@@ -1,2 +1,3 @@
-__all__ = ['Annonex2emblMain', 'CheckingOps', 'DegappingOps', 'GenerationOps',
-           'GlobalVariables', 'IOOps', 'MyExceptions', 'ParsingOps','CLIOps']
+__all__ = ['Annonex2emblMain', 'CacheOps', 'CharsetOps', 'CheckingOps', 'DegappingOps',
+           'EntrezOps', 'GenerationOps', 'GlobalVariables', 'IOOps', 'MyExceptions',
+           'ParsingOps', 'TaxonomyOps', 'TranslationOps', 'CLIOps']
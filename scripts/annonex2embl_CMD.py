@@ -55,13 +55,13 @@ if __name__ == '__main__':
     ### REQUIRED ###
     parser.add_argument('-n',
                         '--nexus',
-                        help='absolute path to infile; infile in NEXUS format; Example: /path_to_input/test.nex',
+                        help='absolute path to infile; infile in NEXUS format, optionally compressed with gzip or bzip2; Example: /path_to_input/test.nex',
                         default='/home/username/Desktop/test.nex',
                         required=True)
 
     parser.add_argument('-c',
                         '--csv',
-                        help='absolute path to infile; infile in CSV format; Example: /path_to_input/test.csv',
+                        help='absolute path to infile; infile in CSV format, optionally compressed with gzip or bzip2; Example: /path_to_input/test.csv',
                         default='/home/username/Desktop/test.csv',
                         required=True)
 
@@ -85,7 +85,7 @@ if __name__ == '__main__':
 
     parser.add_argument('-o',
                         '--outfile',
-                        help='absolute path to outfile; outfile in EMBL format; Example: /path_to_output/test.embl',
+                        help='absolute path to outfile; outfile in EMBL format, compressed with gzip if the name ends with .gz; Example: /path_to_output/test.embl',
                         default='/home/username/Desktop/test.embl',
                         required=True)
 
@@ -159,6 +159,61 @@ if __name__ == '__main__':
                         default='1',
                         required=False)
 
+    parser.add_argument('--jobs',
+                        #metavar='number of processes',
+                        help='Number of worker processes to generate the sequence records with (default: 1)',
+                        default='1',
+                        required=False)
+
+    parser.add_argument('--cache-dir',
+                        #metavar='cache directory',
+                        help='Directory of a persistent cache for NCBI Entrez lookups and for the records of earlier runs, which are reused for unchanged sequences (default: no cache)',
+                        default='',
+                        required=False)
+
+    parser.add_argument('--cache-ttl',
+                        #metavar='time-to-live',
+                        help='Number of days after which the cached results of NCBI Entrez lookups expire (translations and records never expire); 0 means never (default: 30)',
+                        default='30',
+                        required=False)
+
+    parser.add_argument('--taxonomy-index',
+                        #metavar='taxonomy index',
+                        help='Path to a local index of NCBI Taxonomy (see annonex2embl_taxdump_CMD.py), which replaces the online queries of --taxcheck (default: none)',
+                        default='',
+                        required=False)
+
+    parser.add_argument('--embl-writer',
+                        #metavar='EMBL writer',
+                        help='Writer of the EMBL records; "biopython" uses Bio.SeqIO instead of the native writer (default: native)',
+                        choices=['native', 'biopython'],
+                        default='native',
+                        required=False)
+
+    parser.add_argument('--buffer-size',
+                        #metavar='buffer size',
+                        help='Size of the output buffer in megabytes; records are written in batches of this size (default: 8)',
+                        default='8',
+                        required=False)
+
+    parser.add_argument('--shard-size',
+                        #metavar='shard size',
+                        help='Maximal size of an output file, as a number of records (example: 1000) or of bytes (example: 500M); the records are written to several output files (<outfile>_1.embl, <outfile>_2.embl, ...), each with its own manifest file (default: one output file)',
+                        default='',
+                        required=False)
+
+    parser.add_argument('--shard',
+                        #metavar='shard',
+                        help='Process only the i-th of N slices of the alphabetically sorted sequences, e.g. on one of several nodes; the outfiles of all N shards are combined with annonex2embl-merge; Example: 2/8 (default: all sequences)',
+                        default='',
+                        required=False)
+
+    parser.add_argument('--resume',
+                        #metavar='resume',
+                        help='A logical; Shall the written records be listed in a journal next to the outfile (<outfile>.journal), so that an interrupted run is resumed after its last listed record by rerunning it with the same arguments?',
+                        default='False',
+                        required=False)
+
     parser.add_argument('--version',
                         help='Print version information and exit',
                         action='version',
@@ -189,4 +244,13 @@ if __name__ == '__main__':
                                 args.collabel,
                                 args.ttable,
                                 args.organelle,
-                                args.seqvers )
+                                args.seqvers,
+                                jobs=args.jobs,
+                                cache_dir=args.cache_dir,
+                                cache_ttl=args.cache_ttl,
+                                taxonomy_index=args.taxonomy_index,
+                                embl_writer=args.embl_writer,
+                                buffer_size=args.buffer_size,
+                                shard_size=args.shard_size,
+                                shard=args.shard,
+                                resume=args.resume )
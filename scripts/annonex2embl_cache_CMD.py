@@ -0,0 +1,154 @@
+#!/usr/bin/env python2.7
+'''
+annonex2embl cache maintenance wrapper
+'''
+
+#####################
+# IMPORT OPERATIONS #
+#####################
+
+import sys
+import os
+import time
+
+# Add specific directory to sys.path in order to import its modules
+# NOTE: THIS RELATIVE IMPORTING IS AMATEURISH.
+# NOTE: COULD THE FOLLOWING IMPORT BE REPLACED WITH 'import annonex2embl'?
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'annonex2embl'))
+
+# IMPORTANT: TFL must be after "sys.path.append"
+import CacheOps as CaOps
+import IOOps
+import MyExceptions as ME
+import ParsingOps as PrOps
+
+###############
+# AUTHOR INFO #
+###############
+
+__author__ = 'Michael Gruenstaeudl <m.gruenstaeudl@fu-berlin.de>'
+__copyright__ = 'Copyright (C) 2016-2019 Michael Gruenstaeudl'
+__info__ = 'annonex2embl'
+__version__ = '2019.05.15.1500'
+
+#############
+# DEBUGGING #
+#############
+
+import pdb
+# pdb.set_trace()
+
+#############
+# FUNCTIONS #
+#############
+
+def inspect(persistent_cache, args):
+    for table, key, value, timestamp, fresh in persistent_cache.entries():
+        # Formatted records are stored compressed
+        if table == 'record':
+            value = '(%s bytes compressed)' % (len(value))
+        print('%s\t%s\t%s\t%s\t%s' % (table, key, value,
+              time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp)),
+              'fresh' if fresh else 'expired'))
+
+
+def prefetch(persistent_cache, args):
+    gene_syms = list(args.symbols)
+    if args.nexus:
+        charsets = IOOps.ParseNexusStream(args.nexus).parse_charsets()
+        for charset_name in sorted(charsets.keys()):
+            charset_sym, charset_type, charset_orient = PrOps.\
+                ParseCharsetName._extract_charstet_information(charset_name)
+            if charset_type in ['CDS', 'gene']:
+                gene_syms.append(charset_sym)
+    gene_products = PrOps.GetEntrezInfo(args.email, persistent_cache).\
+        obtain_gene_products(gene_syms)
+    for gene_sym in sorted(gene_products.keys()):
+        print('%s\t%s' % (gene_sym, gene_products[gene_sym]))
+
+
+def merge(persistent_cache, args):
+    for cache_dir in args.cache_dirs:
+        n_merged = persistent_cache.merge(cache_dir)
+        print('Merged %s entries from `%s`.' % (n_merged, cache_dir))
+
+
+def clear(persistent_cache, args):
+    n_removed = persistent_cache.clear(args.expired)
+    print('Removed %s entries from `%s`.' % (n_removed,
+                                             persistent_cache.path_to_cache))
+
+############
+# ARGPARSE #
+############
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="  --  ".join([__author__, __copyright__, __info__, __version__]))
+
+    ### REQUIRED ###
+    parser.add_argument('--cache-dir',
+                        help='Directory of the persistent cache for NCBI Entrez lookups; Example: /path_to_cache/',
+                        required=True)
+
+    ### OPTIONAL ###
+    parser.add_argument('--cache-ttl',
+                        help='Number of days after which the cached results of NCBI Entrez lookups expire (translations and records never expire); 0 means never (default: 30)',
+                        default='30',
+                        required=False)
+
+    parser.add_argument('--version',
+                        help='Print version information and exit',
+                        action='version',
+                        version='%(prog)s ' + __version__)
+
+    subparsers = parser.add_subparsers(title='subcommands')
+
+    parser_inspect = subparsers.add_parser('inspect',
+                        help='List all entries of the cache')
+    parser_inspect.set_defaults(func=inspect)
+
+    parser_prefetch = subparsers.add_parser('prefetch',
+                        help='Look up gene products and store them in the cache')
+    parser_prefetch.add_argument('-e',
+                        '--email',
+                        help='Your email address; Example: "my.username@gmail.com"',
+                        required=True)
+    parser_prefetch.add_argument('-n',
+                        '--nexus',
+                        help='absolute path to infile in NEXUS format, whose CDS and gene charsets are prefetched; Example: /path_to_input/test.nex',
+                        default='',
+                        required=False)
+    parser_prefetch.add_argument('symbols',
+                        help='Gene symbols; Example: matK rbcL',
+                        nargs='*')
+    parser_prefetch.set_defaults(func=prefetch)
+
+    parser_merge = subparsers.add_parser('merge',
+                        help='Copy the entries of other caches (e.g., the node-local caches of the shards of a run) into the cache')
+    parser_merge.add_argument('cache_dirs',
+                        help='Directories of the other caches; Example: /node1_cache/ /node2_cache/',
+                        nargs='+')
+    parser_merge.set_defaults(func=merge)
+
+    parser_clear = subparsers.add_parser('clear',
+                        help='Remove entries from the cache')
+    parser_clear.add_argument('--expired',
+                        help='Remove only the expired results of NCBI Entrez lookups',
+                        action='store_true')
+    parser_clear.set_defaults(func=clear)
+
+    args = parser.parse_args()
+
+
+########
+# MAIN #
+########
+
+    try:
+        persistent_cache = CaOps.PersistentCache(args.cache_dir,
+                                                 args.cache_ttl)
+        args.func(persistent_cache, args)
+        persistent_cache.close()
+    except ME.MyException as e:
+        sys.exit('%s annonex2embl ERROR: %s' % ('\n', e))
@@ -0,0 +1,81 @@
+#!/usr/bin/env python2.7
+'''
+annonex2embl wrapper to merge the outfiles of shards
+'''
+
+#####################
+# IMPORT OPERATIONS #
+#####################
+
+import sys
+import os
+
+# Add specific directory to sys.path in order to import its modules
+# NOTE: THIS RELATIVE IMPORTING IS AMATEURISH.
+# NOTE: COULD THE FOLLOWING IMPORT BE REPLACED WITH 'import annonex2embl'?
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'annonex2embl'))
+
+# IMPORTANT: TFL must be after "sys.path.append"
+import IOOps
+import MyExceptions as ME
+
+###############
+# AUTHOR INFO #
+###############
+
+__author__ = 'Michael Gruenstaeudl <m.gruenstaeudl@fu-berlin.de>'
+__copyright__ = 'Copyright (C) 2016-2019 Michael Gruenstaeudl'
+__info__ = 'annonex2embl'
+__version__ = '2019.05.15.1500'
+
+#############
+# DEBUGGING #
+#############
+
+import pdb
+# pdb.set_trace()
+
+############
+# ARGPARSE #
+############
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="  --  ".join([__author__, __copyright__, __info__, __version__]))
+
+    ### REQUIRED ###
+    parser.add_argument('-o',
+                        '--outfile',
+                        help='absolute path to the merged outfile; outfile in EMBL format, compressed with gzip if the name ends with .gz; Example: /path_to_output/test.embl',
+                        required=True)
+
+    parser.add_argument('shards',
+                        help='absolute paths to the outfiles of the shards (i.e., of the runs with option --shard), in any order; Example: /path_to_output/test_1.embl /path_to_output/test_2.embl',
+                        nargs='+')
+
+    ### OPTIONAL ###
+    parser.add_argument('--buffer-size',
+                        #metavar='buffer size',
+                        help='Size of the output buffer in megabytes (default: 8)',
+                        default='8',
+                        required=False)
+
+    parser.add_argument('--version',
+                        help='Print version information and exit',
+                        action='version',
+                        version='%(prog)s ' + __version__)
+
+    args = parser.parse_args()
+
+
+########
+# MAIN #
+########
+
+    try:
+        n_seqnames = IOOps.ShardMerge(args.shards).merge(args.outfile,
+            int(float(args.buffer_size) * 1024 * 1024))
+    except ME.MyException as e:
+        sys.exit('%s annonex2embl ERROR: %s' % ('\n', e))
+    print('Merged %s shards with %s sequences into `%s`.' %
+          (len(args.shards), n_seqnames, args.outfile))
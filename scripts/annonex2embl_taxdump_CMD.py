@@ -0,0 +1,76 @@
+#!/usr/bin/env python2.7
+'''
+annonex2embl wrapper to index a local NCBI Taxonomy dump
+'''
+
+#####################
+# IMPORT OPERATIONS #
+#####################
+
+import sys
+import os
+
+# Add specific directory to sys.path in order to import its modules
+# NOTE: THIS RELATIVE IMPORTING IS AMATEURISH.
+# NOTE: COULD THE FOLLOWING IMPORT BE REPLACED WITH 'import annonex2embl'?
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'annonex2embl'))
+
+# IMPORTANT: TFL must be after "sys.path.append"
+import MyExceptions as ME
+import TaxonomyOps as TxOps
+
+###############
+# AUTHOR INFO #
+###############
+
+__author__ = 'Michael Gruenstaeudl <m.gruenstaeudl@fu-berlin.de>'
+__copyright__ = 'Copyright (C) 2016-2019 Michael Gruenstaeudl'
+__info__ = 'annonex2embl'
+__version__ = '2019.05.15.1500'
+
+#############
+# DEBUGGING #
+#############
+
+import pdb
+# pdb.set_trace()
+
+############
+# ARGPARSE #
+############
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="  --  ".join([__author__, __copyright__, __info__, __version__]))
+
+    ### REQUIRED ###
+    parser.add_argument('-t',
+                        '--taxdump',
+                        help='absolute path to the directory of the unpacked NCBI Taxonomy dump (ftp://ftp.ncbi.nih.gov/pub/taxonomy/taxdump.tar.gz), which contains names.dmp and nodes.dmp; Example: /path_to_input/taxdump/',
+                        required=True)
+
+    parser.add_argument('-o',
+                        '--outfile',
+                        help='absolute path to the taxonomy index to be generated; Example: /path_to_output/taxonomy.sqlite',
+                        required=True)
+
+    parser.add_argument('--version',
+                        help='Print version information and exit',
+                        action='version',
+                        version='%(prog)s ' + __version__)
+
+    args = parser.parse_args()
+
+
+########
+# MAIN #
+########
+
+    try:
+        n_names = TxOps.TaxonomyIndex.build(
+            os.path.join(args.taxdump, 'names.dmp'),
+            os.path.join(args.taxdump, 'nodes.dmp'),
+            args.outfile)
+    except ME.MyException as e:
+        sys.exit('%s annonex2embl ERROR: %s' % ('\n', e))
+    print('Indexed %s taxon names in `%s`.' % (n_names, args.outfile))
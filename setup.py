@@ -37,7 +37,8 @@ setup(
     zip_safe=False,
     entry_points={
         'console_scripts': [
-            'annonex2embl = annonex2embl.CLIOps:start_annonex2embl'
+            'annonex2embl = annonex2embl.CLIOps:start_annonex2embl',
+            'annonex2embl-merge = annonex2embl.CLIOps:start_annonex2embl_merge'
         ],
     },
 )
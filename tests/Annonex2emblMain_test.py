@@ -0,0 +1,284 @@
+#!/usr/bin/env python
+'''
+Unit Tests for the functions of the module `Annonex2emblMain`
+'''
+
+#####################
+# IMPORT OPERATIONS #
+#####################
+
+import unittest
+import shutil
+import tempfile
+
+# Add specific directory to sys.path in order to import its modules
+# NOTE: THIS RELATIVE IMPORTING IS AMATEURISH.
+# NOTE: COULD THE FOLLOWING IMPORT BE REPLACED WITH 'import annonex2embl'?
+import sys, os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'annonex2embl'))
+
+import Annonex2emblMain as Main
+import MyExceptions as ME
+
+from StringIO import StringIO
+
+###############
+# AUTHOR INFO #
+###############
+
+__author__ = 'Michael Gruenstaeudl <m.gruenstaeudl@fu-berlin.de>'
+__copyright__ = 'Copyright (C) 2016-2019 Michael Gruenstaeudl'
+__info__ = 'annonex2embl'
+__version__ = '2019.05.15.1500'
+
+#############
+# DEBUGGING #
+#############
+
+#import pdb
+#pdb.set_trace()
+
+####################
+# GLOBAL VARIABLES #
+####################
+
+path_to_input = os.path.join(os.path.dirname(__file__), '..', 'examples',
+                             'input')
+
+nex_gapped = '''#NEXUS
+BEGIN DATA;
+DIMENSIONS NTAX=2 NCHAR=27;
+FORMAT DATATYPE=DNA GAP=- MISSING=?;
+MATRIX
+Taxon_1  ATGGAT---AAAGAGTTTCCCGGGTAA
+Taxon_2  ATGGATCTTAAAGAGTTTCCCGGGTAA
+;
+END;
+BEGIN SETS;
+CHARSET foo_CDS = 1-27;
+END;
+'''
+
+# Variants of the sequences of example dataset TestData1, which differ
+# outside of the charsets
+nex_variants = '''#NEXUS
+BEGIN DATA;
+DIMENSIONS NTAX=12 NCHAR=38;
+FORMAT DATATYPE=DNA GAP=- MISSING=?;
+MATRIX
+''' + ''.join(['Taxon_%s_%s  %s%s\n' % (taxon, base, seq, base * 2)
+               for taxon, seq in [
+                   (1, 'TAAATGGATATATAGAGTCAGCATTCCGGACTTTAA'),
+                   (2, 'TAAATG---ATATAGAGTC------CC---CTTTAA'),
+                   (3, '???ATG---ATATAGAGTC------CCTGACTTTAA')]
+               for base in 'ACGT']) + ''';
+END;
+BEGIN SETS;
+CHARSET foo_CDS = 4-12 17-25 28-36;
+CHARSET foo_gene = 4-12 17-25 28-36;
+END;
+'''
+
+csv_variants = 'isolate,organism,country\n' + ''.join(
+    ['Taxon_%s_%s,Taxon %s,Country_%s\n' % (taxon, base, taxon, taxon)
+     for taxon in [1, 2, 3] for base in 'ACGT'])
+
+nex_identical = '''#NEXUS
+BEGIN DATA;
+DIMENSIONS NTAX=3 NCHAR=38;
+FORMAT DATATYPE=DNA GAP=- MISSING=?;
+MATRIX
+Taxon_1  TAAATGGATATATAGAGTCAGCATTCCGGACTTTAACG
+Taxon_2  TAAATGGATATATAGAGTCAGCATTCCGGACTTTAACG
+Taxon_3  TAAATG---ATATAGAGTC------CC---CTTTAACG
+;
+END;
+BEGIN SETS;
+CHARSET foo_CDS = 4-12 17-25 28-36;
+CHARSET foo_gene = 4-12 17-25 28-36;
+END;
+'''
+
+csv_identical = '''isolate,organism,country
+Taxon_1,Taxon one,Country_1
+Taxon_2,Taxon two,Country_2
+Taxon_3,Taxon three,Country_3
+'''
+
+csv_gapped = '''isolate,organism,country
+Taxon_1,Taxon one,Country_1
+Taxon_2,Taxon two,Country_2
+'''
+
+###########
+# CLASSES #
+###########
+
+class Annonex2emblTestCases(unittest.TestCase):
+    ''' Tests for function `annonex2embl` '''
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.generate_record = Main.generate_record
+        self.addCleanup(setattr, Main, 'generate_record',
+                        self.generate_record)
+
+    def _run(self, outfile, dataset='TestData1', input_dir=path_to_input,
+             **kwargs):
+        ''' Runs annonex2embl on a dataset (by default, an example dataset)
+            and returns the printed output. '''
+        stdout = sys.stdout
+        sys.stdout = StringIO()
+        try:
+            Main.annonex2embl(
+                os.path.join(input_dir, dataset + '.nex'),
+                os.path.join(input_dir, dataset + '.csv'),
+                'chloroplast trnR-atpA intergenic spacer',
+                'm.gruenstaeudl@fu-berlin.de', 'Doe J.; Roe R.',
+                os.path.join(self.tmp_dir, outfile), **kwargs)
+        finally:
+            log = sys.stdout.getvalue()
+            sys.stdout = stdout
+        return log
+
+    def _write(self, filename, content):
+        with open(os.path.join(self.tmp_dir, filename), 'w') as handle:
+            handle.write(content)
+
+    def _read(self, outfile):
+        with open(os.path.join(self.tmp_dir, outfile)) as handle:
+            return handle.read()
+
+    def _fail_after(self, n_records, exception):
+        ''' Lets the record generation fail after "n_records" records and
+            returns the list of the sequences generated. '''
+        generated = []
+        def generate_record(seq_name):
+            if len(generated) == n_records:
+                raise exception
+            generated.append(seq_name)
+            return self.generate_record(seq_name)
+        Main.generate_record = generate_record
+        return generated
+
+    def test_1_annonex2embl(self):
+        ''' This test evaluates that a journaled run that fails partway
+        keeps its records and is resumed after the last record written. '''
+        self._run('reference.embl')
+        self._fail_after(1, ME.MyException('foobar'))
+        with self.assertRaises(SystemExit):
+            self._run('out.embl', resume='True', buffer_size='0.00001')
+        self.assertTrue(os.path.isfile(os.path.join(self.tmp_dir,
+                                                    'out.embl.tmp')))
+        self.assertTrue(os.path.isfile(os.path.join(self.tmp_dir,
+                                                    'out.embl.journal')))
+        generated = self._fail_after(3, ME.MyException('foobar'))
+        self._run('out.embl', resume='True', buffer_size='0.00001')
+        self.assertEqual(len(generated), 2)
+        self.assertEqual(self._read('out.embl'), self._read('reference.embl'))
+        self.assertListEqual(sorted(os.listdir(self.tmp_dir)),
+                             ['out.embl', 'reference.embl'])
+
+    def test_2_annonex2embl(self):
+        ''' This test evaluates that an interrupted run removes its
+        temporary outfile, unless it is journaled. '''
+        self._fail_after(1, KeyboardInterrupt())
+        with self.assertRaises(KeyboardInterrupt):
+            self._run('out.embl')
+        self.assertListEqual(os.listdir(self.tmp_dir), [])
+        self._fail_after(1, KeyboardInterrupt())
+        with self.assertRaises(KeyboardInterrupt):
+            self._run('out.embl', resume='True', buffer_size='0.00001')
+        self.assertListEqual(sorted(os.listdir(self.tmp_dir)),
+                             ['out.embl.journal', 'out.embl.tmp'])
+
+    def test_3_annonex2embl(self):
+        ''' This test evaluates that a failure to complete the outfile is
+        reported and removes the temporary outfile. '''
+        rename = os.rename
+        def fail(src, dst):
+            raise OSError('foobar')
+        os.rename = fail
+        try:
+            with self.assertRaises(SystemExit):
+                self._run('out.embl')
+        finally:
+            os.rename = rename
+        self.assertListEqual(os.listdir(self.tmp_dir), [])
+
+    def test_4_annonex2embl(self):
+        ''' This test evaluates that a gap inside a charset of one sequence
+        does not shift the feature locations of the following sequence. '''
+        self._write('gapped.nex', nex_gapped)
+        self._write('gapped.csv', csv_gapped)
+        self._run('out.embl', 'gapped', self.tmp_dir)
+        records = self._read('out.embl').split('//\n')
+        self.assertIn('FT   CDS             1..24\n', records[0])
+        self.assertIn('/translation="MDKEFPG"', records[0])
+        self.assertIn('FT   CDS             1..27\n', records[1])
+        self.assertIn('/translation="MDLKEFPG"', records[1])
+
+    def test_5_annonex2embl(self):
+        ''' This test evaluates that the records and the warnings of a run
+        with several worker processes are identical to those of a serial
+        run, also with the record cache. '''
+        self._write('variants.nex', nex_variants)
+        self._write('variants.csv', csv_variants)
+        logs = {}
+        for jobs in ['1', '2']:
+            logs[jobs] = self._run('out_%s.embl' % (jobs), 'variants',
+                                   self.tmp_dir, jobs=jobs)
+            logs[jobs + '_cached'] = self._run('cached_%s.embl' % (jobs),
+                'variants', self.tmp_dir, jobs=jobs,
+                cache_dir=os.path.join(self.tmp_dir, 'cache_%s' % (jobs)))
+        self.assertEqual(self._read('out_2.embl'), self._read('out_1.embl'))
+        self.assertEqual(self._read('cached_2.embl'), self._read('out_1.embl'))
+        warnings = [[line for line in log.splitlines() if 'WARNING' in line]
+                    for key, log in sorted(logs.items())]
+        self.assertEqual(len(warnings[0]), 4)
+        for other_warnings in warnings[1:]:
+            self.assertListEqual(other_warnings, warnings[0])
+
+    def test_6_annonex2embl(self):
+        ''' This test evaluates that the feature table of two identical
+        aligned sequences is computed once and freed afterwards, both in
+        the main process and in a worker process, and that both records
+        receive it. '''
+        self._write('identical.nex', nex_identical)
+        self._write('identical.csv', csv_identical)
+        feature_table = Main._feature_table
+        self.addCleanup(setattr, Main, '_feature_table', feature_table)
+        computed = []
+        def count_feature_table(seq_name):
+            computed.append(seq_name)
+            return feature_table(seq_name)
+        Main._feature_table = count_feature_table
+        self._run('out.embl', 'identical', self.tmp_dir)
+        self.assertListEqual(computed, ['Taxon_1', 'Taxon_3'])
+        self.assertDictEqual(Main._feature_tables, {})
+        records = self._read('out.embl').split('//\n')
+        features = [record[record.index('FT   gene'):]
+                    for record in records[:3]]
+        self.assertEqual(features[0], features[1])
+        self.assertNotEqual(features[0], features[2])
+        # The records of a chunk of sequences in a worker process
+        del computed[:]
+        chunk_entries = Main._generate_chunk_in_worker(
+            ['Taxon_1', 'Taxon_2', 'Taxon_3'])
+        self.assertListEqual(computed, ['Taxon_1', 'Taxon_3'])
+        self.assertDictEqual(Main._feature_tables, {})
+        self.assertListEqual([record_text for record_text, warnings,
+                              memo_changes in chunk_entries],
+                             [record + '//\n' for record in records[:3]])
+
+#############
+# FUNCTIONS #
+#############
+
+########
+# MAIN #
+########
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+'''
+Unit Tests for the classes of the module `CacheOps`
+'''
+
+#####################
+# IMPORT OPERATIONS #
+#####################
+
+import unittest
+import shutil
+import tempfile
+import time
+
+# Add specific directory to sys.path in order to import its modules
+# NOTE: THIS RELATIVE IMPORTING IS AMATEURISH.
+# NOTE: COULD THE FOLLOWING IMPORT BE REPLACED WITH 'import annonex2embl'?
+import sys, os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'annonex2embl'))
+
+import CacheOps as CaOps
+import ParsingOps as PrOps
+
+###############
+# AUTHOR INFO #
+###############
+
+__author__ = 'Michael Gruenstaeudl <m.gruenstaeudl@fu-berlin.de>'
+__copyright__ = 'Copyright (C) 2016-2019 Michael Gruenstaeudl'
+__info__ = 'annonex2embl'
+__version__ = '2019.05.15.1500'
+
+#############
+# DEBUGGING #
+#############
+
+#import pdb
+#pdb.set_trace()
+
+###########
+# CLASSES #
+###########
+
+class PersistentCacheTestCases(unittest.TestCase):
+    ''' Tests for class `PersistentCache` '''
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+
+    def test_1_PersistentCache(self):
+        ''' This test evaluates that a gene product persists across
+        cache objects. '''
+        persistent_cache = CaOps.PersistentCache(self.cache_dir)
+        self.assertIsNone(persistent_cache.get_gene_product('matK'))
+        persistent_cache.set_gene_product('matK', 'maturase K')
+        persistent_cache.close()
+        persistent_cache = CaOps.PersistentCache(self.cache_dir)
+        self.assertEqual(persistent_cache.get_gene_product('matK'),
+                         'maturase K')
+        persistent_cache.close()
+
+    def test_2_PersistentCache(self):
+        ''' This test evaluates that expired entries are treated as absent
+        and can be cleared separately. '''
+        persistent_cache = CaOps.PersistentCache(self.cache_dir, ttl_days=1)
+        persistent_cache.set_gene_product('matK', 'maturase K')
+        persistent_cache.conn.execute('UPDATE gene_product SET timestamp = ? '
+                                      'WHERE symbol = ?',
+                                      (time.time() - 2 * 86400, 'matK'))
+        persistent_cache.set_gene_product(
+            'rbcL', 'ribulose-1,5-bisphosphate carboxylase/oxygenase large '
+            'subunit')
+        self.assertIsNone(persistent_cache.get_gene_product('matK'))
+        self.assertEqual(persistent_cache.clear(expired_only=True), 1)
+        self.assertEqual([entry[1] for entry in persistent_cache.entries()],
+                         ['rbcL'])
+        self.assertEqual(persistent_cache.clear(), 1)
+        persistent_cache.close()
+
+    def test_3_PersistentCache(self):
+        ''' This test evaluates that `GetEntrezInfo.obtain_gene_product`
+        answers from the cache without querying NCBI. '''
+        persistent_cache = CaOps.PersistentCache(self.cache_dir)
+        persistent_cache.set_gene_product('psbI', 'photosystem II protein I')
+        entrez_handle = PrOps.GetEntrezInfo('m.gruenstaeudl@fu-berlin.de',
+                                            persistent_cache)
+        self.assertEqual(entrez_handle.obtain_gene_product('psbI'),
+                         'photosystem II protein I')
+        persistent_cache.close()
+
+    def test_4_PersistentCache(self):
+        ''' This test evaluates that the outcomes of translations persist
+        across cache objects. '''
+        persistent_cache = CaOps.PersistentCache(self.cache_dir)
+        persistent_cache.set_translations([
+            ('key_1', ('MK', 9, None)),
+            ('key_2', (None, None, 'unsuccessful'))])
+        persistent_cache.close()
+        persistent_cache = CaOps.PersistentCache(self.cache_dir)
+        self.assertEqual(sorted(persistent_cache.get_translations(10)),
+                         [('key_1', ('MK', 9, None)),
+                          ('key_2', (None, None, 'unsuccessful'))])
+        persistent_cache.close()
+
+    def test_5_PersistentCache(self):
+        ''' This test evaluates that the entries of another cache are merged,
+        where the more recent entry of a key is retained. '''
+        other_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, other_dir)
+        persistent_cache = CaOps.PersistentCache(self.cache_dir)
+        persistent_cache.set_gene_product('matK', 'maturase K')
+        persistent_cache.set_gene_product('rbcL', 'outdated product')
+        persistent_cache.conn.execute('UPDATE gene_product SET timestamp = ? '
+                                      'WHERE symbol = ?',
+                                      (time.time() - 86400, 'rbcL'))
+        other_cache = CaOps.PersistentCache(other_dir)
+        other_cache.set_gene_product('rbcL', 'ribulose-1,5-bisphosphate '
+                                     'carboxylase/oxygenase large subunit')
+        other_cache.set_taxon_status('Pyrus caucasica', True)
+        other_cache.close()
+        self.assertEqual(persistent_cache.merge(other_dir), 2)
+        self.assertEqual(persistent_cache.get_gene_product('matK'),
+                         'maturase K')
+        self.assertEqual(persistent_cache.get_gene_product('rbcL'),
+                         'ribulose-1,5-bisphosphate carboxylase/oxygenase '
+                         'large subunit')
+        self.assertEqual(persistent_cache.merge(other_dir), 0)
+        persistent_cache.close()
+
+    def test_6_PersistentCache(self):
+        ''' This test evaluates that the outcomes of translations and the
+        formatted records do not expire, unlike the results of NCBI Entrez
+        lookups. '''
+        persistent_cache = CaOps.PersistentCache(self.cache_dir, ttl_days=1)
+        persistent_cache.set_gene_product('matK', 'maturase K')
+        persistent_cache.set_translations([('key_1', ('MK', 9, None))])
+        persistent_cache.set_records([('key_1', 'ID   Taxon_1;\n//\n', '')])
+        for table in ['gene_product', 'translation', 'record']:
+            persistent_cache.conn.execute(
+                'UPDATE %s SET timestamp = ?' % (table),
+                (time.time() - 2 * 86400,))
+        self.assertIsNone(persistent_cache.get_gene_product('matK'))
+        self.assertEqual(persistent_cache.get_translations(10),
+                         [('key_1', ('MK', 9, None))])
+        self.assertTrue(persistent_cache.has_record('key_1'))
+        self.assertEqual(persistent_cache.get_record('key_1'),
+                         ('ID   Taxon_1;\n//\n', ''))
+        self.assertEqual([(entry[0], entry[4]) for entry
+                          in persistent_cache.entries()],
+                         [('gene_product', False), ('translation', True),
+                          ('record', True)])
+        self.assertEqual(persistent_cache.clear(expired_only=True), 1)
+        self.assertEqual(persistent_cache.get_translations(10),
+                         [('key_1', ('MK', 9, None))])
+        self.assertTrue(persistent_cache.has_record('key_1'))
+        persistent_cache.close()
+
+
+class RecordCacheTestCases(unittest.TestCase):
+    ''' Tests for class `RecordCache` '''
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+
+    def test_1_RecordCache(self):
+        ''' This test evaluates that a record and its warnings are reused by
+        a later run with the same data only, and that they are written to
+        the cache by function "flush". '''
+        persistent_cache = CaOps.PersistentCache(self.cache_dir)
+        record_cache = CaOps.RecordCache(persistent_cache, ('11', 'linear'))
+        record_key = record_cache.key(('Taxon_1', 'ATG', [('isolate', '1')]))
+        self.assertFalse(record_cache.contains(record_key))
+        record_cache.set(record_key, 'ID   Taxon_1;\n//\n',
+                         ' annonex2embl WARNING: foo\n')
+        self.assertFalse(record_cache.contains(record_key))
+        record_cache.flush()
+        record_cache = CaOps.RecordCache(persistent_cache, ('11', 'linear'))
+        self.assertEqual(record_cache.key(('Taxon_1', 'ATG',
+                                           [('isolate', '1')])), record_key)
+        self.assertTupleEqual(record_cache.get(record_key),
+                              ('ID   Taxon_1;\n//\n',
+                               ' annonex2embl WARNING: foo\n'))
+        self.assertEqual((record_cache.reused, record_cache.generated),
+                         (1, 0))
+        self.assertNotEqual(CaOps.RecordCache(persistent_cache,
+                            ('4', 'linear')).key(('Taxon_1', 'ATG',
+                                                  [('isolate', '1')])),
+                            record_key)
+        self.assertNotEqual(record_cache.key(('Taxon_1', 'ATG',
+                                              [('isolate', '2')])),
+                            record_key)
+        persistent_cache.close()
+
+#############
+# FUNCTIONS #
+#############
+
+########
+# MAIN #
+########
+
+if __name__ == '__main__':
+    unittest.main()
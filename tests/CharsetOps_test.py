@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+'''
+Unit Tests for the classes of the module `CharsetOps`
+'''
+
+#####################
+# IMPORT OPERATIONS #
+#####################
+
+import Bio # Do not remove; important for assertIsInstance
+import unittest
+
+# Add specific directory to sys.path in order to import its modules
+# NOTE: THIS RELATIVE IMPORTING IS AMATEURISH.
+# NOTE: COULD THE FOLLOWING IMPORT BE REPLACED WITH 'import annonex2embl'?
+import sys, os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'annonex2embl'))
+
+from CharsetOps import Charset
+
+###############
+# AUTHOR INFO #
+###############
+
+__author__ = 'Michael Gruenstaeudl <m.gruenstaeudl@fu-berlin.de>'
+__copyright__ = 'Copyright (C) 2016-2019 Michael Gruenstaeudl'
+__info__ = 'annonex2embl'
+__version__ = '2019.05.15.1500'
+
+#############
+# DEBUGGING #
+#############
+
+#import pdb
+#pdb.set_trace()
+
+###########
+# CLASSES #
+###########
+
+class CharsetTestCases(unittest.TestCase):
+    ''' Tests for class `Charset` '''
+
+    def test_1_Charset(self):
+        ''' This test evaluates that positions are stored as merged
+        intervals and that the charset still behaves like a list of
+        positions. '''
+        charset = Charset.from_positions([7,8,1,2,3,4])
+        self.assertListEqual(charset.intervals, [(1, 5), (7, 9)])
+        self.assertEqual(charset, [1,2,3,4,7,8])
+        self.assertEqual(len(charset), 6)
+        self.assertTrue(8 in charset)
+        self.assertFalse(5 in charset)
+
+    def test_2_Charset(self):
+        ''' This test evaluates the functions `shift` and `clip`. '''
+        charset = Charset([(0, 4), (6, 9)])
+        self.assertEqual(charset.shift(-2).clip(start=0), [0,1,4,5,6])
+        self.assertEqual(charset.clip(end=7), [0,1,2,3,6])
+        self.assertFalse(charset.clip(start=20))
+
+    def test_3_Charset(self):
+        ''' This test evaluates the function `remove_position`, including
+        the case where two intervals become adjacent. '''
+        charset = Charset([(0, 2), (3, 5)])
+        self.assertListEqual(charset.remove_position(2).intervals, [(0, 4)])
+        self.assertListEqual(charset.remove_position(3).intervals,
+                             [(0, 2), (3, 4)])
+
+    def test_4_Charset(self):
+        ''' This test evaluates the function `to_location`. '''
+        self.assertIsInstance(Charset([(1, 8)]).to_location(),
+                              Bio.SeqFeature.FeatureLocation)
+        out = Charset([(1, 4), (5, 7)]).to_location()
+        self.assertIsInstance(out, Bio.SeqFeature.CompoundLocation)
+        self.assertEqual(len(out.parts), 2)
+
+
+#############
+# FUNCTIONS #
+#############
+
+########
+# MAIN #
+########
+
+if __name__ == '__main__':
+    unittest.main()
@@ -106,9 +106,99 @@ class AnnoChecksTestCases(unittest.TestCase):
         with self.assertRaises(ME.MyException):
             CkOps.AnnoCheck(extract, feature, record_id).for_unittest()
 
+    def test_AnnoChecks_example_5(self):
+        ''' Test to evaluate function `check` of class `AnnoChecks`.
+        This test evaluates the situation where the translation and the
+        feature location are truncated at an internal stop codon. '''
+        from Bio.Seq import Seq
+        from Bio.Alphabet import generic_dna
+        from Bio.SeqFeature import FeatureLocation
+        from Bio import SeqFeature
+        extract = Seq("ATGAAATAGGGGTAA", generic_dna)
+        loc = FeatureLocation(0, 15) # Stop_pos must be +1
+        feature = SeqFeature.SeqFeature(loc, id='foobar', type='CDS')
+        record_id = 'foobar'
+        transl_out, feat_loc = CkOps.AnnoCheck(extract, feature,
+            record_id).check()
+        self.assertEqual(str(transl_out), 'MK')
+        self.assertEqual(feat_loc.start, 0)
+        self.assertEqual(feat_loc.end, 9)
+
+
+class TranslCheckTestCases(unittest.TestCase):
+    ''' Tests for class `TranslCheck` '''
+
+    def test_TranslCheck__extract__1(self):
+        ''' Test to evaluate function `extract` of class `TranslCheck`.
+        This test evaluates the extraction of a compound feature on the
+        reverse strand. '''
+        from Bio.Seq import Seq
+        from Bio.Alphabet import generic_dna
+        from Bio.SeqFeature import FeatureLocation, CompoundLocation
+        from Bio.SeqRecord import SeqRecord
+        from Bio import SeqFeature
+        seq_record = SeqRecord(Seq("TTACCCATGGGTCAT", generic_dna),
+                               id='foobar')
+        loc = CompoundLocation([FeatureLocation(0, 3),
+                                FeatureLocation(9, 15)])
+        feature = SeqFeature.SeqFeature(loc, id='foobar', type='CDS',
+                                        strand=-1)
+        extract = CkOps.TranslCheck().extract(feature, seq_record)
+        self.assertIsInstance(extract, Seq)
+        self.assertEqual(str(extract), 'ATGACCTAA')
 
-#class TranslCheckTestCases(unittest.TestCase):
-#    ''' Tests for class `TranslCheck` '''
+
+class TranslMemoTestCases(unittest.TestCase):
+    ''' Tests for class `TranslMemo` '''
+
+    def test_TranslMemo_1(self):
+        ''' Test to evaluate that a memoized outcome is applied to the
+        location of a second feature with an identical extract, and that
+        the least recently used outcome is evicted. '''
+        from Bio.Seq import Seq
+        from Bio.Alphabet import generic_dna
+        from Bio.SeqFeature import FeatureLocation
+        from Bio import SeqFeature
+        memo = CkOps.TranslMemo(max_size=1)
+        extract = Seq("ATGAAATAGGGGTAA", generic_dna)
+        for start in [0, 30]:
+            feature = SeqFeature.SeqFeature(FeatureLocation(start, start+15),
+                                            id='foobar', type='CDS')
+            transl_out, feat_loc = CkOps.AnnoCheck(extract, feature,
+                'foobar').check(memo)
+            self.assertEqual(str(transl_out), 'MK')
+            self.assertEqual(feat_loc.end, start+9)
+        self.assertEqual((memo.hits, memo.misses), (1, 1))
+        with self.assertRaises(ME.MyException):
+            CkOps.AnnoCheck(Seq("ATGTAA", generic_dna), feature,
+                            'foobar').check(memo)
+        self.assertEqual(len(memo.outcomes), 1)
+        with self.assertRaises(ME.MyException):
+            CkOps.AnnoCheck(Seq("ATGTAA", generic_dna), feature,
+                            'foobar').check(memo)
+        self.assertEqual((memo.hits, memo.misses), (2, 2))
+
+    def test_TranslMemo_2(self):
+        ''' Test to evaluate that an interruption during the translation is
+        passed on and not memoized as an unsuccessful translation. '''
+        from Bio.Seq import Seq
+        from Bio.Alphabet import generic_dna
+        from Bio.SeqFeature import FeatureLocation
+        from Bio import SeqFeature
+        memo = CkOps.TranslMemo()
+        feature = SeqFeature.SeqFeature(FeatureLocation(0, 9),
+                                        id='foobar', type='CDS')
+        def interrupt(extract, codon_table):
+            raise KeyboardInterrupt()
+        walk_codons = CkOps.AnnoCheck._walk_codons
+        CkOps.AnnoCheck._walk_codons = staticmethod(interrupt)
+        try:
+            with self.assertRaises(KeyboardInterrupt):
+                CkOps.AnnoCheck(Seq("ATGATATAA", generic_dna), feature,
+                                'foobar').check(memo)
+        finally:
+            CkOps.AnnoCheck._walk_codons = staticmethod(walk_codons)
+        self.assertEqual(len(memo.outcomes), 0)
 
 
 class QualifierCheckTestCases(unittest.TestCase):
@@ -141,6 +141,22 @@ class DegapButMaintainAnnoTestCases(unittest.TestCase):
         out_actual = DgOps.DegapButMaintainAnno(seq, rmchar, charsets).degap()
         self.assertTupleEqual(out_actual, out_ideal)
 
+    def test_9_DegapButMaintainAnno(self):
+        ''' This test evaluates the case where gap runs lie at the start,
+        inside and at the end of overlapping genes, including the
+        coordinate map used for the remapping.
+        '''
+        seq = "--AT---GC-A--"
+        rmchar = "-"
+        charsets = {"gene1":[0,1,2,3,4,5,6,7], "gene2":[7,8,9,10,11,12]}
+        out_ideal = ('ATGCA', {'gene1': [0, 1, 2], 'gene2': [2, 3, 4]})
+
+        gap_map = DgOps.DegapButMaintainAnno._gap_map(seq, rmchar)
+        self.assertTupleEqual(gap_map, ([0, 4, 9, 11], [2, 7, 10, 13],
+                                        [0, 2, 5, 6]))
+        out_actual = DgOps.DegapButMaintainAnno(seq, rmchar, charsets).degap()
+        self.assertTupleEqual(out_actual, out_ideal)
+
 
 class RmAmbigsButMaintainAnnoTestCases(unittest.TestCase):
     ''' Tests for class `RmAmbigsButMaintainAnno` '''
@@ -289,6 +305,29 @@ class RmAmbigsButMaintainAnnoTestCases(unittest.TestCase):
         self.assertTupleEqual(out_actual_2, out_ideal_step2)
 
 
+class DegapCacheTestCases(unittest.TestCase):
+    ''' Tests for class `DegapCache` '''
+
+    def test_1_DegapCache(self):
+        ''' This test evaluates that sequences with the same positions of
+        gaps and Ns share their charsets, while their degapped sequences
+        differ. '''
+        from Bio.Seq import Seq
+        from CharsetOps import Charset
+        charsets = {"gene1":Charset([(1, 5)]),"gene2":Charset([(5, 8)])}
+        degap_cache = DgOps.DegapCache(charsets)
+        out_1 = degap_cache.degap(Seq("NAT-GCNA"))
+        out_2 = degap_cache.degap(Seq("NGC-ATNA"))
+        self.assertEqual(str(out_1[0]), 'ATGCNA')
+        self.assertEqual(str(out_2[0]), 'GCATNA')
+        self.assertIs(out_1[1], out_2[1])
+        self.assertEqual(out_2[1], {"gene1":Charset([(0, 3)]),
+                                    "gene2":Charset([(3, 6)]),
+                                    "gap0":Charset([(4, 5)])})
+        self.assertIsNot(out_1[2]["gene1"], out_2[2]["gene1"])
+        self.assertEqual(len(degap_cache.results), 1)
+
+
 #############
 # FUNCTIONS #
 #############
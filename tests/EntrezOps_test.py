@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+'''
+Unit Tests for the classes of the module `EntrezOps`
+'''
+
+#####################
+# IMPORT OPERATIONS #
+#####################
+
+import unittest
+import time
+import urllib2
+
+from mimetools import Message
+from StringIO import StringIO
+
+# Add specific directory to sys.path in order to import its modules
+# NOTE: THIS RELATIVE IMPORTING IS AMATEURISH.
+# NOTE: COULD THE FOLLOWING IMPORT BE REPLACED WITH 'import annonex2embl'?
+import sys, os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'annonex2embl'))
+
+import EntrezOps
+import MyExceptions as ME
+
+###############
+# AUTHOR INFO #
+###############
+
+__author__ = 'Michael Gruenstaeudl <m.gruenstaeudl@fu-berlin.de>'
+__copyright__ = 'Copyright (C) 2016-2019 Michael Gruenstaeudl'
+__info__ = 'annonex2embl'
+__version__ = '2019.05.15.1500'
+
+#############
+# DEBUGGING #
+#############
+
+#import pdb
+#pdb.set_trace()
+
+###########
+# CLASSES #
+###########
+
+class TokenBucketTestCases(unittest.TestCase):
+    ''' Tests for class `TokenBucket` '''
+
+    def test_1_TokenBucket(self):
+        ''' This test evaluates that tokens are handed out no faster than
+        the specified rate. '''
+        bucket = EntrezOps.TokenBucket(20)
+        start = time.time()
+        for i in range(5):
+            bucket.acquire()
+        self.assertGreaterEqual(time.time() - start, 4 / 20.0 - 0.01)
+
+
+class EntrezClientTestCases(unittest.TestCase):
+    ''' Tests for class `EntrezClient` '''
+
+    def test_1_EntrezClient(self):
+        ''' This test evaluates which failed requests are repeated. '''
+        is_transient = EntrezOps.EntrezClient._is_transient
+        url = EntrezOps.eutils_url
+        self.assertTrue(is_transient(urllib2.HTTPError(url, 429, '', {}, None)))
+        self.assertTrue(is_transient(urllib2.HTTPError(url, 502, '', {}, None)))
+        self.assertFalse(is_transient(urllib2.HTTPError(url, 400, '', {}, None)))
+        self.assertTrue(is_transient(urllib2.URLError('timed out')))
+        self.assertFalse(is_transient(ValueError()))
+
+    def test_2_EntrezClient(self):
+        ''' This test evaluates that the API key raises the rate limit and
+        that clients with the same rate limit share their TokenBucket. '''
+        client_1 = EntrezOps.EntrezClient('m.gruenstaeudl@fu-berlin.de')
+        client_2 = EntrezOps.EntrezClient('m.gruenstaeudl@fu-berlin.de')
+        client_3 = EntrezOps.EntrezClient('m.gruenstaeudl@fu-berlin.de',
+                                          api_key='foobar')
+        self.assertIs(client_1.bucket, client_2.bucket)
+        self.assertEqual(client_3.bucket.rate, EntrezOps.rate_apikey)
+
+    def test_3_EntrezClient(self):
+        ''' This test evaluates that function `map` returns the results in
+        the order of the items and re-raises exceptions. '''
+        client = EntrezOps.EntrezClient('m.gruenstaeudl@fu-berlin.de')
+        self.assertListEqual(client.map(lambda i: i * 2, range(25)),
+                             range(0, 50, 2))
+        def fail(i):
+            raise ME.MyException('foobar')
+        with self.assertRaises(ME.MyException):
+            client.map(fail, range(3))
+
+    def test_4_EntrezClient(self):
+        ''' This test evaluates the delay before a failed request is
+        repeated, with and without the header `Retry-After`. '''
+        retry_delay = EntrezOps.EntrezClient._retry_delay
+        url = EntrezOps.eutils_url
+        headers = Message(StringIO('Retry-After: 7\r\n\r\n'))
+        self.assertEqual(retry_delay(urllib2.HTTPError(url, 429, '', headers,
+                                                       None), 0), 7)
+        headers = Message(StringIO('Retry-After: %s\r\n\r\n' %
+            time.strftime('%a, %d %b %Y %H:%M:%S GMT',
+                          time.gmtime(time.time() + 60))))
+        self.assertTrue(55 < retry_delay(urllib2.HTTPError(url, 503, '',
+                                                           headers, None), 0)
+                        <= 60)
+        delays = [retry_delay(urllib2.URLError('timed out'), 2)
+                  for _ in range(20)]
+        self.assertTrue(all(2 <= delay <= 6 for delay in delays))
+        self.assertGreater(len(set(delays)), 1)
+
+#############
+# FUNCTIONS #
+#############
+
+########
+# MAIN #
+########
+
+if __name__ == '__main__':
+    unittest.main()
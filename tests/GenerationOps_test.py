@@ -118,6 +118,19 @@ class GenerateFeatLocTestCases(unittest.TestCase):
         self.assertIsInstance(out, Bio.SeqFeature.CompoundLocation) # CompoundLocation
         self.assertIsInstance(out.parts[0].start, Bio.SeqFeature.BeforePosition) # Fuzzy Start
 
+    def test_GenerateFeatLoc__copy_location__1(self):
+        ''' Test to evaluate function `copy_location` of class `GenerateFeatLoc`.
+            This test evaluates if a copy of a discontinuous location can be
+            modified without affecting the original. '''
+        charset_range = [1,2,3,7,8]
+        location_object = GnOps.GenerateFeatLoc().make_location(charset_range)
+        out = GnOps.GenerateFeatLoc.copy_location(location_object)
+        out.strand = -1
+        out = GnOps.GenerateFeatLoc().make_start_fuzzy(out)
+        self.assertEqual(repr(location_object),
+                         repr(GnOps.GenerateFeatLoc().make_location(charset_range)))
+        self.assertIsInstance(out.parts[0].start, Bio.SeqFeature.BeforePosition) # Fuzzy Start
+
 
 class GenerateSeqFeatureTestCases(unittest.TestCase):
     ''' Tests for class `GenerateSeqFeature` '''
@@ -160,6 +173,32 @@ class GenerateSeqFeatureTestCases(unittest.TestCase):
             feature_type, feature_orient, feature_loc, transl_table, feature_seq)
         self.assertIsInstance(out, Bio.SeqFeature.SeqFeature)
 
+
+class SeqViewTestCases(unittest.TestCase):
+    ''' Tests for class `SeqView` '''
+
+    def test_SeqView__bases__1(self):
+        ''' Test to evaluate function `bases` of class `SeqView`.
+            This test evaluates the extraction of a compound location on
+            the forward and on the reverse strand. '''
+        seq = Seq('AAATTTGGGCCC', generic_dna)
+        charset_range = [0,1,2,6,7,8]
+        location_object = GnOps.GenerateFeatLoc().make_location(charset_range)
+        out = GnOps.SeqView(seq).bases(location_object)
+        self.assertEqual(out, 'AAAGGG')
+        out = GnOps.SeqView(seq).bases(location_object, strand=-1)
+        self.assertEqual(out, 'CCCTTT')
+
+    def test_SeqView__span__1(self):
+        ''' Test to evaluate function `span` of class `SeqView`.
+            This test evaluates that the bases between the parts of a
+            compound location are included. '''
+        seq = Seq('AAATTTGGGCCC', generic_dna)
+        charset_range = [0,1,2,6,7,8]
+        location_object = GnOps.GenerateFeatLoc().make_location(charset_range)
+        out = GnOps.SeqView(seq).span(location_object)
+        self.assertEqual(out, 'AAATTTGGG')
+
 #############
 # FUNCTIONS #
 #############
@@ -0,0 +1,577 @@
+#!/usr/bin/env python
+'''
+Unit Tests for the classes of the module `IOOps`
+'''
+
+#####################
+# IMPORT OPERATIONS #
+#####################
+
+import unittest
+import bz2
+import gzip
+import re
+import tempfile
+
+# Add specific directory to sys.path in order to import its modules
+# NOTE: THIS RELATIVE IMPORTING IS AMATEURISH.
+# NOTE: COULD THE FOLLOWING IMPORT BE REPLACED WITH 'import annonex2embl'?
+import sys, os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'annonex2embl'))
+
+import IOOps
+import MyExceptions as ME
+
+from Bio.Alphabet import IUPAC
+from Bio.Seq import Seq
+from Bio.SeqFeature import AfterPosition, BeforePosition, CompoundLocation, \
+    FeatureLocation, SeqFeature
+from Bio.SeqRecord import SeqRecord
+
+###############
+# AUTHOR INFO #
+###############
+
+__author__ = 'Michael Gruenstaeudl <m.gruenstaeudl@fu-berlin.de>'
+__copyright__ = 'Copyright (C) 2016-2019 Michael Gruenstaeudl'
+__info__ = 'annonex2embl'
+__version__ = '2019.05.15.1500'
+
+#############
+# DEBUGGING #
+#############
+
+#import pdb
+#pdb.set_trace()
+
+####################
+# GLOBAL VARIABLES #
+####################
+
+nex_sequential = '''#NEXUS
+[Foo Bar Baz Qux]
+BEGIN DATA;
+DIMENSIONS NTAX=2 NCHAR=12;
+FORMAT DATATYPE=DNA GAP=- MISSING=?;
+MATRIX
+Taxon_1  ACGTAC
+GTACGT
+Taxon_2  ACGT--GTAC??
+;
+END;
+BEGIN SETS;
+CHARSET foo_CDS = 1-6 10-12;
+CHARSET foo_gene = 2-8\\3 12;
+END;
+'''
+
+nex_interleaved = '''#NEXUS
+BEGIN DATA;
+DIMENSIONS NTAX=2 NCHAR=8;
+FORMAT DATATYPE=DNA GAP=. MISSING=N INTERLEAVE;
+MATRIX
+Taxon_1  ACGT
+'Taxon two'  AC..
+
+Taxon_1  ACGT
+'Taxon two'  NNGT
+;
+END;
+BEGIN SETS;
+CHARSET foo_CDS = 1-.;
+END;
+'''
+
+csv_metadata = '''isolate, organism, country
+Taxon_1, "Taxon one", "Country_1: Area_1"
+Taxon_2, "Taxon two", "Country_2: Area_2"
+'''
+
+###########
+# CLASSES #
+###########
+
+class InpTestCases(unittest.TestCase):
+    ''' Tests for class `Inp` '''
+
+    def _write_tmp(self, content):
+        handle = tempfile.NamedTemporaryFile(suffix='.csv', delete=False)
+        handle.write(content)
+        handle.close()
+        self.addCleanup(os.remove, handle.name)
+        return handle.name
+
+    def test_Inp__parse_csv_file__1(self):
+        ''' This test evaluates the case where the rows are keyed by the
+        column that contains the sequence IDs. '''
+        path_to_csv = self._write_tmp(csv_metadata)
+        out = IOOps.Inp().parse_csv_file(path_to_csv, 'isolate')
+        self.assertListEqual(out.keys(), ['Taxon_1', 'Taxon_2'])
+        self.assertEqual(out['Taxon_2']['organism'], 'Taxon two')
+
+    def test_Inp__parse_csv_file__2(self):
+        ''' This test evaluates the case where a sequence ID occurs more
+        than once. '''
+        path_to_csv = self._write_tmp(csv_metadata +
+                                      'Taxon_1, "Taxon one", "Country_3"\n')
+        with self.assertRaises(ME.MyException):
+            IOOps.Inp().parse_csv_file(path_to_csv, 'isolate')
+
+    def test_Inp__parse_csv_file__3(self):
+        ''' This test evaluates the case where the csv-file is compressed
+        with gzip or bzip2. '''
+        path_to_gz = self._write_tmp('')
+        with gzip.open(path_to_gz, 'wb') as handle:
+            handle.write(csv_metadata)
+        path_to_bz2 = self._write_tmp(bz2.compress(csv_metadata))
+        for path_to_csv in [path_to_gz, path_to_bz2]:
+            out = IOOps.Inp().parse_csv_file(path_to_csv, 'isolate')
+            self.assertListEqual(out.keys(), ['Taxon_1', 'Taxon_2'])
+
+
+class ParseNexusStreamTestCases(unittest.TestCase):
+    ''' Tests for class `ParseNexusStream` '''
+
+    def _write_tmp(self, content):
+        handle = tempfile.NamedTemporaryFile(suffix='.nex', delete=False)
+        handle.write(content)
+        handle.close()
+        self.addCleanup(os.remove, handle.name)
+        return handle.name
+
+    def test_1_ParseNexusStream(self):
+        ''' This test evaluates the case of a sequential matrix, in which
+        one sequence is spread over two lines. '''
+        path_to_nex = self._write_tmp(nex_sequential)
+        charsets, matrix = IOOps.Inp().parse_nexus_file(path_to_nex)
+        self.assertDictEqual(matrix, {'Taxon_1': 'ACGTACGTACGT',
+                                      'Taxon_2': 'ACGT--GTAC??'})
+        self.assertDictEqual(charsets, {'foo_CDS': [0,1,2,3,4,5,9,10,11],
+                                        'foo_gene': [1,4,7,11]})
+
+    def test_2_ParseNexusStream(self):
+        ''' This test evaluates the case of an interleaved matrix with
+        quoted taxon names and non-default gap and missing symbols. '''
+        path_to_nex = self._write_tmp(nex_interleaved)
+        charsets, matrix = IOOps.Inp().parse_nexus_file(path_to_nex)
+        self.assertDictEqual(matrix, {'Taxon_1': 'ACGTACGT',
+                                      'Taxon two': 'AC--??GT'})
+        self.assertDictEqual(charsets, {'foo_CDS': range(0, 8)})
+
+    def test_3_ParseNexusStream(self):
+        ''' This test evaluates that the sequences are yielded lazily and
+        that the charsets can be parsed separately. '''
+        path_to_nex = self._write_tmp(nex_sequential)
+        rows = IOOps.ParseNexusStream(path_to_nex).matrix()
+        self.assertTupleEqual(next(rows), ('Taxon_1', 'ACGTACGTACGT'))
+        charsets = IOOps.ParseNexusStream(path_to_nex).parse_charsets()
+        self.assertListEqual(sorted(charsets.keys()), ['foo_CDS', 'foo_gene'])
+
+    def test_4_ParseNexusStream(self):
+        ''' This test evaluates the case where the length of a sequence
+        does not match NCHAR. '''
+        path_to_nex = self._write_tmp(nex_sequential.replace('NCHAR=12',
+                                                             'NCHAR=13'))
+        with self.assertRaises(ME.MyException):
+            IOOps.Inp().parse_nexus_file(path_to_nex)
+
+    def test_5_ParseNexusStream(self):
+        ''' This test evaluates the case of commands that are spread over
+        several lines, including a keyword split by a multi-line comment. '''
+        path_to_nex = self._write_tmp(nex_sequential.replace(
+            'DIMENSIONS NTAX=2 NCHAR=12;', 'DIMENSIONS\nNTAX=2\nNCHAR=12\n;').\
+            replace('MATRIX\n', 'MAT[a\ncomment]RIX\n').replace(
+            'CHARSET foo_CDS = 1-6 10-12;', 'CHARSET foo_CDS =\n1-6\n10-12;'))
+        charsets, matrix = IOOps.Inp().parse_nexus_file(path_to_nex)
+        self.assertDictEqual(matrix, {'Taxon_1': 'ACGTACGTACGT',
+                                      'Taxon_2': 'ACGT--GTAC??'})
+        self.assertDictEqual(charsets, {'foo_CDS': [0,1,2,3,4,5,9,10,11],
+                                        'foo_gene': [1,4,7,11]})
+
+
+class EmblWriterTestCases(unittest.TestCase):
+    ''' Tests for class `EmblWriter` '''
+
+    def setUp(self):
+        self.seq_record = SeqRecord(Seq('ACGTNACGTA' * 13,
+                                        IUPAC.ambiguous_dna),
+                                    id='Taxon_1.1',
+                                    description='chloroplast trnR-atpA '
+                                    'intergenic spacer, ' * 4)
+        self.seq_record.annotations['topology'] = 'linear'
+        self.seq_record.annotations['data_file_division'] = 'PLN'
+        feature = SeqFeature(CompoundLocation([
+            FeatureLocation(BeforePosition(60), 130, strand=-1),
+            FeatureLocation(0, 10, strand=-1)]), type='CDS')
+        feature.qualifiers['gene'] = 'foo'
+        feature.qualifiers['note'] = 'a "quoted" note ' * 10
+        feature.qualifiers['codon_start'] = 1
+        feature.qualifiers['translation'] = 'M' * 100
+        self.seq_record.features.append(feature)
+        self.seq_record.features.append(SeqFeature(FeatureLocation(
+            42, AfterPosition(43)), type='misc_feature'))
+
+    def test_1_EmblWriter(self):
+        ''' This test evaluates that the output of the native writer is
+        identical to that of Bio.SeqIO, with and without masking. '''
+        self.assertTrue(IOOps.EmblWriter.is_supported(self.seq_record))
+        for eusubm_bool in [False, True]:
+            self.assertEqual(
+                IOOps.Outp().format_EntryUpload(self.seq_record, eusubm_bool),
+                IOOps.Outp().format_EntryUpload(self.seq_record, eusubm_bool,
+                                                native=False))
+
+    def test_2_EmblWriter(self):
+        ''' This test evaluates that records with annotations not written by
+        the native writer are left to Bio.SeqIO. '''
+        self.seq_record.annotations['keywords'] = ['foo', 'bar']
+        self.assertFalse(IOOps.EmblWriter.is_supported(self.seq_record))
+        self.assertIn('KW   foo', IOOps.Outp().format_EntryUpload(
+            self.seq_record, False))
+
+    def test_3_EmblWriter(self):
+        ''' This test evaluates that formatting errors are reported as
+        MyException, whereas interruptions are passed on. '''
+        self.seq_record.id = 'Taxon;1'
+        with self.assertRaises(ME.MyException):
+            IOOps.Outp().format_EntryUpload(self.seq_record, False)
+        self.seq_record.id = 'Taxon_1.1'
+        def interrupt(writer, eusubm_bool):
+            raise KeyboardInterrupt()
+        original_format = IOOps.EmblWriter.format
+        IOOps.EmblWriter.format = interrupt
+        try:
+            with self.assertRaises(KeyboardInterrupt):
+                IOOps.Outp().format_EntryUpload(self.seq_record, False)
+        finally:
+            IOOps.EmblWriter.format = original_format
+
+
+class OutpTestCases(unittest.TestCase):
+    ''' Tests for class `Outp` '''
+
+    def test_Outp__complete_EntryUpload__1(self):
+        ''' This test evaluates the insertion of the reference block and the
+        correction of the molecule type, for author names that contain
+        characters special to sed. '''
+        ref_block = IOOps.Outp.format_reference_block("O'Doe J. & R/oe R.",
+                                                      '16-OCT-2026')
+        record_text = ('ID   Taxon_1; SV 1; linear; DNA; ; PLN; 4 BP.\n'
+                       'XX\n'
+                       'FH   Key             Location/Qualifiers\n'
+                       'FH\n')
+        self.assertEqual(IOOps.Outp.complete_EntryUpload(record_text,
+                                                         ref_block),
+                         'ID   Taxon_1; SV 1; linear; genomic DNA; ; PLN; '
+                         '4 BP.\n'
+                         'XX\n'
+                         'RN   [1]\n'
+                         "RA   O'Doe J. & R/oe R.\n"
+                         'RT   ;\n'
+                         'RL   Submitted (16-OCT-2026) to the INSDC.\n'
+                         'XX\n'
+                         'FH   Key             Location/Qualifiers\n'
+                         'FH\n')
+
+
+class AtomicOutpTestCases(unittest.TestCase):
+    ''' Tests for class `AtomicOutp` '''
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path_to_outfile = os.path.join(self.tmp_dir, 'out.embl')
+        with open(self.path_to_outfile, 'w') as handle:
+            handle.write('old\n')
+
+    def tearDown(self):
+        for filename in os.listdir(self.tmp_dir):
+            os.remove(os.path.join(self.tmp_dir, filename))
+        os.rmdir(self.tmp_dir)
+
+    def test_1_AtomicOutp(self):
+        ''' This test evaluates that the outfile is replaced only upon
+        commit, with records batched beyond the buffer size. '''
+        outp_file = IOOps.AtomicOutp(self.path_to_outfile, buffer_size=4)
+        n_records = outp_file.write_records(['foo\n', '', 'bar\n', 'baz\n'])
+        self.assertEqual(n_records, 3)
+        with open(self.path_to_outfile) as handle:
+            self.assertEqual(handle.read(), 'old\n')
+        outp_file.commit()
+        with open(self.path_to_outfile) as handle:
+            self.assertEqual(handle.read(), 'foo\nbar\nbaz\n')
+        self.assertListEqual(os.listdir(self.tmp_dir), ['out.embl'])
+
+    def test_2_AtomicOutp(self):
+        ''' This test evaluates that an aborted outfile leaves the existing
+        outfile untouched. '''
+        outp_file = IOOps.AtomicOutp(self.path_to_outfile)
+        outp_file.write_records(['foo\n'])
+        outp_file.abort()
+        with open(self.path_to_outfile) as handle:
+            self.assertEqual(handle.read(), 'old\n')
+        self.assertListEqual(os.listdir(self.tmp_dir), ['out.embl'])
+
+    def test_3_AtomicOutp(self):
+        ''' This test evaluates the compression of an outfile whose name
+        ends with ".gz". '''
+        path_to_outfile = self.path_to_outfile + '.gz'
+        outp_file = IOOps.AtomicOutp(path_to_outfile)
+        outp_file.write_records(['foo\n', 'bar\n'])
+        outp_file.commit()
+        with gzip.open(path_to_outfile) as handle:
+            self.assertEqual(handle.read(), 'foo\nbar\n')
+
+    def test_4_AtomicOutp(self):
+        ''' This test evaluates that an interrupted outfile is truncated to
+        its last journaled record upon resumption, also if compressed. '''
+        for path_to_outfile in [self.path_to_outfile,
+                                self.path_to_outfile + '.gz']:
+            journal = IOOps.Journal(path_to_outfile)
+            journal.start({'date_today': '16-OCT-2026'})
+            outp_file = IOOps.AtomicOutp(path_to_outfile, 4, journal)
+            outp_file.write_records(['foo\n', '', 'bar\n'],
+                                    ['seq1', 'seq2', 'seq3'])
+            # A record written after the last journaled record
+            outp_file.raw_handle.write('ba')
+            outp_file.raw_handle.close()
+            header, entries = IOOps.Journal(path_to_outfile).read()
+            self.assertEqual(header, {'date_today': '16-OCT-2026'})
+            self.assertListEqual([entry[0] for entry in entries],
+                                 ['seq1', 'seq2', 'seq3'])
+            self.assertEqual(entries[-1][3:], (2, 8))
+            outp_file = IOOps.AtomicOutp(path_to_outfile, 4, journal)
+            outp_file.resume(entries)
+            outp_file.write_records(['baz\n'], ['seq4'])
+            outp_file.commit()
+            journal.remove()
+            with (gzip.open if path_to_outfile.endswith('.gz') else open)(
+                    path_to_outfile) as handle:
+                self.assertEqual(handle.read(), 'foo\nbar\nbaz\n')
+        self.assertListEqual(sorted(os.listdir(self.tmp_dir)),
+                             ['out.embl', 'out.embl.gz'])
+
+
+    def test_5_AtomicOutp(self):
+        ''' This test evaluates that a journaled compressed outfile does not
+        depend on the interval of the journal. '''
+        path_to_outfile = self.path_to_outfile + '.gz'
+        outp_file = IOOps.AtomicOutp(path_to_outfile)
+        outp_file.write_records(['foo\n', 'bar\n'])
+        outp_file.commit()
+        with open(path_to_outfile, 'rb') as handle:
+            unjournaled = handle.read()
+        journal = IOOps.Journal(path_to_outfile, interval=0)
+        journal.start({})
+        outp_file = IOOps.AtomicOutp(path_to_outfile, journal=journal)
+        outp_file.write_records(['foo\n', 'bar\n'], ['seq1', 'seq2'])
+        outp_file.commit()
+        journal.remove()
+        with open(path_to_outfile, 'rb') as handle:
+            self.assertEqual(handle.read(), unjournaled)
+
+
+class JournalTestCases(unittest.TestCase):
+    ''' Tests for class `Journal` '''
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path_to_outfile = os.path.join(self.tmp_dir, 'out.embl')
+
+    def tearDown(self):
+        for filename in os.listdir(self.tmp_dir):
+            os.remove(os.path.join(self.tmp_dir, filename))
+        os.rmdir(self.tmp_dir)
+
+    def test_1_Journal(self):
+        ''' This test evaluates that the header is decoded to str and that a
+        trailing line that was not written completely is disregarded. '''
+        journal = IOOps.Journal(self.path_to_outfile)
+        self.assertEqual(journal.read(), (None, []))
+        journal.start({'taxon_status': {'Pyrus caucasica': True}},
+                      [('seq1', 'out.embl', 5, 1, 5)])
+        journal.commit(['seq2', 'seq3'], 'out.embl', 10, 2, 10)
+        journal.handle.write('seq4\tout.em')
+        journal.handle.flush()
+        header, entries = journal.read()
+        self.assertEqual(type(header.keys()[0]), str)
+        self.assertEqual(header, {'taxon_status': {'Pyrus caucasica': True}})
+        self.assertListEqual(entries, [('seq1', 'out.embl', 5, 1, 5),
+                                       ('seq2', 'out.embl', 10, 2, 10),
+                                       ('seq3', 'out.embl', 10, 2, 10)])
+        journal.remove()
+        self.assertListEqual(os.listdir(self.tmp_dir), [])
+
+
+class ShardedOutpTestCases(unittest.TestCase):
+    ''' Tests for class `ShardedOutp` '''
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path_to_outfile = os.path.join(self.tmp_dir, 'out.embl')
+
+    def tearDown(self):
+        for filename in os.listdir(self.tmp_dir):
+            os.remove(os.path.join(self.tmp_dir, filename))
+        os.rmdir(self.tmp_dir)
+
+    def _read_shards(self, outp_file):
+        shards = []
+        for path_to_shard in outp_file.paths:
+            with open(path_to_shard) as handle:
+                shards.append(handle.read())
+        return shards
+
+    def test_ShardedOutp__parse_shard_size__1(self):
+        ''' This test evaluates the parsing of shard sizes. '''
+        self.assertTupleEqual(IOOps.ShardedOutp.parse_shard_size('1000'),
+                              (1000, 0))
+        self.assertTupleEqual(IOOps.ShardedOutp.parse_shard_size('2mb'),
+                              (0, 2097152))
+        with self.assertRaises(ME.MyException):
+            IOOps.ShardedOutp.parse_shard_size('0')
+
+    def test_1_ShardedOutp(self):
+        ''' This test evaluates the rotation of shards by number of
+        records, with the shards completed in a background thread. '''
+        outp_file = IOOps.ShardedOutp(self.path_to_outfile, '2',
+                                      concurrent=True)
+        outp_file.write_records(['foo\n', 'bar\n', '', 'baz\n'])
+        outp_file.commit()
+        self.assertListEqual(outp_file.paths,
+                             [os.path.join(self.tmp_dir, 'out_1.embl'),
+                              os.path.join(self.tmp_dir, 'out_2.embl')])
+        self.assertListEqual(self._read_shards(outp_file),
+                             ['foo\nbar\n', 'baz\n'])
+
+    def test_2_ShardedOutp(self):
+        ''' This test evaluates the rotation of shards by number of bytes,
+        where a record larger than a shard forms a shard of its own. '''
+        outp_file = IOOps.ShardedOutp(self.path_to_outfile, '0.008K',
+                                      buffer_size=2)
+        outp_file.write_records(['foo\n', 'bar\n', 'bazbazbaz\n', 'qux\n'])
+        outp_file.commit()
+        self.assertListEqual(self._read_shards(outp_file),
+                             ['foo\nbar\n', 'bazbazbaz\n', 'qux\n'])
+
+    def test_3_ShardedOutp(self):
+        ''' This test evaluates the resumption of an interrupted run, whose
+        completed shard had not yet been renamed. '''
+        journal = IOOps.Journal(self.path_to_outfile)
+        journal.start({})
+        outp_file = IOOps.ShardedOutp(self.path_to_outfile, '2', 2, False,
+                                      journal)
+        outp_file.write_records(['foo\n', 'bar\n', 'baz\n'],
+                                ['seq1', 'seq2', 'seq3'])
+        outp_file.shard.raw_handle.close()
+        os.rename(outp_file.paths[0], outp_file.paths[0] + '.tmp')
+        header, entries = journal.read()
+        outp_file = IOOps.ShardedOutp(self.path_to_outfile, '2', 2, False,
+                                      journal)
+        outp_file.resume(entries)
+        outp_file.write_records(['qux\n', 'quux\n'], ['seq4', 'seq5'])
+        outp_file.commit()
+        journal.remove()
+        self.assertListEqual(self._read_shards(outp_file),
+                             ['foo\nbar\n', 'baz\nqux\n', 'quux\n'])
+
+
+class ShardMergeTestCases(unittest.TestCase):
+    ''' Tests for class `ShardMerge` '''
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        for filename in os.listdir(self.tmp_dir):
+            os.remove(os.path.join(self.tmp_dir, filename))
+        os.rmdir(self.tmp_dir)
+
+    def _write_shard(self, shard_num, seq_names, date_today='16-OCT-2026',
+                     input_digest='0a1b'):
+        path_to_shard = os.path.join(self.tmp_dir, 'out_%s.embl' % shard_num)
+        outp_file = IOOps.AtomicOutp(path_to_shard)
+        outp_file.write_records(['ID   %s; SV 1; linear; DNA; ; PLN; 4 BP.\n'
+                                 'FH   Key             Location/Qualifiers\n'
+                                 '//\n' % (seq_name)
+                                 for seq_name in seq_names])
+        outp_file.commit()
+        IOOps.ShardMerge.write_sidecar(path_to_shard, {
+            'shard': shard_num, 'n_shards': 2,
+            'n_seqnames': len(seq_names), 'first_seqname': seq_names[0],
+            'last_seqname': seq_names[-1], 'outfiles': ['out_%s.embl' %
+                                                        shard_num],
+            'input_digest': input_digest, 'settings': {'linemask': False},
+            'author_names': 'Doe J.', 'date_today': date_today,
+            'manifest_study': '', 'manifest_name': '',
+            'manifest_description': ''})
+        return path_to_shard
+
+    def test_ShardMerge__shard_slice__1(self):
+        ''' This test evaluates that the slices of all shards are
+        contiguous and cover all sequence names. '''
+        self.assertTupleEqual(IOOps.ShardMerge.parse_shard('2/3'), (2, 3))
+        with self.assertRaises(ME.MyException):
+            IOOps.ShardMerge.parse_shard('4/3')
+        seq_names = ['Taxon_%s' % num for num in range(10)]
+        self.assertListEqual(sum([IOOps.ShardMerge.shard_slice(seq_names,
+                                  shard_num, 3) for shard_num in [1, 2, 3]],
+                                 []), seq_names)
+
+    def test_1_ShardMerge(self):
+        ''' This test evaluates that the shards are merged in order, with
+        the reference block inserted into each record. '''
+        paths_to_shards = [self._write_shard(2, ['Taxon_3'], '17-OCT-2026'),
+                           self._write_shard(1, ['Taxon_1', 'Taxon_2'])]
+        path_to_outfile = os.path.join(self.tmp_dir, 'merged.embl')
+        self.assertEqual(IOOps.ShardMerge(paths_to_shards).merge(
+            path_to_outfile, buffer_size=16), 3)
+        with open(path_to_outfile) as handle:
+            merged = handle.read()
+        self.assertListEqual(re.findall('ID   (\\w+);', merged),
+                             ['Taxon_1', 'Taxon_2', 'Taxon_3'])
+        self.assertEqual(merged.count('RA   Doe J.\n'), 3)
+        # The date is taken from the first shard
+        self.assertEqual(merged.count('16-OCT-2026'), 3)
+        self.assertEqual(merged.count('; genomic DNA;'), 3)
+
+    def test_2_ShardMerge(self):
+        ''' This test evaluates the case where a shard is missing. '''
+        paths_to_shards = [self._write_shard(2, ['Taxon_3'])]
+        with self.assertRaises(ME.MyException):
+            IOOps.ShardMerge(paths_to_shards)
+
+    def test_3_ShardMerge(self):
+        ''' This test evaluates the case where the shards stem from
+        different infiles. '''
+        paths_to_shards = [self._write_shard(1, ['Taxon_1']),
+                           self._write_shard(2, ['Taxon_3'],
+                                             input_digest='2c3d')]
+        with self.assertRaises(ME.MyException):
+            IOOps.ShardMerge(paths_to_shards)
+
+    def test_ShardMerge__input_digest__1(self):
+        ''' This test evaluates that the digest depends on the content of
+        the infiles, but not on their paths. '''
+        paths_to_infiles = []
+        for filename, content in [('a.nex', 'ab'), ('a.csv', 'c'),
+                                  ('b.nex', 'ab'), ('b.csv', 'c'),
+                                  ('c.nex', 'a'), ('c.csv', 'bc')]:
+            paths_to_infiles.append(os.path.join(self.tmp_dir, filename))
+            with open(paths_to_infiles[-1], 'w') as handle:
+                handle.write(content)
+        digests = [IOOps.ShardMerge.input_digest(paths_to_infiles[i:i + 2])
+                   for i in [0, 2, 4]]
+        self.assertEqual(digests[0], digests[1])
+        self.assertNotEqual(digests[0], digests[2])
+
+
+#############
+# FUNCTIONS #
+#############
+
+########
+# MAIN #
+########
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,6 +8,8 @@ Unit Tests for the classes of the module `ParsingOps`
 #####################
 
 import unittest
+import shutil
+import tempfile
 
 # Add specific directory to sys.path in order to import its modules
 # NOTE: THIS RELATIVE IMPORTING IS AMATEURISH.
@@ -18,6 +20,11 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'annonex2embl'))
 import GlobalVariables as GlobVars
 import MyExceptions as ME
 import ParsingOps as PrOps
+import CacheOps as CaOps
+
+from Bio.Seq import Seq
+from Bio.SeqFeature import SeqFeature, FeatureLocation
+from Bio.SeqRecord import SeqRecord
 
 ###############
 # AUTHOR INFO #
@@ -142,6 +149,71 @@ class GetEntrezInfoTestCases(unittest.TestCase):
         handle = PrOps.GetEntrezInfo(email_addr).does_taxon_exist(taxon_name)
         self.assertTrue(handle)
 
+    def test_GetEntrezInfo__split_gene_products__1(self):
+        ''' This test evaluates function `_split_gene_products` of class
+            `GetEntrezInfo`.
+            This test evaluates the case where the gene records of a batch
+            query are assigned to the gene symbols whose search returned
+            them and the gene product is selected by majority. '''
+        class Doc(dict):
+            def __init__(self, uid, description):
+                dict.__init__(self, Description=description)
+                self.attributes = {'uid': uid}
+        docs = [Doc('1', 'maturase K'), Doc('2', 'RuBisCO large subunit'),
+                Doc('3', 'maturase K'), Doc('4', 'maturase'),
+                Doc('5', 'photosystem II protein D1')]
+        entrez_ids = {'matK': ['1', '3', '4'], 'rbcL': ['2'], 'ycf1': [],
+                      'psbA': ['6']}
+        handle = PrOps.GetEntrezInfo._split_gene_products(docs, entrez_ids)
+        self.assertDictEqual(handle, {'matK': 'maturase K',
+                                      'rbcL': 'RuBisCO large subunit'})
+
+
+class ConfirmAdjustTaxonNameTestCases(unittest.TestCase):
+    ''' Tests to evaluate class `ConfirmAdjustTaxonName` '''
+
+    def test_ConfirmAdjustTaxonName__resolve__1(self):
+        ''' This test evaluates function `resolve` of class
+            `ConfirmAdjustTaxonName`.
+            This test evaluates the case where all lookups are answered by
+            the cache, so that each distinct name is resolved without
+            querying NCBI Taxonomy. '''
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        persistent_cache = CaOps.PersistentCache(cache_dir)
+        persistent_cache.set_taxon_status('Pyrus caucasica', True)
+        persistent_cache.set_taxon_status('Pyrus tamamaschjanae', False)
+        persistent_cache.set_taxon_status('Pyrus', True)
+        taxon_names = ['Pyrus caucasica', 'Pyrus tamamaschjanae',
+                       'Pyrus caucasica']
+        email_addr = 'm.gruenstaeudl@fu-berlin.de'
+        handle = PrOps.ConfirmAdjustTaxonName.resolve(taxon_names,
+                                                      email_addr,
+                                                      persistent_cache)
+        self.assertDictEqual(handle, {'Pyrus caucasica': True,
+                                      'Pyrus tamamaschjanae': False,
+                                      'Pyrus': True})
+        persistent_cache.close()
+
+    def test_ConfirmAdjustTaxonName__go__1(self):
+        ''' This test evaluates function `go` of class
+            `ConfirmAdjustTaxonName`.
+            This test evaluates the case where the species name is not
+            listed, but the genus name is, so that the taxon name is
+            converted to an informal name. '''
+        taxon_status = {'Pyrus tamamaschjanae': False, 'Pyrus': True}
+        seq_record = SeqRecord(Seq('ACGT'), id='Taxon_1.1',
+            name='Pyrus tamamaschjanae',
+            description='Pyrus tamamaschjanae foo, isolate Taxon_1')
+        seq_record.features.append(SeqFeature(FeatureLocation(0, 4),
+            type='source', qualifiers={'organism': 'Pyrus tamamaschjanae'}))
+        email_addr = 'm.gruenstaeudl@fu-berlin.de'
+        handle = PrOps.ConfirmAdjustTaxonName(taxon_status).go(seq_record,
+                                                               email_addr)
+        self.assertEqual(handle.name, 'Pyrus sp. tamamaschjanae')
+        self.assertEqual(handle.features[0].qualifiers['organism'],
+                         'Pyrus sp. tamamaschjanae')
+
 #############
 # FUNCTIONS #
 #############
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+'''
+Unit Tests for the classes of the module `TaxonomyOps`
+'''
+
+#####################
+# IMPORT OPERATIONS #
+#####################
+
+import unittest
+import shutil
+import tempfile
+
+# Add specific directory to sys.path in order to import its modules
+# NOTE: THIS RELATIVE IMPORTING IS AMATEURISH.
+# NOTE: COULD THE FOLLOWING IMPORT BE REPLACED WITH 'import annonex2embl'?
+import sys, os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'annonex2embl'))
+
+import MyExceptions as ME
+import ParsingOps as PrOps
+import TaxonomyOps as TxOps
+
+###############
+# AUTHOR INFO #
+###############
+
+__author__ = 'Michael Gruenstaeudl <m.gruenstaeudl@fu-berlin.de>'
+__copyright__ = 'Copyright (C) 2016-2019 Michael Gruenstaeudl'
+__info__ = 'annonex2embl'
+__version__ = '2019.05.15.1500'
+
+#############
+# DEBUGGING #
+#############
+
+#import pdb
+#pdb.set_trace()
+
+####################
+# GLOBAL VARIABLES #
+####################
+
+names_dmp = '''23211\t|\tPyrus\t|\t\t|\tscientific name\t|
+23211\t|\tpears\t|\t\t|\tgenbank common name\t|
+3766\t|\tPyrus caucasica\t|\t\t|\tscientific name\t|
+3766\t|\tPyrus communis subsp. caucasica\t|\t\t|\tsynonym\t|
+1000\t|\tMalus\t|\t\t|\tscientific name\t|
+1001\t|\tMalus\t|\tMalus <mite>\t|\tscientific name\t|
+9999\t|\tDeletus taxon\t|\t\t|\tscientific name\t|
+'''
+
+nodes_dmp = '''23211\t|\t1\t|\tgenus\t|
+3766\t|\t23211\t|\tspecies\t|
+1000\t|\t1\t|\tgenus\t|
+1001\t|\t1\t|\tgenus\t|
+'''
+
+###########
+# CLASSES #
+###########
+
+class TaxonomyIndexTestCases(unittest.TestCase):
+    ''' Tests for class `TaxonomyIndex` '''
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        for fname, content in [('names.dmp', names_dmp),
+                               ('nodes.dmp', nodes_dmp)]:
+            with open(os.path.join(self.tmp_dir, fname), 'w') as handle:
+                handle.write(content)
+        self.path_to_index = os.path.join(self.tmp_dir, 'taxonomy.sqlite')
+        TxOps.TaxonomyIndex.build(os.path.join(self.tmp_dir, 'names.dmp'),
+                                  os.path.join(self.tmp_dir, 'nodes.dmp'),
+                                  self.path_to_index)
+
+    def test_1_TaxonomyIndex(self):
+        ''' This test evaluates the hit counts of exact, case-insensitive
+        matches, of homonyms and of taxa absent from nodes.dmp. '''
+        index = TxOps.TaxonomyIndex(self.path_to_index)
+        self.assertEqual(index.hitcount('Pyrus caucasica'), '1')
+        self.assertEqual(index.hitcount('pyrus CAUCASICA'), '1')
+        self.assertEqual(index.hitcount('Pyrus tamamaschjanae'), '0')
+        self.assertEqual(index.hitcount('Malus'), '2')
+        self.assertEqual(index.hitcount('Deletus taxon'), '0')
+        index.close()
+
+    def test_2_TaxonomyIndex(self):
+        ''' This test evaluates that `GetEntrezInfo.does_taxon_exist` uses
+        the index instead of NCBI Taxonomy. '''
+        index = TxOps.TaxonomyIndex(self.path_to_index)
+        entrez_handle = PrOps.GetEntrezInfo('m.gruenstaeudl@fu-berlin.de',
+                                            taxonomy_index=index)
+        self.assertTrue(entrez_handle.does_taxon_exist('Pyrus caucasica'))
+        self.assertFalse(entrez_handle.does_taxon_exist('qwertzuiop'))
+        self.assertIsNone(entrez_handle.does_taxon_exist('Malus'))
+        with self.assertRaises(ME.MyException):
+            entrez_handle.does_taxon_exist('Pyrus_caucasica')
+        index.close()
+
+#############
+# FUNCTIONS #
+#############
+
+########
+# MAIN #
+########
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+'''
+Unit Tests for the classes of the module `TranslationOps`
+'''
+
+#####################
+# IMPORT OPERATIONS #
+#####################
+
+import unittest
+
+# Add specific directory to sys.path in order to import its modules
+# NOTE: THIS RELATIVE IMPORTING IS AMATEURISH.
+# NOTE: COULD THE FOLLOWING IMPORT BE REPLACED WITH 'import annonex2embl'?
+import sys, os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'annonex2embl'))
+
+import CharsetOps as CsOps
+import CheckingOps as CkOps
+import TranslationOps as TrOps
+
+from Bio.Alphabet import IUPAC
+from Bio.Seq import Seq
+
+###############
+# AUTHOR INFO #
+###############
+
+__author__ = 'Michael Gruenstaeudl <m.gruenstaeudl@fu-berlin.de>'
+__copyright__ = 'Copyright (C) 2016-2019 Michael Gruenstaeudl'
+__info__ = 'annonex2embl'
+__version__ = '2019.05.15.1500'
+
+#############
+# DEBUGGING #
+#############
+
+#import pdb
+#pdb.set_trace()
+
+###########
+# CLASSES #
+###########
+
+@unittest.skipUnless(TrOps.numpy_available, 'requires NumPy')
+class BatchTranslTestCases(unittest.TestCase):
+    ''' Tests for class `BatchTransl` '''
+
+    def setUp(self):
+        self.alignm = {'taxon_A': 'ATGGAG--TAA',
+                       'taxon_B': 'NNNGAGAATAA',
+                       'taxon_C': 'ATGRAGA?TAA',
+                       'taxon_D': 'TTA--CTCCAT'}
+
+    def test_1_BatchTransl(self):
+        ''' This test evaluates the translation of a charset on the
+        forward strand, with gaps, leading Ns and ambiguous codons. '''
+        walks = TrOps.BatchTransl(self.alignm, 11).walks(
+            CsOps.Charset([(0, 11)]))
+        self.assertEqual(walks['taxon_A'], ('ME*', [2], True))
+        self.assertEqual(walks['taxon_B'], ('EN', [], True))
+        codon_table = CkOps.AnnoCheck._codon_table(
+            Seq('', IUPAC.IUPACAmbiguousDNA()), 11)
+        amino_acids, stop_indices, valid = CkOps.AnnoCheck._walk_codons(
+            Seq('ATGRAGANTAA', IUPAC.IUPACAmbiguousDNA()), codon_table)
+        self.assertEqual(walks['taxon_C'],
+                         (''.join(amino_acids), stop_indices, valid))
+
+    def test_2_BatchTransl(self):
+        ''' This test evaluates the translation of a compound charset on the
+        reverse strand. '''
+        walks = TrOps.BatchTransl(self.alignm, 11).walks(
+            CsOps.Charset([(0, 3), (5, 11)]), -1)
+        self.assertEqual(walks['taxon_D'], ('ME*', [2], True))
+
+
+@unittest.skipUnless(TrOps.numpy_available, 'requires NumPy')
+class CodonWalksTestCases(unittest.TestCase):
+    ''' Tests for class `CodonWalks` '''
+
+    def test_1_CodonWalks(self):
+        ''' This test evaluates that a charset is translated upon its first
+        request, and only in the specified sequences. '''
+        codon_walks = TrOps.CodonWalks(
+            {'matK_CDS': (CsOps.Charset([(0, 11)]), 1)}, 11)
+        codon_walks.set_seqs(['ATGGAG--TAA'])
+        self.assertEqual(codon_walks.walks, {})
+        self.assertEqual(codon_walks.get('matK_CDS', 'ATGGAG--TAA'),
+                         ('ME*', [2], True))
+        self.assertEqual(list(codon_walks.walks.keys()), ['matK_CDS'])
+        self.assertIsNone(codon_walks.get('matK_CDS', 'NNNGAGAATAA'))
+        self.assertIsNone(codon_walks.get('trnK_intron', 'ATGGAG--TAA'))
+
+#############
+# FUNCTIONS #
+#############
+
+########
+# MAIN #
+########
+
+if __name__ == '__main__':
+    unittest.main()